@@ -7,9 +7,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-from utils.supabase_client import get_supabase_client
-from utils.distribuidores_db import get_estadisticas_distribuidores
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils import envios_db_async, distribuidores_db_async
+from utils.asincrono import ejecutar
+from utils.timezone_config import get_fecha_actual_mexico
+from utils.invalidacion import cache_por_etiquetas
+from utils.panel_exportaciones import mostrar_panel_exportaciones
 
 # Configuración de la página
 st.set_page_config(
@@ -88,155 +93,144 @@ with col3:
 
 st.markdown("---")
 
-# Función para obtener datos del dashboard
-@st.cache_data(ttl=60)
-def get_dashboard_data():
-    """Obtener datos para el dashboard"""
-    try:
-        supabase = get_supabase_client()
-        
-        # Estadísticas de distribuidores
-        stats_dist = get_estadisticas_distribuidores()
-        
-        # Envíos totales
-        envios_total = supabase.table('envios').select('*', count='exact').execute()
-        
-        # Envíos activos
-        envios_activos = supabase.table('envios')\
-            .select('*', count='exact')\
-            .eq('estatus', 'ACTIVO')\
-            .execute()
-        
-        # Actividad últimos 30 días
-        hace_30_dias = (datetime.now() - timedelta(days=30)).date().isoformat()
-        actividad_reciente = supabase.table('envios')\
-            .select('fecha_envio, codigo_bt, iccid')\
-            .gte('fecha_envio', hace_30_dias)\
-            .eq('estatus', 'ACTIVO')\
-            .execute()
-        
-        # Top 10 distribuidores
-        top_distribuidores = supabase.table('envios')\
-            .select('codigo_bt, nombre_distribuidor')\
-            .eq('estatus', 'ACTIVO')\
-            .execute()
-        
-        return {
-            'stats_dist': stats_dist,
-            'envios_total': envios_total.count,
-            'envios_activos': envios_activos.count,
-            'actividad_reciente': actividad_reciente.data,
-            'top_distribuidores': top_distribuidores.data
-        }
-    except Exception as e:
-        st.error(f"Error al cargar datos: {str(e)}")
-        return None
-
-# Cargar datos
-with st.spinner("Cargando dashboard..."):
-    data = get_dashboard_data()
-
-if data:
-    # Métricas principales
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric(
-            label="👥 Distribuidores Activos",
-            value=data['stats_dist']['activos'],
-            delta=f"Total: {data['stats_dist']['total']}"
-        )
-    
-    with col2:
-        st.metric(
-            label="📱 SIMs Asignadas (Total)",
-            value=f"{data['envios_total']:,}",
-            delta="Histórico completo"
-        )
-    
-    with col3:
-        st.metric(
-            label="✅ SIMs Activas",
-            value=f"{data['envios_activos']:,}",
-            delta="En circulación"
-        )
+# Bloques del dashboard: cada uno se cachea por separado (se invalida al
+# escribir en su tabla; el TTL cubre cambios hechos desde otro proceso)
+@cache_por_etiquetas('distribuidores', ttl=3600, show_spinner=False)
+def cargar_stats_distribuidores():
+    """Estadísticas de distribuidores por estatus"""
+    return ejecutar(distribuidores_db_async.get_estadisticas_distribuidores())
+
+@cache_por_etiquetas('envios', ttl=3600, show_spinner=False)
+def cargar_stats_envios():
+    """Estadísticas de envíos por estatus"""
+    return ejecutar(envios_db_async.get_estadisticas_envios())
+
+@cache_por_etiquetas('envios', ttl=3600, show_spinner=False)
+def cargar_actividad_reciente(fecha):
+    """Actividad últimos 30 días (conteo por día)"""
+    return ejecutar(envios_db_async.get_conteo_diario(dias=30, estatus='ACTIVO', fecha_hasta=fecha))
+
+@cache_por_etiquetas('envios', ttl=3600, show_spinner=False)
+def cargar_top_distribuidores():
+    """Top 10 distribuidores"""
+    return ejecutar(envios_db_async.get_top_distribuidores(limite=10, estatus='ACTIVO'))
+
+# Métricas principales (se muestran conforme llega cada consulta)
+col1, col2, col3, col4 = st.columns(4)
+
+tarjeta_distribuidores = col1.empty()
+tarjeta_total = col2.empty()
+tarjeta_activas = col3.empty()
+tarjeta_hoy = col4.empty()
+
+tarjeta_distribuidores.metric("👥 Distribuidores Activos", "…")
+tarjeta_total.metric("📱 SIMs Asignadas (Total)", "…")
+tarjeta_activas.metric("✅ SIMs Activas", "…")
+tarjeta_hoy.metric("📥 Asignaciones Hoy", "…")
+
+st.markdown("---")
+
+# Gráficas
+col1, col2 = st.columns(2)
+
+with col1:
+    st.subheader("📊 Distribución de Distribuidores")
+    grafica_distribuidores = st.empty()
+    grafica_distribuidores.caption("⏳ Cargando...")
+
+with col2:
+    st.subheader("📈 Actividad Últimos 30 Días")
+    grafica_actividad = st.empty()
+    grafica_actividad.caption("⏳ Cargando...")
+
+st.markdown("---")
+
+# Top distribuidores
+st.subheader("🏆 Top 10 Distribuidores (SIMs Activas)")
+grafica_top = st.empty()
+grafica_top.caption("⏳ Cargando...")
+
+
+def mostrar_distribuidores(stats_dist):
+    """Tarjeta de distribuidores activos y gráfica de pie por estatus"""
+    tarjeta_distribuidores.metric(
+        label="👥 Distribuidores Activos",
+        value=stats_dist['activos'],
+        delta=f"Total: {stats_dist['total']}"
+    )
     
-    with col4:
-        actividad_hoy = len([x for x in data['actividad_reciente'] 
-                            if x.get('fecha_envio', '').startswith(datetime.now().date().isoformat())])
-        st.metric(
-            label="📥 Asignaciones Hoy",
-            value=actividad_hoy,
-            delta="Últimas 24h"
-        )
+    fig_dist = go.Figure(data=[go.Pie(
+        labels=['Activos', 'Baja', 'Suspendidos'],
+        values=[
+            stats_dist['activos'],
+            stats_dist['baja'],
+            stats_dist['suspendidos']
+        ],
+        hole=.4,
+        marker=dict(colors=['#28a745', '#dc3545', '#ffc107'])
+    )])
     
-    st.markdown("---")
+    fig_dist.update_layout(
+        showlegend=True,
+        height=300,
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
     
-    # Gráficas
-    col1, col2 = st.columns(2)
+    grafica_distribuidores.plotly_chart(fig_dist, use_container_width=True)
+
+
+def mostrar_envios(stats_envios):
+    """Tarjetas de SIMs asignadas y activas"""
+    tarjeta_total.metric(
+        label="📱 SIMs Asignadas (Total)",
+        value=f"{stats_envios['total']:,}",
+        delta="Histórico completo"
+    )
+    tarjeta_activas.metric(
+        label="✅ SIMs Activas",
+        value=f"{stats_envios['activos']:,}",
+        delta="En circulación"
+    )
+
+
+def mostrar_actividad(actividad_reciente):
+    """Tarjeta de asignaciones de hoy y gráfica de los últimos 30 días"""
+    hoy = get_fecha_actual_mexico().isoformat()
+    actividad_hoy = sum(x['cantidad'] for x in actividad_reciente if x['fecha'] == hoy)
+    tarjeta_hoy.metric(
+        label="📥 Asignaciones Hoy",
+        value=actividad_hoy,
+        delta="Últimas 24h"
+    )
     
-    with col1:
-        st.subheader("📊 Distribución de Distribuidores")
+    if actividad_reciente:
+        # Ya viene agrupado por fecha
+        actividad_por_dia = pd.DataFrame(actividad_reciente)
+        actividad_por_dia['fecha'] = pd.to_datetime(actividad_por_dia['fecha'])
         
-        # Gráfica de pie
-        fig_dist = go.Figure(data=[go.Pie(
-            labels=['Activos', 'Baja', 'Suspendidos'],
-            values=[
-                data['stats_dist']['activos'],
-                data['stats_dist']['baja'],
-                data['stats_dist']['suspendidos']
-            ],
-            hole=.4,
-            marker=dict(colors=['#28a745', '#dc3545', '#ffc107'])
-        )])
+        fig_actividad = px.line(
+            actividad_por_dia,
+            x='fecha',
+            y='cantidad',
+            labels={'fecha': 'Fecha', 'cantidad': 'SIMs Asignadas'},
+            markers=True
+        )
         
-        fig_dist.update_layout(
-            showlegend=True,
+        fig_actividad.update_layout(
             height=300,
-            margin=dict(l=20, r=20, t=30, b=20)
+            margin=dict(l=20, r=20, t=30, b=20),
+            hovermode='x unified'
         )
         
-        st.plotly_chart(fig_dist, use_container_width=True)
-    
-    with col2:
-        st.subheader("📈 Actividad Últimos 30 Días")
-        
-        if data['actividad_reciente']:
-            # Agrupar por fecha
-            df_actividad = pd.DataFrame(data['actividad_reciente'])
-            df_actividad['fecha_envio'] = pd.to_datetime(df_actividad['fecha_envio'])
-            actividad_por_dia = df_actividad.groupby('fecha_envio').size().reset_index(name='cantidad')
-            actividad_por_dia.rename(columns={'fecha_envio': 'fecha'}, inplace=True)
-            
-            fig_actividad = px.line(
-                actividad_por_dia,
-                x='fecha',
-                y='cantidad',
-                labels={'fecha': 'Fecha', 'cantidad': 'SIMs Asignadas'},
-                markers=True
-            )
-            
-            fig_actividad.update_layout(
-                height=300,
-                margin=dict(l=20, r=20, t=30, b=20),
-                hovermode='x unified'
-            )
-            
-            st.plotly_chart(fig_actividad, use_container_width=True)
-        else:
-            st.info("Sin actividad en los últimos 30 días")
-    
-    st.markdown("---")
-    
-    # Top distribuidores
-    st.subheader("🏆 Top 10 Distribuidores (SIMs Activas)")
-    
-    if data['top_distribuidores']:
-        df_top = pd.DataFrame(data['top_distribuidores'])
-        top_10 = df_top.groupby(['codigo_bt', 'nombre_distribuidor']).size()\
-            .reset_index(name='total_sims')\
-            .sort_values('total_sims', ascending=False)\
-            .head(10)
+        grafica_actividad.plotly_chart(fig_actividad, use_container_width=True)
+    else:
+        grafica_actividad.info("Sin actividad en los últimos 30 días")
+
+
+def mostrar_top(top_distribuidores):
+    """Gráfica de barras del top 10 de distribuidores"""
+    if top_distribuidores:
+        top_10 = pd.DataFrame(top_distribuidores)
         
         fig_top = px.bar(
             top_10,
@@ -259,12 +253,37 @@ if data:
         
         fig_top.update_traces(textposition='outside')
         
-        st.plotly_chart(fig_top, use_container_width=True)
+        grafica_top.plotly_chart(fig_top, use_container_width=True)
     else:
-        st.info("Sin datos de envíos aún")
+        grafica_top.info("Sin datos de envíos aún")
+
+
+# Cargar los bloques al mismo tiempo y mostrar cada uno en cuanto llega: las
+# tarjetas aparecen en el tiempo de la consulta más lenta, no de la suma
+bloques = [
+    (cargar_stats_distribuidores, (), mostrar_distribuidores),
+    (cargar_stats_envios, (), mostrar_envios),
+    (cargar_actividad_reciente, (get_fecha_actual_mexico(),), mostrar_actividad),
+    (cargar_top_distribuidores, (), mostrar_top)
+]
+errores = []
 
-else:
-    st.error("Error al cargar los datos del dashboard")
+# Los hilos comparten el contexto de la página para poder usar el cache
+with ThreadPoolExecutor(
+    max_workers=len(bloques),
+    initializer=add_script_run_ctx,
+    initargs=(None, get_script_run_ctx())
+) as executor:
+    futuros = {executor.submit(cargar, *args): mostrar for cargar, args, mostrar in bloques}
+    
+    for futuro in as_completed(futuros):
+        try:
+            futuros[futuro](futuro.result())
+        except Exception as e:
+            errores.append(str(e))
+
+if errores:
+    st.error(f"Error al cargar datos: {errores[0]}")
     st.info("Verifica tu conexión a Supabase")
 
 # Footer
@@ -275,3 +294,6 @@ st.markdown("""
     Desarrollado para optimizar el control de distribución</small>
 </div>
 """, unsafe_allow_html=True)
+
+# Panel de exportaciones en segundo plano
+mostrar_panel_exportaciones()
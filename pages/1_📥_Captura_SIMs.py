@@ -4,10 +4,24 @@ Página de Captura Masiva de SIMs
 
 import streamlit as st
 import pandas as pd
+from collections import Counter
 from datetime import date
-from utils.distribuidores_db import buscar_distribuidores, get_distribuidor_by_id
-from utils.envios_db import capturar_envio_masivo
+from utils.distribuidores_db import buscar_distribuidores, get_distribuidor_by_id, resolver_codigos_bt
+from utils.envios_db import capturar_envio_masivo, capturar_envios_multi
+from utils.iccid import (
+    separar_iccids,
+    validar_iccids,
+    resumen_validacion,
+    ETIQUETAS_CLASIFICACION,
+    VALIDO,
+    ERROR_CHECKSUM,
+    MALFORMADO,
+    DUPLICADO_EN_LOTE
+)
+from utils.importar import detectar_columnas, iter_iccids_archivo, separar_iccids_con_codigo, TIPOS_ARCHIVO_IMPORTACION
+from utils.indice_distribuidores import normalizar_texto
 from utils.timezone_config import get_fecha_actual_mexico
+from utils.panel_exportaciones import mostrar_panel_exportaciones
 
 # Configuración de la página
 st.set_page_config(
@@ -43,6 +57,159 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+
+# Máximo de ICCIDs con observaciones que se muestran al analizar un archivo
+MAX_OBSERVACIONES_ARCHIVO = 500
+
+
+def mostrar_resumen_validacion(resumen, observaciones):
+    """Mostrar conteos por clasificación y la tabla de ICCIDs con observaciones"""
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("✅ Válidos", resumen[VALIDO])
+    with col2:
+        st.metric("🔢 Dígito verificador incorrecto", resumen[ERROR_CHECKSUM])
+    with col3:
+        st.metric("❌ Mal formados", resumen[MALFORMADO])
+    with col4:
+        st.metric("🔁 Repetidos en la captura", resumen[DUPLICADO_EN_LOTE])
+    
+    total_observaciones = resumen[ERROR_CHECKSUM] + resumen[MALFORMADO] + resumen[DUPLICADO_EN_LOTE]
+    if total_observaciones:
+        with st.expander(f"Ver {total_observaciones:,} ICCIDs con observaciones"):
+            df_invalidos = observaciones[['entrada', 'clasificacion']].copy()
+            df_invalidos['clasificacion'] = df_invalidos['clasificacion'].map(ETIQUETAS_CLASIFICACION)
+            df_invalidos.columns = ['Valor', 'Observación']
+            st.dataframe(df_invalidos, use_container_width=True, hide_index=True)
+            if total_observaciones > len(df_invalidos):
+                st.caption(f"Se muestran los primeros {len(df_invalidos):,}")
+
+
+def seleccionar_clases_captura(resumen):
+    """
+    Clasificaciones que se capturan. Un error de dígito verificador puede ser
+    un error de dedo o un ICCID de un proveedor que no sigue el estándar: se
+    captura solo si se indica.
+    """
+    if resumen[ERROR_CHECKSUM] > 0:
+        incluir_checksum = st.checkbox(
+            f"Capturar también los {resumen[ERROR_CHECKSUM]} ICCIDs con dígito verificador incorrecto",
+            value=False
+        )
+        if incluir_checksum:
+            return [VALIDO, ERROR_CHECKSUM]
+    
+    return [VALIDO]
+
+
+def bloques_validados(archivo, columna_iccid, columna_codigo_bt, encabezado, codigo_bt=None):
+    """
+    Recorrer el archivo por bloques validando los ICCIDs (los repetidos se
+    detectan entre bloques). Si el archivo tiene código BT y se indica un
+    distribuidor solo se conservan sus filas (o las que no traen código);
+    sin distribuidor se conservan todas con su código en codigo_bt.
+    
+    Yields:
+        (validación del bloque, filas leídas, filas de otros distribuidores)
+    """
+    vistos = set()
+    
+    for bloque in iter_iccids_archivo(archivo, archivo.name, columna_iccid, columna_codigo_bt, encabezado):
+        otros = 0
+        filas = len(bloque)
+        
+        if 'codigo_bt' in bloque and codigo_bt:
+            # BT032 en el archivo corresponde a BT032-NOMBRE en el catálogo
+            codigo = normalizar_texto(codigo_bt)
+            propias = bloque['codigo_bt'].isin(['', codigo, codigo.split('-')[0]])
+            otros = int((~propias).sum())
+            bloque = bloque[propias]
+        
+        validacion = validar_iccids(bloque['iccid'], vistos)
+        if 'codigo_bt' in bloque:
+            validacion['codigo_bt'] = bloque['codigo_bt'].to_numpy()
+        
+        yield validacion, filas, otros
+
+
+def analizar_archivo(archivo, columna_iccid, columna_codigo_bt, encabezado, codigo_bt=None):
+    """Recorrer el archivo completo contando ICCIDs por clasificación (y válidos por código BT)"""
+    resumen = {clase: 0 for clase in ETIQUETAS_CLASIFICACION}
+    por_codigo = Counter()
+    observaciones = []
+    primeros = []
+    filas = 0
+    otro_distribuidor = 0
+    
+    for validacion, filas_bloque, otros in bloques_validados(archivo, columna_iccid, columna_codigo_bt, encabezado, codigo_bt):
+        filas += filas_bloque
+        otro_distribuidor += otros
+        
+        for clase, cantidad in resumen_validacion(validacion).items():
+            resumen[clase] += cantidad
+        
+        if 'codigo_bt' in validacion:
+            por_codigo.update(validacion.loc[validacion['clasificacion'] == VALIDO, 'codigo_bt'])
+        
+        if len(primeros) < 10:
+            primeros += validacion.loc[validacion['clasificacion'] == VALIDO, 'iccid'].head(10 - len(primeros)).tolist()
+        
+        if sum(len(o) for o in observaciones) < MAX_OBSERVACIONES_ARCHIVO:
+            observaciones.append(validacion[validacion['clasificacion'] != VALIDO].head(MAX_OBSERVACIONES_ARCHIVO))
+    
+    return {
+        'resumen': resumen,
+        'observaciones': pd.concat(observaciones).head(MAX_OBSERVACIONES_ARCHIVO) if observaciones else pd.DataFrame(columns=['entrada', 'clasificacion']),
+        'primeros': primeros,
+        'filas': filas,
+        'otro_distribuidor': otro_distribuidor,
+        'por_codigo': dict(por_codigo)
+    }
+
+
+def capturar_archivo(archivo, columna_iccid, columna_codigo_bt, encabezado, clases_captura, dist, fecha, observaciones, avance):
+    """
+    Capturar el archivo bloque por bloque (nunca se arma la lista completa de ICCIDs)
+    
+    Returns:
+        Dict con el mismo formato que capturar_envio_masivo
+    """
+    resultado = {'exitosos': 0, 'duplicados': 0, 'duplicados_en_lote': 0, 'errores': [], 'total_procesados': 0}
+    filas = 0
+    
+    for validacion, filas_bloque, _ in bloques_validados(archivo, columna_iccid, columna_codigo_bt, encabezado, dist['codigo_bt']):
+        filas += filas_bloque
+        resultado['duplicados_en_lote'] += int((validacion['clasificacion'] == DUPLICADO_EN_LOTE).sum())
+        
+        iccids = validacion.loc[validacion['clasificacion'].isin(clases_captura), 'iccid'].tolist()
+        if iccids:
+            parcial = capturar_envio_masivo(
+                iccids=iccids,
+                distribuidor_id=dist['id'],
+                codigo_bt=dist['codigo_bt'],
+                nombre_distribuidor=dist['nombre'],
+                fecha=fecha,
+                observaciones=observaciones,
+                usuario_captura="Almacén BAITEL"
+            )
+            resultado['exitosos'] += parcial['exitosos']
+            resultado['duplicados'] += parcial['duplicados']
+            resultado['errores'] += parcial['errores']
+            resultado['total_procesados'] += parcial['total_procesados']
+        
+        avance(filas)
+    
+    return resultado
+
+
+def filas_archivo_multi(archivo, columna_iccid, columna_codigo_bt, encabezado, clases_captura, fecha):
+    """(ICCID, código BT, fecha) de las filas a capturar, recorriendo el archivo por bloques"""
+    for validacion, _, _ in bloques_validados(archivo, columna_iccid, columna_codigo_bt, encabezado):
+        seleccion = validacion[validacion['clasificacion'].isin(clases_captura)]
+        for iccid, codigo in zip(seleccion['iccid'], seleccion['codigo_bt']):
+            yield iccid, codigo, fecha
+
+
 # Header
 st.title("📥 Captura Masiva de SIMs")
 st.markdown("---")
@@ -52,190 +219,501 @@ if 'distribuidor_seleccionado' not in st.session_state:
     st.session_state.distribuidor_seleccionado = None
 if 'resultado_captura' not in st.session_state:
     st.session_state.resultado_captura = None
+if 'resultado_captura_multi' not in st.session_state:
+    st.session_state.resultado_captura_multi = None
 
-# Paso 1: Buscar y seleccionar distribuidor
-st.subheader("🔍 Paso 1: Seleccionar Distribuidor")
-
-col1, col2 = st.columns([3, 1])
-
-with col1:
-    query_busqueda = st.text_input(
-        "Buscar distribuidor por código, nombre o plaza",
-        placeholder="Ej: BT032, OCTAVIANO, SAYULA",
-        help="Escribe cualquier parte del código, nombre o plaza del distribuidor"
-    )
-
-with col2:
-    filtro_estatus = st.selectbox(
-        "Filtrar por estatus",
-        ["TODOS", "ACTIVO", "BAJA", "SUSPENDIDO"]
-    )
+# Modo de captura
+modo_captura = st.radio(
+    "Modo de captura",
+    ["👤 Un distribuidor", "👥 Varios distribuidores"],
+    horizontal=True,
+    help="Con varios distribuidores se pega (o sube) una columna de ICCIDs y otra de códigos BT"
+)
 
-# Buscar distribuidores
-if query_busqueda:
-    with st.spinner("Buscando distribuidores..."):
-        estatus_filtro = None if filtro_estatus == "TODOS" else filtro_estatus
-        distribuidores = buscar_distribuidores(
-            query=query_busqueda,
-            estatus=estatus_filtro,
-            limit=50
+if modo_captura == "👤 Un distribuidor":
+    # Paso 1: Buscar y seleccionar distribuidor
+    st.subheader("🔍 Paso 1: Seleccionar Distribuidor")
+    
+    col1, col2 = st.columns([3, 1])
+    
+    with col1:
+        query_busqueda = st.text_input(
+            "Buscar distribuidor por código, nombre o plaza",
+            placeholder="Ej: BT032, OCTAVIANO, SAYULA",
+            help="Escribe cualquier parte del código, nombre o plaza del distribuidor"
         )
     
-    if distribuidores:
-        st.success(f"✅ Se encontraron {len(distribuidores)} distribuidor(es)")
+    with col2:
+        filtro_estatus = st.selectbox(
+            "Filtrar por estatus",
+            ["TODOS", "ACTIVO", "BAJA", "SUSPENDIDO"]
+        )
+    
+    # Buscar distribuidores
+    if query_busqueda:
+        with st.spinner("Buscando distribuidores..."):
+            estatus_filtro = None if filtro_estatus == "TODOS" else filtro_estatus
+            distribuidores = buscar_distribuidores(
+                query=query_busqueda,
+                estatus=estatus_filtro,
+                limit=50
+            )
+        
+        if distribuidores:
+            st.success(f"✅ Se encontraron {len(distribuidores)} distribuidor(es)")
+            
+            # Mostrar resultados en tabla
+            df_distribuidores = pd.DataFrame(distribuidores)
+            df_display = df_distribuidores[['codigo_bt', 'nombre', 'plaza', 'estatus']].copy()
+            df_display.columns = ['Código BT', 'Nombre', 'Plaza', 'Estatus']
+            
+            st.dataframe(df_display, use_container_width=True, hide_index=True)
+            
+            # Seleccionar distribuidor
+            codigos = df_distribuidores['codigo_bt'].tolist()
+            codigo_seleccionado = st.selectbox(
+                "Seleccionar distribuidor para captura",
+                codigos,
+                format_func=lambda x: f"{x} - {df_distribuidores[df_distribuidores['codigo_bt']==x]['nombre'].values[0]}"
+            )
+            
+            if st.button("✅ Confirmar Distribuidor", type="primary"):
+                distribuidor = df_distribuidores[df_distribuidores['codigo_bt'] == codigo_seleccionado].iloc[0]
+                st.session_state.distribuidor_seleccionado = distribuidor.to_dict()
+                st.rerun()
+        else:
+            st.warning("⚠️ No se encontraron distribuidores con ese criterio")
+    else:
+        st.info("💡 Escribe en el campo de búsqueda para encontrar un distribuidor")
+    
+    # Mostrar distribuidor seleccionado
+    if st.session_state.distribuidor_seleccionado:
+        st.markdown("---")
+        dist = st.session_state.distribuidor_seleccionado
+        
+        st.markdown(f"""
+        <div class="success-box">
+            <h4>✅ Distribuidor Seleccionado</h4>
+            <p><strong>Código:</strong> {dist['codigo_bt']}<br>
+            <strong>Nombre:</strong> {dist['nombre']}<br>
+            <strong>Plaza:</strong> {dist['plaza']}<br>
+            <strong>Estatus:</strong> {dist['estatus']}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        if st.button("🔄 Cambiar Distribuidor"):
+            st.session_state.distribuidor_seleccionado = None
+            st.session_state.resultado_captura = None
+            st.rerun()
+        
+        # Paso 2: Capturar ICCIDs
+        st.markdown("---")
+        st.subheader("📝 Paso 2: Capturar ICCIDs")
         
-        # Mostrar resultados en tabla
-        df_distribuidores = pd.DataFrame(distribuidores)
-        df_display = df_distribuidores[['codigo_bt', 'nombre', 'plaza', 'estatus']].copy()
-        df_display.columns = ['Código BT', 'Nombre', 'Plaza', 'Estatus']
+        col1, col2 = st.columns([2, 1])
         
-        st.dataframe(df_display, use_container_width=True, hide_index=True)
+        with col1:
+            st.info("""
+            **💡 Instrucciones:**
+            1. Copia los ICCIDs desde tu Excel (una columna completa) o sube el archivo (.xlsx / .csv)
+            2. Pégalos en el campo de texto de abajo
+            3. El sistema detectará automáticamente cada ICCID (por línea o coma) o la columna de ICCIDs del archivo
+            4. Haz clic en "Procesar y Guardar"
+            """)
         
-        # Seleccionar distribuidor
-        codigos = df_distribuidores['codigo_bt'].tolist()
-        codigo_seleccionado = st.selectbox(
-            "Seleccionar distribuidor para captura",
-            codigos,
-            format_func=lambda x: f"{x} - {df_distribuidores[df_distribuidores['codigo_bt']==x]['nombre'].values[0]}"
+        with col2:
+            fecha_envio = st.date_input(
+                "Fecha del envío",
+                value=get_fecha_actual_mexico(),
+                help="Fecha en que se realizó el envío (Zona horaria: México)"
+            )
+        
+        origen = st.radio(
+            "Origen de los ICCIDs",
+            ["📋 Pegar ICCIDs", "📁 Subir archivo Excel / CSV"],
+            horizontal=True,
+            help="Para capturas grandes (miles de ICCIDs) es más rápido subir el archivo"
         )
         
-        if st.button("✅ Confirmar Distribuidor", type="primary"):
-            distribuidor = df_distribuidores[df_distribuidores['codigo_bt'] == codigo_seleccionado].iloc[0]
-            st.session_state.distribuidor_seleccionado = distribuidor.to_dict()
-            st.rerun()
-    else:
-        st.warning("⚠️ No se encontraron distribuidores con ese criterio")
+        iccids_texto = None
+        archivo = None
+        
+        if origen == "📋 Pegar ICCIDs":
+            # Campo de texto para ICCIDs
+            iccids_texto = st.text_area(
+                "Pegar ICCIDs aquí (uno por línea o separados por comas)",
+                height=200,
+                placeholder="8952140063703946403\n8952140063703946404\n8952140063703946405\n...",
+                help="Puedes pegar directamente desde Excel. El sistema limpiará automáticamente los datos."
+            )
+        else:
+            archivo = st.file_uploader(
+                "Archivo con ICCIDs",
+                type=TIPOS_ARCHIVO_IMPORTACION,
+                help="Excel (.xlsx, primera hoja) o CSV. La columna de ICCIDs debe tener formato de Texto: "
+                     "Excel guarda los números largos con notación científica y pierde dígitos."
+            )
+        
+        observaciones = st.text_input(
+            "Observaciones (opcional)",
+            placeholder="Ej: Envío mensajería DHL, guía 123456"
+        )
+        
+        # Procesar ICCIDs pegados
+        if iccids_texto:
+            # Separar, normalizar y validar (largo, prefijo 89 y dígito verificador)
+            validacion = validar_iccids(separar_iccids(iccids_texto))
+            resumen = resumen_validacion(validacion)
+            
+            # Mostrar preview
+            st.markdown(f"**📊 Preview:** {len(validacion)} ICCIDs detectados")
+            mostrar_resumen_validacion(resumen, validacion[validacion['clasificacion'] != VALIDO])
+            
+            clases_captura = seleccionar_clases_captura(resumen)
+            iccids_limpios = validacion.loc[validacion['clasificacion'].isin(clases_captura), 'iccid'].tolist()
+            
+            if len(iccids_limpios) > 0:
+                with st.expander("Ver primeros 10 ICCIDs"):
+                    for i, iccid in enumerate(iccids_limpios[:10], 1):
+                        st.text(f"{i}. {iccid}")
+                    if len(iccids_limpios) > 10:
+                        st.text(f"... y {len(iccids_limpios) - 10} más")
+                
+                # Botón de captura
+                if st.button("💾 Procesar y Guardar", type="primary", use_container_width=True):
+                    with st.spinner(f"Procesando {len(iccids_limpios)} ICCIDs..."):
+                        try:
+                            resultado = capturar_envio_masivo(
+                                iccids=iccids_limpios,
+                                distribuidor_id=dist['id'],
+                                codigo_bt=dist['codigo_bt'],
+                                nombre_distribuidor=dist['nombre'],
+                                fecha=fecha_envio,
+                                observaciones=observaciones,
+                                usuario_captura="Almacén BAITEL"
+                            )
+                            
+                            st.session_state.resultado_captura = resultado
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"❌ Error al procesar: {str(e)}")
+        
+        # Procesar archivo subido
+        if archivo is not None:
+            deteccion = detectar_columnas(archivo, archivo.name)
+            
+            if not deteccion['columnas']:
+                st.warning("⚠️ El archivo está vacío")
+            else:
+                nombres_columnas = deteccion['columnas']
+                
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    columna_iccid = st.selectbox(
+                        "Columna de ICCIDs",
+                        list(range(len(nombres_columnas))),
+                        index=deteccion['columna_iccid'],
+                        format_func=lambda i: nombres_columnas[i],
+                        help="Detectada automáticamente; cámbiala si no es la correcta"
+                    )
+                with col2:
+                    encabezado = st.checkbox("La primera fila es encabezado", value=deteccion['encabezado'])
+                
+                columna_codigo_bt = deteccion['columna_codigo_bt']
+                if columna_codigo_bt == columna_iccid:
+                    columna_codigo_bt = None
+                
+                if columna_codigo_bt is not None:
+                    st.info(f"ℹ️ El archivo tiene la columna **{nombres_columnas[columna_codigo_bt]}**: "
+                            f"solo se capturan las filas de {dist['codigo_bt']} (o sin código)")
+                
+                # El análisis recorre todo el archivo: se guarda mientras no cambien
+                # el archivo, las columnas o el distribuidor
+                clave_analisis = (archivo.file_id, columna_iccid, columna_codigo_bt, encabezado, dist['codigo_bt'])
+                analisis = st.session_state.get('analisis_archivo')
+                if not analisis or analisis['clave'] != clave_analisis:
+                    with st.spinner("Analizando archivo..."):
+                        analisis = analizar_archivo(archivo, columna_iccid, columna_codigo_bt, encabezado, dist['codigo_bt'])
+                    analisis['clave'] = clave_analisis
+                    st.session_state.analisis_archivo = analisis
+                
+                resumen = analisis['resumen']
+                
+                st.markdown(f"**📊 Preview:** {analisis['filas']:,} filas con datos en el archivo")
+                mostrar_resumen_validacion(resumen, analisis['observaciones'])
+                
+                if analisis['otro_distribuidor']:
+                    st.warning(f"⚠️ Se omiten {analisis['otro_distribuidor']:,} filas de otros distribuidores")
+                
+                clases_captura = seleccionar_clases_captura(resumen)
+                total_captura = sum(resumen[clase] for clase in clases_captura)
+                
+                if total_captura > 0:
+                    with st.expander("Ver primeros 10 ICCIDs"):
+                        for i, iccid in enumerate(analisis['primeros'], 1):
+                            st.text(f"{i}. {iccid}")
+                        if total_captura > len(analisis['primeros']):
+                            st.text(f"... y {total_captura - len(analisis['primeros']):,} más")
+                    
+                    if st.button("💾 Procesar y Guardar", type="primary", use_container_width=True, key="guardar_archivo"):
+                        progreso = st.progress(0.0, text=f"Procesando {total_captura:,} ICCIDs...")
+                        try:
+                            resultado = capturar_archivo(
+                                archivo,
+                                columna_iccid,
+                                columna_codigo_bt,
+                                encabezado,
+                                clases_captura,
+                                dist,
+                                fecha_envio,
+                                observaciones,
+                                lambda filas: progreso.progress(
+                                    min(filas / analisis['filas'], 1.0),
+                                    text=f"Procesando... {filas:,} de {analisis['filas']:,} filas"
+                                )
+                            )
+                            
+                            st.session_state.resultado_captura = resultado
+                            st.session_state.analisis_archivo = None
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"❌ Error al procesar: {str(e)}")
+    
+    # Mostrar resultado de captura
+    if st.session_state.resultado_captura:
+        st.markdown("---")
+        resultado = st.session_state.resultado_captura
+        
+        if resultado['exitosos'] > 0:
+            st.markdown(f"""
+            <div class="success-box">
+                <h3>✅ Captura Exitosa</h3>
+                <p><strong>ICCIDs guardados:</strong> {resultado['exitosos']}<br>
+                <strong>Duplicados omitidos:</strong> {resultado['duplicados']}<br>
+                <strong>Total procesados:</strong> {resultado['total_procesados']}</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        if resultado['duplicados'] > 0:
+            st.warning(f"⚠️ Se omitieron {resultado['duplicados']} ICCIDs duplicados (ya existían en la base de datos)")
+        
+        if resultado.get('duplicados_en_lote', 0) > 0:
+            st.warning(f"⚠️ {resultado['duplicados_en_lote']} ICCIDs venían repetidos en la captura y se registraron una sola vez")
+        
+        if resultado['errores']:
+            st.error(f"❌ Errores encontrados: {', '.join(resultado['errores'])}")
+        
+        # Botones de acción
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            if st.button("📥 Nueva Captura (Mismo Distribuidor)", use_container_width=True):
+                st.session_state.resultado_captura = None
+                st.rerun()
+        
+        with col2:
+            if st.button("🔄 Cambiar Distribuidor", use_container_width=True):
+                st.session_state.distribuidor_seleccionado = None
+                st.session_state.resultado_captura = None
+                st.rerun()
+        
+        with col3:
+            if st.button("🏠 Volver al Dashboard", use_container_width=True):
+                st.switch_page("Home.py")
+
 else:
-    st.info("💡 Escribe en el campo de búsqueda para encontrar un distribuidor")
-
-# Mostrar distribuidor seleccionado
-if st.session_state.distribuidor_seleccionado:
-    st.markdown("---")
-    dist = st.session_state.distribuidor_seleccionado
-    
-    st.markdown(f"""
-    <div class="success-box">
-        <h4>✅ Distribuidor Seleccionado</h4>
-        <p><strong>Código:</strong> {dist['codigo_bt']}<br>
-        <strong>Nombre:</strong> {dist['nombre']}<br>
-        <strong>Plaza:</strong> {dist['plaza']}<br>
-        <strong>Estatus:</strong> {dist['estatus']}</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    if st.button("🔄 Cambiar Distribuidor"):
-        st.session_state.distribuidor_seleccionado = None
-        st.session_state.resultado_captura = None
-        st.rerun()
-    
-    # Paso 2: Capturar ICCIDs
-    st.markdown("---")
-    st.subheader("📝 Paso 2: Capturar ICCIDs")
+    st.subheader("📝 Captura para Varios Distribuidores")
     
     col1, col2 = st.columns([2, 1])
     
     with col1:
         st.info("""
         **💡 Instrucciones:**
-        1. Copia los ICCIDs desde tu Excel (una columna completa)
-        2. Pégalos en el campo de texto de abajo
-        3. El sistema detectará automáticamente cada ICCID (por línea o coma)
+        1. Prepara dos columnas en Excel: ICCID y Código BT (un renglón por SIM)
+        2. Copia ambas columnas y pégalas abajo, o sube el archivo (.xlsx / .csv)
+        3. Revisa el resumen por distribuidor
         4. Haz clic en "Procesar y Guardar"
         """)
     
     with col2:
-        fecha_envio = st.date_input(
+        fecha_envio_multi = st.date_input(
             "Fecha del envío",
             value=get_fecha_actual_mexico(),
-            help="Fecha en que se realizó el envío (Zona horaria: México)"
+            help="Fecha en que se realizó el envío (Zona horaria: México)",
+            key="fecha_envio_multi"
         )
     
-    # Campo de texto para ICCIDs
-    iccids_texto = st.text_area(
-        "Pegar ICCIDs aquí (uno por línea o separados por comas)",
-        height=200,
-        placeholder="8952140063703946403\n8952140063703946404\n8952140063703946405\n...",
-        help="Puedes pegar directamente desde Excel. El sistema limpiará automáticamente los datos."
+    origen_multi = st.radio(
+        "Origen de los ICCIDs",
+        ["📋 Pegar ICCIDs y códigos", "📁 Subir archivo Excel / CSV"],
+        horizontal=True,
+        key="origen_multi"
     )
     
-    observaciones = st.text_input(
-        "Observaciones (opcional)",
-        placeholder="Ej: Envío mensajería DHL, guía 123456"
-    )
+    validacion_multi = None
+    archivo_multi = None
+    analisis_multi = None
     
-    # Procesar ICCIDs
-    if iccids_texto:
-        # Separar por líneas y comas
-        iccids_raw = iccids_texto.replace(',', '\n').split('\n')
-        iccids_limpios = [iccid.strip() for iccid in iccids_raw if iccid.strip()]
-        
-        # Mostrar preview
-        st.markdown(f"**📊 Preview:** {len(iccids_limpios)} ICCIDs detectados")
-        
-        if len(iccids_limpios) > 0:
-            with st.expander("Ver primeros 10 ICCIDs"):
-                for i, iccid in enumerate(iccids_limpios[:10], 1):
-                    st.text(f"{i}. {iccid}")
-                if len(iccids_limpios) > 10:
-                    st.text(f"... y {len(iccids_limpios) - 10} más")
+    if origen_multi == "📋 Pegar ICCIDs y códigos":
+        texto_multi = st.text_area(
+            "Pegar ICCID y Código BT (un renglón por SIM)",
+            height=200,
+            placeholder="8952140063703946403\tBT032\n8952140063703946411\tBT032\n8952140063718995916F\tBT649\n...",
+            key="iccids_multi"
+        )
+        
+        if texto_multi:
+            tabla = separar_iccids_con_codigo(texto_multi)
+            validacion_multi = validar_iccids(tabla['iccid'])
+            validacion_multi['codigo_bt'] = tabla['codigo_bt'].to_numpy()
+    else:
+        archivo_multi = st.file_uploader(
+            "Archivo con ICCIDs y códigos BT",
+            type=TIPOS_ARCHIVO_IMPORTACION,
+            help="Excel (.xlsx, primera hoja) o CSV con una columna de ICCIDs y una de código BT",
+            key="archivo_multi"
+        )
+        
+        if archivo_multi is not None:
+            deteccion = detectar_columnas(archivo_multi, archivo_multi.name)
+            nombres_columnas = deteccion['columnas']
             
-            # Botón de captura
-            if st.button("💾 Procesar y Guardar", type="primary", use_container_width=True):
-                with st.spinner(f"Procesando {len(iccids_limpios)} ICCIDs..."):
-                    try:
-                        resultado = capturar_envio_masivo(
-                            iccids=iccids_limpios,
-                            distribuidor_id=dist['id'],
-                            codigo_bt=dist['codigo_bt'],
-                            nombre_distribuidor=dist['nombre'],
-                            fecha=fecha_envio,
-                            observaciones=observaciones,
-                            usuario_captura="Almacén BAITEL"
-                        )
-                        
-                        st.session_state.resultado_captura = resultado
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"❌ Error al procesar: {str(e)}")
-
-# Mostrar resultado de captura
-if st.session_state.resultado_captura:
-    st.markdown("---")
-    resultado = st.session_state.resultado_captura
-    
-    if resultado['exitosos'] > 0:
-        st.markdown(f"""
-        <div class="success-box">
-            <h3>✅ Captura Exitosa</h3>
-            <p><strong>ICCIDs guardados:</strong> {resultado['exitosos']}<br>
-            <strong>Duplicados omitidos:</strong> {resultado['duplicados']}<br>
-            <strong>Total procesados:</strong> {resultado['total_procesados']}</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    if resultado['duplicados'] > 0:
-        st.warning(f"⚠️ Se omitieron {resultado['duplicados']} ICCIDs duplicados (ya existían en la base de datos)")
-    
-    if resultado['errores']:
-        st.error(f"❌ Errores encontrados: {', '.join(resultado['errores'])}")
+            if len(nombres_columnas) < 2:
+                st.warning("⚠️ El archivo necesita al menos dos columnas: ICCID y Código BT")
+            else:
+                col1, col2, col3 = st.columns([2, 2, 1])
+                with col1:
+                    columna_iccid = st.selectbox(
+                        "Columna de ICCIDs",
+                        list(range(len(nombres_columnas))),
+                        index=deteccion['columna_iccid'],
+                        format_func=lambda i: nombres_columnas[i],
+                        key="columna_iccid_multi"
+                    )
+                with col2:
+                    opciones_codigo = [i for i in range(len(nombres_columnas)) if i != columna_iccid]
+                    columna_detectada = deteccion['columna_codigo_bt']
+                    columna_codigo_bt = st.selectbox(
+                        "Columna de Código BT",
+                        opciones_codigo,
+                        index=opciones_codigo.index(columna_detectada) if columna_detectada in opciones_codigo else 0,
+                        format_func=lambda i: nombres_columnas[i],
+                        key="columna_codigo_multi"
+                    )
+                with col3:
+                    encabezado = st.checkbox("La primera fila es encabezado", value=deteccion['encabezado'], key="encabezado_multi")
+                
+                clave_analisis = (archivo_multi.file_id, columna_iccid, columna_codigo_bt, encabezado)
+                analisis_multi = st.session_state.get('analisis_archivo_multi')
+                if not analisis_multi or analisis_multi['clave'] != clave_analisis:
+                    with st.spinner("Analizando archivo..."):
+                        analisis_multi = analizar_archivo(archivo_multi, columna_iccid, columna_codigo_bt, encabezado)
+                    analisis_multi['clave'] = clave_analisis
+                    st.session_state.analisis_archivo_multi = analisis_multi
     
-    # Botones de acción
-    col1, col2, col3 = st.columns(3)
+    observaciones_multi = st.text_input(
+        "Observaciones (opcional)",
+        placeholder="Ej: Envíos de fin de día, ruta norte",
+        key="observaciones_multi"
+    )
     
-    with col1:
-        if st.button("📥 Nueva Captura (Mismo Distribuidor)", use_container_width=True):
-            st.session_state.resultado_captura = None
-            st.rerun()
+    if validacion_multi is not None or analisis_multi is not None:
+        if validacion_multi is not None:
+            resumen = resumen_validacion(validacion_multi)
+            por_codigo = validacion_multi.loc[validacion_multi['clasificacion'] == VALIDO, 'codigo_bt'].value_counts().to_dict()
+            st.markdown(f"**📊 Preview:** {len(validacion_multi)} renglones detectados")
+            mostrar_resumen_validacion(resumen, validacion_multi[validacion_multi['clasificacion'] != VALIDO])
+        else:
+            resumen = analisis_multi['resumen']
+            por_codigo = analisis_multi['por_codigo']
+            st.markdown(f"**📊 Preview:** {analisis_multi['filas']:,} filas con datos en el archivo")
+            mostrar_resumen_validacion(resumen, analisis_multi['observaciones'])
+        
+        # Resumen por distribuidor (los códigos se resuelven con el catálogo en memoria)
+        distribuidores_multi = resolver_codigos_bt(por_codigo.keys())
+        df_codigos = pd.DataFrame([{
+            'Código BT (captura)': codigo or '(sin código)',
+            'Distribuidor': (
+                f"{distribuidores_multi[codigo]['codigo_bt']} - {distribuidores_multi[codigo]['nombre']}"
+                if codigo in distribuidores_multi else '❌ No encontrado'
+            ),
+            'ICCIDs válidos': cantidad
+        } for codigo, cantidad in sorted(por_codigo.items())])
+        
+        if not df_codigos.empty:
+            st.markdown("#### 👥 ICCIDs por distribuidor")
+            st.dataframe(df_codigos, use_container_width=True, hide_index=True)
+        
+        no_encontrados = [codigo for codigo in por_codigo if codigo not in distribuidores_multi]
+        if no_encontrados:
+            st.warning(f"⚠️ {len(no_encontrados)} códigos BT no existen en el catálogo (o coinciden con varios distribuidores); "
+                       "sus ICCIDs no se capturan")
+        
+        clases_captura = seleccionar_clases_captura(resumen)
+        total_captura = sum(resumen[clase] for clase in clases_captura)
+        
+        if total_captura > 0 and st.button("💾 Procesar y Guardar", type="primary", use_container_width=True, key="guardar_multi"):
+            with st.spinner(f"Procesando {total_captura:,} ICCIDs..."):
+                try:
+                    if validacion_multi is not None:
+                        seleccion = validacion_multi[validacion_multi['clasificacion'].isin(clases_captura)]
+                        filas_captura = (
+                            (iccid, codigo, fecha_envio_multi)
+                            for iccid, codigo in zip(seleccion['iccid'], seleccion['codigo_bt'])
+                        )
+                    else:
+                        filas_captura = filas_archivo_multi(
+                            archivo_multi, columna_iccid, columna_codigo_bt, encabezado, clases_captura, fecha_envio_multi
+                        )
+                    
+                    resultado = capturar_envios_multi(
+                        filas_captura,
+                        observaciones=observaciones_multi,
+                        usuario_captura="Almacén BAITEL"
+                    )
+                    resultado['duplicados_en_lote'] += resumen[DUPLICADO_EN_LOTE]
+                    
+                    st.session_state.resultado_captura_multi = resultado
+                    st.session_state.analisis_archivo_multi = None
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Error al procesar: {str(e)}")
     
-    with col2:
-        if st.button("🔄 Cambiar Distribuidor", use_container_width=True):
-            st.session_state.distribuidor_seleccionado = None
-            st.session_state.resultado_captura = None
+    # Mostrar resultado de captura
+    if st.session_state.resultado_captura_multi:
+        st.markdown("---")
+        resultado = st.session_state.resultado_captura_multi
+        
+        if resultado['exitosos'] > 0:
+            st.markdown(f"""
+            <div class="success-box">
+                <h3>✅ Captura Exitosa</h3>
+                <p><strong>ICCIDs guardados:</strong> {resultado['exitosos']}<br>
+                <strong>Distribuidores:</strong> {sum(1 for r in resultado['por_distribuidor'] if r['exitosos'])}<br>
+                <strong>Duplicados omitidos:</strong> {resultado['duplicados']}<br>
+                <strong>Total procesados:</strong> {resultado['total_procesados']}</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        if resultado['por_distribuidor']:
+            df_resultado = pd.DataFrame(resultado['por_distribuidor'])
+            df_resultado = df_resultado[['codigo_bt', 'nombre_distribuidor', 'exitosos', 'duplicados', 'con_error']]
+            df_resultado.columns = ['Código BT', 'Distribuidor', 'Guardados', 'Duplicados', 'Con Error']
+            st.dataframe(df_resultado, use_container_width=True, hide_index=True)
+        
+        if resultado['codigos_no_encontrados']:
+            detalle = ', '.join(f"{codigo or '(sin código)'} ({cantidad})" for codigo, cantidad in resultado['codigos_no_encontrados'].items())
+            st.warning(f"⚠️ ICCIDs no capturados por código BT no encontrado: {detalle}")
+        
+        if resultado['duplicados_en_lote'] > 0:
+            st.warning(f"⚠️ {resultado['duplicados_en_lote']} ICCIDs venían repetidos en la captura y se registraron una sola vez")
+        
+        if resultado['errores']:
+            st.error(f"❌ Errores encontrados: {', '.join(resultado['errores'])}")
+        
+        if st.button("📥 Nueva Captura", use_container_width=True, key="nueva_captura_multi"):
+            st.session_state.resultado_captura_multi = None
             st.rerun()
-    
-    with col3:
-        if st.button("🏠 Volver al Dashboard", use_container_width=True):
-            st.switch_page("Home.py")
 
 # Footer
 st.markdown("---")
@@ -244,3 +722,6 @@ st.markdown("""
     <small>💡 Tip: Puedes capturar hasta 10,000 ICCIDs en una sola operación</small>
 </div>
 """, unsafe_allow_html=True)
+
+# Panel de exportaciones en segundo plano
+mostrar_panel_exportaciones()
@@ -12,6 +12,8 @@ from utils.distribuidores_db import (
     get_siguiente_codigo_bt,
     get_distribuidor_by_codigo
 )
+from utils.exportar import exportar_dataframe
+from utils.panel_exportaciones import mostrar_panel_exportaciones
 
 # Configuración de la página
 st.set_page_config(
@@ -368,10 +370,9 @@ with tab3:
             st.dataframe(df_display, use_container_width=True, hide_index=True)
             
             # Opción de exportar
-            csv = df_display.to_csv(index=False).encode('utf-8')
             st.download_button(
                 label="📥 Descargar CSV",
-                data=csv,
+                data=exportar_dataframe(df_display),
                 file_name=f"distribuidores_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
                 mime="text/csv"
             )
@@ -387,3 +388,6 @@ st.markdown("""
     <small>💡 Tip: Los códigos BT son únicos y no se pueden modificar una vez creados</small>
 </div>
 """, unsafe_allow_html=True)
+
+# Panel de exportaciones en segundo plano
+mostrar_panel_exportaciones()
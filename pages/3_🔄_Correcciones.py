@@ -5,9 +5,9 @@ Página de Correcciones y Reasignaciones de SIMs
 import streamlit as st
 import pandas as pd
 from utils.envios_db import (
-    get_envio_by_iccid,
-    corregir_distribuidor_envio,
-    reasignar_sim,
+    get_envios_by_iccids,
+    corregir_distribuidor_masivo,
+    reasignar_sims_masivo,
     buscar_envios,
     eliminar_iccids,
     corregir_fecha_envio
@@ -15,6 +15,15 @@ from utils.envios_db import (
 from utils.timezone_config import get_fecha_actual_mexico
 from datetime import date, timedelta
 from utils.distribuidores_db import buscar_distribuidores, get_distribuidor_by_id
+from utils.panel_exportaciones import mostrar_panel_exportaciones
+from utils.iccid import (
+    separar_iccids,
+    validar_iccids,
+    resumen_validacion,
+    ERROR_CHECKSUM,
+    MALFORMADO,
+    DUPLICADO_EN_LOTE
+)
 
 # Configuración de la página
 st.set_page_config(
@@ -57,6 +66,27 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+
+def mostrar_observaciones_iccids(validacion):
+    """
+    Avisar de ICCIDs mal formados, con dígito verificador incorrecto o
+    repetidos. Se buscan de todos modos: pueden existir así en la base de
+    datos por capturas anteriores a la validación.
+    """
+    resumen = resumen_validacion(validacion)
+    
+    avisos = []
+    if resumen[MALFORMADO]:
+        avisos.append(f"{resumen[MALFORMADO]} mal formados")
+    if resumen[ERROR_CHECKSUM]:
+        avisos.append(f"{resumen[ERROR_CHECKSUM]} con dígito verificador incorrecto")
+    if resumen[DUPLICADO_EN_LOTE]:
+        avisos.append(f"{resumen[DUPLICADO_EN_LOTE]} repetidos (se buscan una sola vez)")
+    
+    if avisos:
+        st.warning(f"⚠️ ICCIDs con observaciones: {', '.join(avisos)}")
+
+
 # Header
 st.title("🔄 Correcciones y Reasignaciones")
 st.markdown("---")
@@ -92,18 +122,19 @@ with tab1:
     )
     
     if iccids_corregir_text:
-        # Procesar ICCIDs (limpiar y separar)
-        import re
-        iccids_list = re.split(r'[,\s\n]+', iccids_corregir_text.strip())
-        iccids_list = [iccid.strip() for iccid in iccids_list if iccid.strip()]
+        # Separar y normalizar ICCIDs (los repetidos se buscan una sola vez)
+        validacion = validar_iccids(separar_iccids(iccids_corregir_text))
+        iccids_list = validacion.loc[validacion['clasificacion'] != DUPLICADO_EN_LOTE, 'iccid'].tolist()
         
         st.info(f"📊 Total de ICCIDs a procesar: **{len(iccids_list)}**")
+        mostrar_observaciones_iccids(validacion)
         
         if st.button("🔍 Buscar ICCIDs", type="secondary"):
             with st.spinner("Buscando ICCIDs..."):
                 resultados = []
+                envios = get_envios_by_iccids(iccids_list)
                 for iccid in iccids_list:
-                    envio = get_envio_by_iccid(iccid)
+                    envio = envios.get(iccid.strip().upper())
                     if envio:
                         resultados.append({
                             'iccid': iccid,
@@ -231,35 +262,24 @@ with tab1:
                                 st.error("❌ Por favor indica el motivo de la corrección")
                             else:
                                 try:
-                                    exitosos = 0
-                                    errores = 0
+                                    iccids_activos = [r['iccid'] for r in resultados if r['estatus'] == 'ACTIVO']
                                     
-                                    progress_bar = st.progress(0)
-                                    status_text = st.empty()
+                                    with st.spinner(f"Corrigiendo {len(iccids_activos)} ICCIDs..."):
+                                        resultado = corregir_distribuidor_masivo(
+                                            iccids=iccids_activos,
+                                            nuevo_distribuidor_id=dist_nuevo['id'],
+                                            nuevo_codigo_bt=dist_nuevo['codigo_bt'],
+                                            nuevo_nombre=dist_nuevo['nombre'],
+                                            motivo=motivo,
+                                            usuario="Almacén BAITEL"
+                                        )
                                     
-                                    iccids_activos = [r for r in resultados if r['estatus'] == 'ACTIVO']
+                                    exitosos = len(resultado['actualizados'])
+                                    errores = sum(lote['total'] for lote in resultado['lotes'] if not lote['exitoso'])
                                     
-                                    for idx, resultado in enumerate(iccids_activos):
-                                        try:
-                                            status_text.text(f"Procesando {idx+1}/{len(iccids_activos)}: {resultado['iccid']}")
-                                            
-                                            corregir_distribuidor_envio(
-                                                iccid=resultado['iccid'],
-                                                nuevo_distribuidor_id=dist_nuevo['id'],
-                                                nuevo_codigo_bt=dist_nuevo['codigo_bt'],
-                                                nuevo_nombre=dist_nuevo['nombre'],
-                                                motivo=motivo,
-                                                usuario="Almacén BAITEL"
-                                            )
-                                            exitosos += 1
-                                        except Exception as e:
-                                            errores += 1
-                                            st.warning(f"⚠️ Error en {resultado['iccid']}: {str(e)}")
-                                        
-                                        progress_bar.progress((idx + 1) / len(iccids_activos))
-                                    
-                                    progress_bar.empty()
-                                    status_text.empty()
+                                    # Mostrar lotes con error
+                                    for error in resultado['errores']:
+                                        st.warning(f"⚠️ Error en {error}")
                                     
                                     st.success(f"✅ Corrección masiva completada: {exitosos} exitosos, {errores} errores")
                                     st.balloons()
@@ -312,18 +332,19 @@ with tab2:
     )
     
     if iccids_reasignar_text:
-        # Procesar ICCIDs
-        import re
-        iccids_list = re.split(r'[,\s\n]+', iccids_reasignar_text.strip())
-        iccids_list = [iccid.strip() for iccid in iccids_list if iccid.strip()]
+        # Separar y normalizar ICCIDs (los repetidos se buscan una sola vez)
+        validacion = validar_iccids(separar_iccids(iccids_reasignar_text))
+        iccids_list = validacion.loc[validacion['clasificacion'] != DUPLICADO_EN_LOTE, 'iccid'].tolist()
         
         st.info(f"📊 Total de ICCIDs a procesar: **{len(iccids_list)}**")
+        mostrar_observaciones_iccids(validacion)
         
         if st.button("🔍 Buscar ICCIDs", type="secondary", key="buscar_reasignar"):
             with st.spinner("Buscando ICCIDs..."):
                 resultados = []
+                envios = get_envios_by_iccids(iccids_list)
                 for iccid in iccids_list:
-                    envio = get_envio_by_iccid(iccid)
+                    envio = envios.get(iccid.strip().upper())
                     if envio:
                         resultados.append({
                             'iccid': iccid,
@@ -447,35 +468,24 @@ with tab2:
                                 st.error("❌ Por favor indica el motivo de la reasignación")
                             else:
                                 try:
-                                    exitosos = 0
-                                    errores = 0
+                                    iccids_activos = [r['iccid'] for r in resultados if r['estatus'] == 'ACTIVO']
                                     
-                                    progress_bar = st.progress(0)
-                                    status_text = st.empty()
+                                    with st.spinner(f"Reasignando {len(iccids_activos)} ICCIDs..."):
+                                        resultado = reasignar_sims_masivo(
+                                            iccids=iccids_activos,
+                                            nuevo_distribuidor_id=dist_nuevo['id'],
+                                            nuevo_codigo_bt=dist_nuevo['codigo_bt'],
+                                            nuevo_nombre=dist_nuevo['nombre'],
+                                            motivo=motivo,
+                                            usuario="Almacén BAITEL"
+                                        )
                                     
-                                    iccids_activos = [r for r in resultados if r['estatus'] == 'ACTIVO']
+                                    exitosos = len(resultado['reasignados'])
+                                    errores = len(iccids_activos) - exitosos
                                     
-                                    for idx, resultado in enumerate(iccids_activos):
-                                        try:
-                                            status_text.text(f"Procesando {idx+1}/{len(iccids_activos)}: {resultado['iccid']}")
-                                            
-                                            reasignar_sim(
-                                                iccid=resultado['iccid'],
-                                                nuevo_distribuidor_id=dist_nuevo['id'],
-                                                nuevo_codigo_bt=dist_nuevo['codigo_bt'],
-                                                nuevo_nombre=dist_nuevo['nombre'],
-                                                motivo=motivo,
-                                                usuario="Almacén BAITEL"
-                                            )
-                                            exitosos += 1
-                                        except Exception as e:
-                                            errores += 1
-                                            st.warning(f"⚠️ Error en {resultado['iccid']}: {str(e)}")
-                                        
-                                        progress_bar.progress((idx + 1) / len(iccids_activos))
-                                    
-                                    progress_bar.empty()
-                                    status_text.empty()
+                                    # Los lotes con error se revierten completos
+                                    for error in resultado['errores']:
+                                        st.warning(f"⚠️ Error en {error}")
                                     
                                     st.success(f"✅ Reasignación masiva completada: {exitosos} exitosos, {errores} errores")
                                     st.balloons()
@@ -529,18 +539,19 @@ with tab3:
     )
     
     if iccids_eliminar_text:
-        # Procesar ICCIDs
-        import re
-        iccids_list = re.split(r'[,\s\n]+', iccids_eliminar_text.strip())
-        iccids_list = [iccid.strip() for iccid in iccids_list if iccid.strip()]
+        # Separar y normalizar ICCIDs (los repetidos se buscan una sola vez)
+        validacion = validar_iccids(separar_iccids(iccids_eliminar_text))
+        iccids_list = validacion.loc[validacion['clasificacion'] != DUPLICADO_EN_LOTE, 'iccid'].tolist()
         
         st.info(f"📊 Total de ICCIDs a procesar: **{len(iccids_list)}**")
+        mostrar_observaciones_iccids(validacion)
         
         if st.button("🔍 Buscar ICCIDs", type="secondary", key="buscar_eliminar"):
             with st.spinner("Buscando ICCIDs..."):
                 resultados = []
+                envios = get_envios_by_iccids(iccids_list)
                 for iccid in iccids_list:
-                    envio = get_envio_by_iccid(iccid)
+                    envio = envios.get(iccid.strip().upper())
                     if envio:
                         resultados.append({
                             'iccid': iccid,
@@ -607,6 +618,29 @@ with tab3:
                 </div>
                 """, unsafe_allow_html=True)
                 
+                # Simulación: mismo desglose sin eliminar nada
+                if st.button("🔎 Simular Eliminación", use_container_width=True, key="simular_eliminacion"):
+                    with st.spinner("Simulando eliminación..."):
+                        iccids_encontrados = [r['iccid'] for r in resultados if r['encontrado']]
+                        simulacion = eliminar_iccids(
+                            iccids=iccids_encontrados,
+                            usuario="Almacén BAITEL",
+                            dry_run=True
+                        )
+                    
+                    st.markdown(f"""
+                    <div class="info-box">
+                        <h4>🔎 Simulación (no se eliminó nada)</h4>
+                        <p><strong>ICCIDs que se eliminarían:</strong> {simulacion['eliminados']}<br>
+                        <strong>No Encontrados:</strong> {len(simulacion['no_encontrados'])}<br>
+                        <strong>Errores:</strong> {len(simulacion['errores'])}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                    
+                    if simulacion['errores']:
+                        for error in simulacion['errores']:
+                            st.text(f"• {error}")
+                
                 # Checkbox de confirmación
                 confirmar = st.checkbox(
                     "✅ Confirmo que he verificado los ICCIDs y deseo eliminarlos permanentemente",
@@ -693,18 +727,19 @@ with tab4:
     )
     
     if iccids_fecha_text:
-        # Procesar ICCIDs
-        import re
-        iccids_list = re.split(r'[,\s\n]+', iccids_fecha_text.strip())
-        iccids_list = [iccid.strip() for iccid in iccids_list if iccid.strip()]
+        # Separar y normalizar ICCIDs (los repetidos se buscan una sola vez)
+        validacion = validar_iccids(separar_iccids(iccids_fecha_text))
+        iccids_list = validacion.loc[validacion['clasificacion'] != DUPLICADO_EN_LOTE, 'iccid'].tolist()
         
         st.info(f"📊 Total de ICCIDs a procesar: **{len(iccids_list)}**")
+        mostrar_observaciones_iccids(validacion)
         
         if st.button("🔍 Buscar ICCIDs", type="secondary", key="buscar_fecha"):
             with st.spinner("Buscando ICCIDs..."):
                 resultados = []
+                envios = get_envios_by_iccids(iccids_list)
                 for iccid in iccids_list:
-                    envio = get_envio_by_iccid(iccid)
+                    envio = envios.get(iccid.strip().upper())
                     if envio:
                         resultados.append({
                             'iccid': iccid,
@@ -847,3 +882,6 @@ with tab4:
                             st.error(f"❌ Error al corregir fechas: {str(e)}")
                 else:
                     st.warning("⚠️ Por favor indica el motivo de la corrección")
+
+# Panel de exportaciones en segundo plano
+mostrar_panel_exportaciones()
@@ -2,14 +2,22 @@
 Página de Reportes y Análisis
 """
 
+import calendar
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
-from utils.envios_db import buscar_envios, get_estadisticas_envios, get_sims_por_distribuidor
+from utils.envios_db import get_analisis_periodo
+from utils import envios_db_async, distribuidores_db_async
+from utils.asincrono import ejecutar_en_paralelo
+from utils.envios_df import cargar_envios_df
+from utils.envios_cache import sincronizar_envios_local, get_estado_cache_envios, get_cubo_mensual_local, hay_cambios_pendientes
+from utils.exportar import exportar_dataframe, ETIQUETAS_FORMATO, MAX_FILAS_DESCARGA_DIRECTA
+from utils.trabajos_exportacion import encolar_exportacion
+from utils.panel_exportaciones import mostrar_panel_exportaciones, get_sesion_exportaciones, boton_descarga_directa
+from utils.invalidacion import cache_por_etiquetas
 from utils.distribuidores_db import buscar_distribuidores, get_todos_distribuidores
-from utils.supabase_client import get_supabase_client
 from utils.timezone_config import get_fecha_actual_mexico
 
 # Configuración de la página
@@ -50,19 +58,15 @@ with tab1:
     
     # Obtener estadísticas
     with st.spinner("Cargando estadísticas..."):
-        stats_envios = get_estadisticas_envios()
-        
-        # Obtener datos de distribuidores
-        supabase = get_supabase_client()
-        dist_activos = supabase.table('distribuidores').select('*', count='exact').eq('estatus', 'ACTIVO').execute()
-        
-        # Actividad últimos 30 días
-        hace_30_dias = (get_fecha_actual_mexico() - timedelta(days=30)).isoformat()
-        envios_30d = supabase.table('envios')\
-            .select('*', count='exact')\
-            .gte('fecha_envio', hace_30_dias)\
-            .eq('estatus', 'ACTIVO')\
-            .execute()
+        # Consultas independientes: se ejecutan al mismo tiempo (estadísticas
+        # de envíos y distribuidores, actividad de 30 días y top 10)
+        stats_envios, stats_dist, actividad_30d, top_dist = ejecutar_en_paralelo(
+            envios_db_async.get_estadisticas_envios(),
+            distribuidores_db_async.get_estadisticas_distribuidores(),
+            envios_db_async.get_conteo_diario(dias=30, estatus='ACTIVO'),
+            envios_db_async.get_top_distribuidores(limite=10, estatus='ACTIVO')
+        )
+        envios_30d = sum(x['cantidad'] for x in actividad_30d)
     
     # Métricas principales
     col1, col2, col3, col4 = st.columns(4)
@@ -74,10 +78,10 @@ with tab1:
         st.metric("✅ SIMs Activas", f"{stats_envios['activos']:,}")
     
     with col3:
-        st.metric("👥 Distribuidores Activos", f"{dist_activos.count:,}")
+        st.metric("👥 Distribuidores Activos", f"{stats_dist['activos']:,}")
     
     with col4:
-        st.metric("📥 Asignaciones (30 días)", f"{envios_30d.count:,}")
+        st.metric("📥 Asignaciones (30 días)", f"{envios_30d:,}")
     
     st.markdown("---")
     
@@ -104,18 +108,8 @@ with tab1:
     with col2:
         st.subheader("🏆 Top 10 Distribuidores")
         
-        # Obtener top distribuidores
-        top_dist = supabase.table('envios')\
-            .select('codigo_bt, nombre_distribuidor')\
-            .eq('estatus', 'ACTIVO')\
-            .execute()
-        
-        if top_dist.data:
-            df_top = pd.DataFrame(top_dist.data)
-            top_10 = df_top.groupby(['codigo_bt', 'nombre_distribuidor']).size()\
-                .reset_index(name='total')\
-                .sort_values('total', ascending=False)\
-                .head(10)
+        if top_dist:
+            top_10 = pd.DataFrame(top_dist).rename(columns={'total_sims': 'total'})
             
             fig_top = px.bar(
                 top_10,
@@ -146,16 +140,9 @@ with tab1:
     # Actividad por día (últimos 30 días)
     st.subheader("📈 Actividad Diaria (Últimos 30 Días)")
     
-    envios_recientes = supabase.table('envios')\
-        .select('fecha_envio, iccid')\
-        .gte('fecha_envio', hace_30_dias)\
-        .eq('estatus', 'ACTIVO')\
-        .execute()
-    
-    if envios_recientes.data:
-        df_actividad = pd.DataFrame(envios_recientes.data)
-        df_actividad['fecha_envio'] = pd.to_datetime(df_actividad['fecha_envio'])
-        actividad_diaria = df_actividad.groupby('fecha_envio').size().reset_index(name='cantidad')
+    if actividad_30d:
+        actividad_diaria = pd.DataFrame(actividad_30d).rename(columns={'fecha': 'fecha_envio'})
+        actividad_diaria['fecha_envio'] = pd.to_datetime(actividad_diaria['fecha_envio'])
         
         fig_linea = px.line(
             actividad_diaria,
@@ -221,41 +208,76 @@ with tab2:
     # Sin límite - obtener todos los registros que coincidan con los filtros
     st.info("ℹ️ El sistema traerá TODOS los registros que coincidan con los filtros, sin límites")
     
+    filtros_consulta = {
+        'iccid': iccid_buscar if iccid_buscar else None,
+        'codigo_bt': codigo_bt_buscar if codigo_bt_buscar else None,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'estatus': estatus_buscar if estatus_buscar != "TODOS" else None
+    }
+    
     if st.button("🔍 Buscar Envíos", type="primary"):
         with st.spinner("Buscando todos los registros que coincidan con los filtros..."):
-            resultados = buscar_envios(
-                iccid=iccid_buscar if iccid_buscar else None,
-                codigo_bt=codigo_bt_buscar if codigo_bt_buscar else None,
-                fecha_desde=fecha_desde,
-                fecha_hasta=fecha_hasta,
-                estatus=estatus_buscar if estatus_buscar != "TODOS" else None,
-                limit=None  # Sin límite - obtener todos los registros
+            df = cargar_envios_df(
+                filtros=filtros_consulta,
+                columnas=['fecha_envio', 'iccid', 'codigo_bt', 'nombre_distribuidor', 'estatus']
             )
         
-        if resultados:
-            st.success(f"✅ {len(resultados)} envío(s) encontrado(s)")
+        if not df.empty:
+            st.success(f"✅ {len(df)} envío(s) encontrado(s)")
             
             # Mostrar tabla
-            df = pd.DataFrame(resultados)
-            df_display = df[['fecha_envio', 'iccid', 'codigo_bt', 'nombre_distribuidor', 'estatus']].copy()
+            df_display = df.copy()
             df_display.columns = ['Fecha', 'ICCID', 'Código BT', 'Distribuidor', 'Estatus']
             
             # Formatear fecha a DD/MM/YYYY
-            df_display['Fecha'] = pd.to_datetime(df_display['Fecha']).dt.strftime('%d/%m/%Y')
+            df_display['Fecha'] = df_display['Fecha'].dt.strftime('%d/%m/%Y')
             
             st.dataframe(df_display, use_container_width=True, hide_index=True)
             
-            # Exportar
-            csv = df_display.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="📥 Descargar CSV",
-                data=csv,
-                file_name=f"envios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
+            # Descarga directa solo para resultados chicos (st.download_button
+            # lee el archivo completo); los demás, con la exportación de abajo
+            if len(df_display) <= MAX_FILAS_DESCARGA_DIRECTA:
+                st.download_button(
+                    label="📥 Descargar CSV",
+                    data=exportar_dataframe(df_display),
+                    file_name=f"envios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv",
+                    use_container_width=True
+                )
+            else:
+                st.info("ℹ️ Para descargar estos resultados usa 📦 Exportar en segundo plano")
         else:
             st.warning("⚠️ No se encontraron envíos con esos criterios")
+    
+    # Exportación completa en segundo plano con los filtros actuales
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        formato_consulta = st.selectbox(
+            "Formato",
+            list(ETIQUETAS_FORMATO.keys()),
+            format_func=lambda f: ETIQUETAS_FORMATO[f],
+            key="formato_exportacion_consulta"
+        )
+    
+    with col2:
+        st.write("")
+        if st.button("📦 Exportar en segundo plano", key="exportar_consulta", help="Genera el archivo con todos los registros; se descarga desde el panel 📦 Exportaciones"):
+            encolar_exportacion(
+                {
+                    'tipo': 'envios_busqueda',
+                    'parametros': {
+                        campo: valor.isoformat() if isinstance(valor, date) else valor
+                        for campo, valor in filtros_consulta.items()
+                    }
+                },
+                formato=formato_consulta,
+                nombre_base=f"envios_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                descripcion=f"Consulta de envíos {fecha_desde} a {fecha_hasta}",
+                sesion=get_sesion_exportaciones()
+            )
+            st.success("✅ Exportación en proceso. Descárgala desde el panel 📦 Exportaciones del menú lateral")
 
 # TAB 3: POR DISTRIBUIDOR
 with tab3:
@@ -313,39 +335,52 @@ with tab3:
             st.markdown("---")
             st.markdown("### 📱 SIMs Asignadas")
             
-            sims_activas = get_sims_por_distribuidor(codigo_seleccionado, estatus='ACTIVO')
-            sims_todas = get_sims_por_distribuidor(codigo_seleccionado, estatus='ACTIVO')
+            df_sims = cargar_envios_df(
+                filtros={'codigo_bt_exacto': codigo_seleccionado, 'estatus': 'ACTIVO'},
+                columnas=['fecha_envio', 'iccid']
+            )
             
             col1, col2 = st.columns(2)
             
             with col1:
-                st.metric("SIMs Activas", len(sims_activas))
+                st.metric("SIMs Activas", len(df_sims))
             
             with col2:
                 # Calcular promedio mensual
-                if sims_activas:
-                    df_sims = pd.DataFrame(sims_activas)
-                    df_sims['fecha_envio'] = pd.to_datetime(df_sims['fecha_envio'])
+                if not df_sims.empty:
                     meses_activo = (datetime.now() - df_sims['fecha_envio'].min()).days / 30
-                    promedio_mes = len(sims_activas) / max(meses_activo, 1)
+                    promedio_mes = len(df_sims) / max(meses_activo, 1)
                     st.metric("Promedio Mensual", f"{promedio_mes:.1f}")
             
             # Mostrar tabla de SIMs
-            if sims_activas:
-                df_sims_display = pd.DataFrame(sims_activas)
-                df_sims_display = df_sims_display[['fecha_envio', 'iccid']].copy()
+            if not df_sims.empty:
+                df_sims_display = df_sims.copy()
                 df_sims_display.columns = ['Fecha', 'ICCID']
+                df_sims_display['Fecha'] = df_sims_display['Fecha'].dt.strftime('%Y-%m-%d')
                 
                 st.dataframe(df_sims_display, use_container_width=True, hide_index=True)
                 
-                # Exportar
-                csv = df_sims_display.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label=f"📥 Descargar SIMs de {codigo_seleccionado}",
-                    data=csv,
-                    file_name=f"sims_{codigo_seleccionado}_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
+                # Exportar (el CSV se genera solo al pedirlo)
+                boton_descarga_directa(
+                    df_sims_display,
+                    etiqueta=f"📥 Descargar SIMs de {codigo_seleccionado}",
+                    nombre_archivo=f"sims_{codigo_seleccionado}_{datetime.now().strftime('%Y%m%d')}.csv",
+                    clave=f"sims_{codigo_seleccionado}"
                 )
+                
+                if st.button("📦 Exportar a Excel en segundo plano", key="exportar_sims_distribuidor"):
+                    encolar_exportacion(
+                        {
+                            'tipo': 'envios_distribuidor',
+                            'parametros': {'codigo_bt': codigo_seleccionado, 'estatus': 'ACTIVO'}
+                        },
+                        formato='xlsx',
+                        nombre_base=f"sims_{codigo_seleccionado}_{datetime.now().strftime('%Y%m%d')}",
+                        descripcion=f"SIMs activas {codigo_seleccionado}",
+                        sesion=get_sesion_exportaciones(),
+                        total_estimado=len(df_sims)
+                    )
+                    st.success("✅ Exportación en proceso. Descárgala desde el panel 📦 Exportaciones del menú lateral")
             else:
                 st.info("Este distribuidor no tiene SIMs activas asignadas")
         else:
@@ -365,65 +400,50 @@ with tab4:
     if vista == "📊 Análisis por Año/Mes":
         st.markdown("---")
         
-        # Función con caché para cargar todos los datos con paginación
-        @st.cache_data(ttl=3600)  # Cache por 1 hora
-        def cargar_todos_envios():
-            """Carga TODOS los registros de envíos usando paginación"""
-            supabase = get_supabase_client()
-            all_records = []
-            offset = 0
-            limit = 1000
-            
-            while True:
-                response = supabase.table('envios')\
-                    .select('fecha_envio, iccid, codigo_bt, nombre_distribuidor')\
-                    .order('fecha_envio', desc=True)\
-                    .limit(limit)\
-                    .offset(offset)\
-                    .execute()
-                
-                if not response.data:
-                    break
-                
-                all_records.extend(response.data)
-                offset += limit
-                
-                # Si obtenemos menos registros que el límite, es la última página
-                if len(response.data) < limit:
-                    break
-            
-            return all_records
+        # El cubo (año, mes, distribuidor) se cachea por marca de
+        # sincronización: solo se vuelve a contar cuando el cache local cambió.
+        # Cambiar de año o distribuidor es una búsqueda en el dict; los ICCIDs
+        # solo se leen al exportar.
+        @st.cache_data(ttl=3600, max_entries=1)
+        def cargar_cubo_mensual(marca_sincronizacion):
+            """Conteos mensuales por año y distribuidor desde el cache local en disco"""
+            return get_cubo_mensual_local()
+        
+        # Sincronizar de forma incremental si hubo capturas o correcciones
+        # desde la última sincronización, o si el cache tiene más de 1 hora
+        estado_cache = get_estado_cache_envios()
+        ultima_sincronizacion = estado_cache['ultima_sincronizacion']
+        if not ultima_sincronizacion or hay_cambios_pendientes() \
+                or datetime.utcnow() - datetime.fromisoformat(ultima_sincronizacion) > timedelta(hours=1):
+            with st.spinner("Sincronizando envíos..."):
+                sincronizar_envios_local()
+            estado_cache = get_estado_cache_envios()
         
-        # Obtener todos los datos con caché
+        # Obtener los conteos con caché
         with st.spinner("Cargando datos..."):
-            datos_envios = cargar_todos_envios()
+            cubo = cargar_cubo_mensual(estado_cache['ultima_sincronizacion'])
         
         # Mostrar mensaje de confirmación
-        st.success(f"✅ Datos cargados: {len(datos_envios):,} registros")
+        st.success(f"✅ Datos cargados: {cubo['total']:,} registros")
         
-        if datos_envios:
-            df_all = pd.DataFrame(datos_envios)
-            df_all['fecha_envio'] = pd.to_datetime(df_all['fecha_envio'])
-            df_all['año'] = df_all['fecha_envio'].dt.year
-            df_all['mes'] = df_all['fecha_envio'].dt.month
-            df_all['mes_nombre'] = df_all['fecha_envio'].dt.strftime('%B')
-            
+        if cubo['total']:
             # Información de datos cargados
             col1, col2, col3 = st.columns([2, 2, 1])
             with col1:
-                st.success(f"✅ Datos cargados: **{len(df_all):,} registros** de {len(df_all['codigo_bt'].unique())} distribuidores")
+                st.success(f"✅ Datos cargados: **{cubo['total']:,} registros** de {len(cubo['distribuidores'])} distribuidores")
             with col2:
-                st.info(f"📅 Período: {df_all['fecha_envio'].min().strftime('%Y-%m-%d')} a {df_all['fecha_envio'].max().strftime('%Y-%m-%d')}")
+                st.info(f"📅 Período: {cubo['fecha_min']} a {cubo['fecha_max']}")
             with col3:
-                if st.button("🔄 Recargar", help="Forzar recarga de datos desde la base de datos"):
-                    st.cache_data.clear()
+                if st.button("🔄 Recargar", help="Traer solo los cambios desde la última sincronización"):
+                    with st.spinner("Sincronizando envíos..."):
+                        sincronizar_envios_local()
                     st.rerun()
             
             st.markdown("---")
             
             # Obtener años y distribuidores disponibles
-            años_disponibles = sorted(df_all['año'].unique(), reverse=True)
-            distribuidores_disponibles = sorted(df_all['codigo_bt'].unique())
+            años_disponibles = cubo['años']
+            distribuidores_disponibles = cubo['distribuidores']
             
             # Selectores mejorados
             st.markdown("""
@@ -477,19 +497,21 @@ with tab4:
             
             st.markdown("---")
             
-            # Filtrar por año
-            df_filtrado = df_all[df_all['año'] == año_seleccionado].copy()
-            
-            # Filtrar por distribuidor si no es TODOS
+            # Conteos del año (y distribuidor si no es TODOS) desde el cubo
             if distribuidor_seleccionado != "TODOS LOS DISTRIBUIDORES":
-                df_filtrado = df_filtrado[df_filtrado['codigo_bt'] == distribuidor_seleccionado].copy()
+                conteos = cubo['mensual'].get((año_seleccionado, distribuidor_seleccionado), [0] * 12)
                 titulo_grafica = f'📈 {distribuidor_seleccionado} - {año_seleccionado}'
             else:
+                conteos = cubo['mensual'].get((año_seleccionado, None), [0] * 12)
                 titulo_grafica = f'📈 Surtido General Mensual - {año_seleccionado}'
             
-            # Agrupar por mes
-            df_mensual = df_filtrado.groupby(['mes', 'mes_nombre']).size().reset_index(name='cantidad')
-            df_mensual = df_mensual.sort_values('mes')
+            # Solo los meses con envíos
+            meses = [mes for mes in range(1, 13) if conteos[mes - 1]]
+            df_mensual = pd.DataFrame({
+                'mes': meses,
+                'mes_nombre': [calendar.month_name[mes] for mes in meses],
+                'cantidad': [conteos[mes - 1] for mes in meses]
+            })
             
             # Crear gráfica de barras
             fig_barras = px.bar(
@@ -528,7 +550,7 @@ with tab4:
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                total_periodo = df_filtrado.shape[0]
+                total_periodo = sum(conteos)
                 st.metric("Total SIMs", f"{total_periodo:,}")
             
             with col2:
@@ -565,34 +587,53 @@ with tab4:
             st.markdown("---")
             st.markdown("📄 **Exportar Datos**")
             
-            # Preparar datos para exportación con información detallada
-            df_exportar = df_filtrado[['iccid', 'codigo_bt', 'nombre_distribuidor', 'fecha_envio']].copy()
-            df_exportar['fecha_envio'] = df_exportar['fecha_envio'].dt.strftime('%Y-%m-%d')
-            df_exportar.columns = ['ICCID', 'Código BT', 'Nombre Distribuidor', 'Fecha de Envío']
-            
-            # Crear CSV
-            csv = df_exportar.to_csv(index=False).encode('utf-8-sig')  # utf-8-sig para Excel
-            
             # Nombre de archivo dinámico
             if distribuidor_seleccionado != "TODOS LOS DISTRIBUIDORES":
-                nombre_archivo = f"iccids_{distribuidor_seleccionado.replace(' ', '_')}_{año_seleccionado}.csv"
-                label_boton = f"📅 Descargar ICCIDs de {distribuidor_seleccionado} ({total_periodo:,} registros)"
+                base_archivo = f"iccids_{distribuidor_seleccionado.replace(' ', '_')}_{año_seleccionado}"
+                label_boton = f"📅 Exportar ICCIDs de {distribuidor_seleccionado} ({total_periodo:,} registros)"
             else:
-                nombre_archivo = f"iccids_todos_{año_seleccionado}.csv"
-                label_boton = f"📅 Descargar Todos los ICCIDs de {año_seleccionado} ({total_periodo:,} registros)"
-            
-            st.download_button(
-                label=label_boton,
-                data=csv,
-                file_name=nombre_archivo,
-                mime="text/csv",
-                help="Descarga la relación completa de ICCIDs con detalles de distribuidor y fecha"
-            )
+                base_archivo = f"iccids_todos_{año_seleccionado}"
+                label_boton = f"📅 Exportar Todos los ICCIDs de {año_seleccionado} ({total_periodo:,} registros)"
+            
+            col1, col2 = st.columns([1, 2])
+            
+            with col1:
+                formato_anual = st.selectbox(
+                    "Formato",
+                    list(ETIQUETAS_FORMATO.keys()),
+                    format_func=lambda f: ETIQUETAS_FORMATO[f],
+                    key="formato_exportacion_anual"
+                )
+            
+            with col2:
+                st.write("")
+                # El archivo se genera en segundo plano desde el cache local
+                if st.button(label_boton, help="Genera la relación completa de ICCIDs; se descarga desde el panel 📦 Exportaciones"):
+                    encolar_exportacion(
+                        {
+                            'tipo': 'envios_anual',
+                            'parametros': {
+                                'año': int(año_seleccionado),
+                                'codigo_bt': distribuidor_seleccionado if distribuidor_seleccionado != "TODOS LOS DISTRIBUIDORES" else None
+                            }
+                        },
+                        formato=formato_anual,
+                        nombre_base=base_archivo,
+                        descripcion=f"ICCIDs {año_seleccionado}" + (f" - {distribuidor_seleccionado}" if distribuidor_seleccionado != "TODOS LOS DISTRIBUIDORES" else ""),
+                        sesion=get_sesion_exportaciones(),
+                        total_estimado=total_periodo
+                    )
+                    st.success("✅ Exportación en proceso. Descárgala desde el panel 📦 Exportaciones del menú lateral")
         else:
             st.warning("⚠️ No hay datos disponibles")
     
     else:
-        # Análisis por período (código original)
+        # Se invalida al escribir en envíos; el TTL cubre otros procesos
+        @cache_por_etiquetas('envios', ttl=3600)
+        def cargar_analisis_periodo(fecha_inicio, fecha_fin):
+            """Agregados del período calculados en la base de datos"""
+            return get_analisis_periodo(fecha_inicio, fecha_fin, limite_top=15)
+        
         # Selector de período
         col1, col2 = st.columns(2)
         
@@ -617,102 +658,114 @@ with tab4:
                 fecha_inicio = get_fecha_actual_mexico() - timedelta(days=dias)
                 fecha_fin = get_fecha_actual_mexico()
         
+        # El análisis se guarda en la sesión para que sobreviva al botón de exportar
         if st.button("📊 Generar Análisis", type="primary"):
+            st.session_state['analisis_periodo'] = (fecha_inicio, fecha_fin)
+        
+        if st.session_state.get('analisis_periodo') == (fecha_inicio, fecha_fin):
             with st.spinner("Generando análisis..."):
-                supabase = get_supabase_client()
+                analisis = cargar_analisis_periodo(fecha_inicio, fecha_fin)
+            
+            if analisis['total']:
+                # Métricas del período
+                st.markdown("### 📊 Resumen del Período")
                 
-                # Obtener datos del período
-                envios_periodo = supabase.table('envios')\
-                    .select('fecha_envio, codigo_bt, iccid, estatus')\
-                    .gte('fecha_envio', fecha_inicio.isoformat())\
-                    .lte('fecha_envio', fecha_fin.isoformat())\
-                    .execute()
+                col1, col2, col3, col4 = st.columns(4)
                 
-                if envios_periodo.data:
-                    df = pd.DataFrame(envios_periodo.data)
-                    df['fecha_envio'] = pd.to_datetime(df['fecha_envio'])
-                    
-                    # Métricas del período
-                    st.markdown("### 📊 Resumen del Período")
-                    
-                    col1, col2, col3, col4 = st.columns(4)
-                    
-                    with col1:
-                        st.metric("Total Asignaciones", len(df))
-                    
-                    with col2:
-                        activas = len(df[df['estatus'] == 'ACTIVO'])
-                        st.metric("Activas", activas)
-                    
-                    with col3:
-                        distribuidores_unicos = df['codigo_bt'].nunique()
-                        st.metric("Distribuidores", distribuidores_unicos)
-                    
-                    with col4:
-                        promedio_dia = len(df) / max((fecha_fin - fecha_inicio).days, 1)
-                        st.metric("Promedio/Día", f"{promedio_dia:.1f}")
-                    
-                    st.markdown("---")
-                    
-                    # Gráfica de tendencia
-                    st.markdown("### 📈 Tendencia de Asignaciones")
-                    
-                    df_diario = df.groupby('fecha_envio').size().reset_index(name='cantidad')
-                    
-                    fig = px.area(
-                        df_diario,
-                        x='fecha_envio',
-                        y='cantidad',
-                        labels={'fecha_envio': 'Fecha', 'cantidad': 'Asignaciones'},
-                        color_discrete_sequence=['#1f77b4']
-                    )
-                    
-                    fig.update_layout(height=400, hovermode='x unified')
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    st.markdown("---")
-                    
-                    # Top distribuidores del período
-                    st.markdown("### 🏆 Top Distribuidores del Período")
-                    
-                    top_periodo = df.groupby('codigo_bt').size()\
-                        .reset_index(name='asignaciones')\
-                        .sort_values('asignaciones', ascending=False)\
-                        .head(15)
-                    
-                    fig_top = px.bar(
-                        top_periodo,
-                        x='asignaciones',
-                        y='codigo_bt',
-                        orientation='h',
-                        text='asignaciones',
-                        color='asignaciones',
-                        color_continuous_scale='Viridis'
-                    )
-                    
-                    fig_top.update_layout(
-                        height=500,
-                        showlegend=False,
-                        xaxis_title="Asignaciones",
-                        yaxis_title="",
-                        yaxis={'categoryorder': 'total ascending'}
-                    )
-                    
-                    fig_top.update_traces(textposition='outside')
-                    st.plotly_chart(fig_top, use_container_width=True)
-                    
-                    # Exportar análisis
-                    st.markdown("---")
-                    csv = df.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label="📥 Descargar Datos Completos",
-                        data=csv,
-                        file_name=f"analisis_{fecha_inicio}_{fecha_fin}.csv",
-                        mime="text/csv",
-                        use_container_width=True
+                with col1:
+                    st.metric("Total Asignaciones", analisis['total'])
+                
+                with col2:
+                    activas = analisis['por_estatus'].get('ACTIVO', 0)
+                    st.metric("Activas", activas)
+                
+                with col3:
+                    st.metric("Distribuidores", analisis['distribuidores'])
+                
+                with col4:
+                    promedio_dia = analisis['total'] / max((fecha_fin - fecha_inicio).days, 1)
+                    st.metric("Promedio/Día", f"{promedio_dia:.1f}")
+                
+                st.markdown("---")
+                
+                # Gráfica de tendencia
+                st.markdown("### 📈 Tendencia de Asignaciones")
+                
+                df_diario = pd.DataFrame(analisis['diario']).rename(columns={'fecha': 'fecha_envio'})
+                df_diario['fecha_envio'] = pd.to_datetime(df_diario['fecha_envio'])
+                
+                fig = px.area(
+                    df_diario,
+                    x='fecha_envio',
+                    y='cantidad',
+                    labels={'fecha_envio': 'Fecha', 'cantidad': 'Asignaciones'},
+                    color_discrete_sequence=['#1f77b4']
+                )
+                
+                fig.update_layout(height=400, hovermode='x unified')
+                st.plotly_chart(fig, use_container_width=True)
+                
+                st.markdown("---")
+                
+                # Top distribuidores del período
+                st.markdown("### 🏆 Top Distribuidores del Período")
+                
+                top_periodo = pd.DataFrame(analisis['top']).rename(columns={'cantidad': 'asignaciones'})
+                
+                fig_top = px.bar(
+                    top_periodo,
+                    x='asignaciones',
+                    y='codigo_bt',
+                    orientation='h',
+                    text='asignaciones',
+                    color='asignaciones',
+                    color_continuous_scale='Viridis'
+                )
+                
+                fig_top.update_layout(
+                    height=500,
+                    showlegend=False,
+                    xaxis_title="Asignaciones",
+                    yaxis_title="",
+                    yaxis={'categoryorder': 'total ascending'}
+                )
+                
+                fig_top.update_traces(textposition='outside')
+                st.plotly_chart(fig_top, use_container_width=True)
+                
+                # Exportar análisis: las filas completas solo se descargan aquí
+                st.markdown("---")
+                
+                col1, col2 = st.columns([1, 2])
+                
+                with col1:
+                    formato_periodo = st.selectbox(
+                        "Formato",
+                        list(ETIQUETAS_FORMATO.keys()),
+                        format_func=lambda f: ETIQUETAS_FORMATO[f],
+                        key="formato_exportacion_periodo"
                     )
-                else:
-                    st.warning("⚠️ No hay datos en el período seleccionado")
+                
+                with col2:
+                    st.write("")
+                    if st.button("📦 Exportar Datos Completos", use_container_width=True):
+                        encolar_exportacion(
+                            {
+                                'tipo': 'envios_periodo',
+                                'parametros': {
+                                    'fecha_desde': fecha_inicio.isoformat(),
+                                    'fecha_hasta': fecha_fin.isoformat()
+                                }
+                            },
+                            formato=formato_periodo,
+                            nombre_base=f"analisis_{fecha_inicio}_{fecha_fin}",
+                            descripcion=f"Envíos {fecha_inicio} a {fecha_fin}",
+                            sesion=get_sesion_exportaciones(),
+                            total_estimado=analisis['total']
+                        )
+                        st.success("✅ Exportación en proceso. Descárgala desde el panel 📦 Exportaciones del menú lateral")
+            else:
+                st.warning("⚠️ No hay datos en el período seleccionado")
 
 # Footer
 st.markdown("---")
@@ -721,3 +774,6 @@ st.markdown("""
     <small>💡 Tip: Exporta los reportes a CSV para análisis más profundos en Excel</small>
 </div>
 """, unsafe_allow_html=True)
+
+# Panel de exportaciones en segundo plano
+mostrar_panel_exportaciones()
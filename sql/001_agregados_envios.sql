@@ -0,0 +1,72 @@
+-- ============================================================
+-- Agregados de envios para dashboard y reportes
+-- Ejecutar en el SQL Editor de Supabase
+-- ============================================================
+
+-- Índices para los agrupamientos por estatus, distribuidor y fecha
+CREATE INDEX IF NOT EXISTS idx_envios_estatus_codigo_bt
+    ON envios (estatus, codigo_bt);
+
+CREATE INDEX IF NOT EXISTS idx_envios_fecha_envio_estatus
+    ON envios (fecha_envio, estatus);
+
+
+-- Top N distribuidores por cantidad de SIMs
+CREATE OR REPLACE FUNCTION top_distribuidores_envios(
+    p_limite INT DEFAULT 10,
+    p_estatus TEXT DEFAULT 'ACTIVO',
+    p_desde DATE DEFAULT NULL,
+    p_hasta DATE DEFAULT NULL
+)
+RETURNS TABLE (codigo_bt TEXT, nombre_distribuidor TEXT, total_sims BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.codigo_bt::TEXT, e.nombre_distribuidor::TEXT, COUNT(*) AS total_sims
+    FROM envios e
+    WHERE (p_estatus IS NULL OR e.estatus = p_estatus)
+      AND (p_desde IS NULL OR e.fecha_envio >= p_desde)
+      AND (p_hasta IS NULL OR e.fecha_envio <= p_hasta)
+    GROUP BY e.codigo_bt, e.nombre_distribuidor
+    ORDER BY total_sims DESC, e.codigo_bt
+    LIMIT p_limite;
+$$;
+
+
+-- Cantidad de SIMs por día de envío
+CREATE OR REPLACE FUNCTION conteo_diario_envios(
+    p_desde DATE,
+    p_hasta DATE DEFAULT NULL,
+    p_estatus TEXT DEFAULT 'ACTIVO'
+)
+RETURNS TABLE (fecha DATE, cantidad BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.fecha_envio::DATE AS fecha, COUNT(*) AS cantidad
+    FROM envios e
+    WHERE e.fecha_envio >= p_desde
+      AND (p_hasta IS NULL OR e.fecha_envio <= p_hasta)
+      AND (p_estatus IS NULL OR e.estatus = p_estatus)
+    GROUP BY e.fecha_envio::DATE
+    ORDER BY fecha;
+$$;
+
+
+-- Cantidad de SIMs por estatus
+CREATE OR REPLACE FUNCTION conteo_envios_por_estatus(
+    p_desde DATE DEFAULT NULL,
+    p_hasta DATE DEFAULT NULL
+)
+RETURNS TABLE (estatus TEXT, cantidad BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.estatus::TEXT, COUNT(*) AS cantidad
+    FROM envios e
+    WHERE (p_desde IS NULL OR e.fecha_envio >= p_desde)
+      AND (p_hasta IS NULL OR e.fecha_envio <= p_hasta)
+    GROUP BY e.estatus;
+$$;
+
+
+GRANT EXECUTE ON FUNCTION top_distribuidores_envios(INT, TEXT, DATE, DATE) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION conteo_diario_envios(DATE, DATE, TEXT) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION conteo_envios_por_estatus(DATE, DATE) TO anon, authenticated;
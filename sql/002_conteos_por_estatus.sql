@@ -0,0 +1,56 @@
+-- ============================================================
+-- Conteo por estatus en una sola consulta (envios / distribuidores)
+-- Ejecutar en el SQL Editor de Supabase
+-- ============================================================
+
+-- Regresa todos los estatus de la tabla en un solo GROUP BY.
+-- Con p_estimado = TRUE usa el total estimado del catálogo (pg_class.reltuples)
+-- y una muestra TABLESAMPLE para repartirlo por estatus, sin recorrer la tabla.
+CREATE OR REPLACE FUNCTION conteo_por_estatus(
+    p_tabla TEXT,
+    p_estimado BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (estatus TEXT, cantidad BIGINT)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    v_total_estimado DOUBLE PRECISION;
+    v_porcentaje DOUBLE PRECISION;
+BEGIN
+    IF p_tabla NOT IN ('envios', 'distribuidores') THEN
+        RAISE EXCEPTION 'Tabla no permitida: %', p_tabla;
+    END IF;
+
+    IF p_estimado THEN
+        SELECT c.reltuples INTO v_total_estimado
+        FROM pg_class c
+        WHERE c.oid = format('public.%I', p_tabla)::REGCLASS;
+
+        -- reltuples = -1 (sin ANALYZE) o tabla chica: se cuenta exacto
+        IF v_total_estimado > 100000 THEN
+            -- Muestra de ~20,000 filas
+            v_porcentaje := LEAST(100, 20000 * 100 / v_total_estimado);
+
+            RETURN QUERY EXECUTE format(
+                'SELECT t.estatus::TEXT,
+                        ROUND(COUNT(*) * $1 / SUM(COUNT(*)) OVER ())::BIGINT
+                 FROM public.%I t TABLESAMPLE SYSTEM (%s)
+                 GROUP BY t.estatus',
+                p_tabla, v_porcentaje
+            ) USING v_total_estimado;
+
+            IF FOUND THEN
+                RETURN;
+            END IF;
+        END IF;
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'SELECT t.estatus::TEXT, COUNT(*)::BIGINT FROM public.%I t GROUP BY t.estatus',
+        p_tabla
+    );
+END;
+$$;
+
+
+GRANT EXECUTE ON FUNCTION conteo_por_estatus(TEXT, BOOLEAN) TO anon, authenticated;
@@ -0,0 +1,53 @@
+-- ============================================================
+-- Registro de envíos eliminados para la sincronización incremental
+-- del cache local de Reportes (utils/envios_cache.py)
+-- Ejecutar en el SQL Editor de Supabase
+-- ============================================================
+
+-- Índices para pedir solo lo nuevo / modificado desde la última marca de agua
+CREATE INDEX IF NOT EXISTS idx_envios_created_at ON envios (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_envios_updated_at ON envios (updated_at, id);
+
+-- Tombstones: una fila por cada envío borrado
+CREATE TABLE IF NOT EXISTS envios_eliminados (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    envio_id TEXT NOT NULL,
+    iccid TEXT,
+    eliminado_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_envios_eliminados_eliminado_at
+    ON envios_eliminados (eliminado_at, id);
+
+CREATE OR REPLACE FUNCTION registrar_envio_eliminado()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    INSERT INTO envios_eliminados (envio_id, iccid)
+    VALUES (OLD.id::TEXT, OLD.iccid);
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_envios_eliminados ON envios;
+CREATE TRIGGER trg_envios_eliminados
+    AFTER DELETE ON envios
+    FOR EACH ROW
+    EXECUTE FUNCTION registrar_envio_eliminado();
+
+-- Solo lectura desde la aplicación; las filas las escribe el trigger
+ALTER TABLE envios_eliminados ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS envios_eliminados_lectura ON envios_eliminados;
+CREATE POLICY envios_eliminados_lectura ON envios_eliminados
+    FOR SELECT TO anon, authenticated
+    USING (TRUE);
+
+GRANT SELECT ON envios_eliminados TO anon, authenticated;
+
+-- Opcional: depurar tombstones viejos (los caches más atrasados que esto
+-- se corrigen con la reconciliación por conteo)
+-- DELETE FROM envios_eliminados WHERE eliminado_at < NOW() - INTERVAL '90 days';
@@ -0,0 +1,56 @@
+-- ============================================================
+-- Análisis por período de envios en una sola llamada
+-- Ejecutar en el SQL Editor de Supabase (requiere 001_agregados_envios.sql)
+-- ============================================================
+
+-- Regresa en un solo JSON los agregados de la vista "Análisis por Período":
+-- total, conteo por estatus, distribuidores distintos, conteo diario y top N.
+-- Todo se calcula con GROUP BY, así que no depende del límite de filas de la API.
+CREATE OR REPLACE FUNCTION analisis_periodo_envios(
+    p_desde DATE,
+    p_hasta DATE,
+    p_limite INT DEFAULT 15
+)
+RETURNS JSON
+LANGUAGE sql STABLE
+AS $$
+    WITH periodo AS (
+        SELECT e.fecha_envio::DATE AS fecha, e.codigo_bt, e.estatus
+        FROM envios e
+        WHERE e.fecha_envio >= p_desde
+          AND e.fecha_envio <= p_hasta
+    ),
+    por_estatus AS (
+        SELECT estatus::TEXT AS estatus, COUNT(*) AS cantidad
+        FROM periodo
+        GROUP BY estatus
+    ),
+    diario AS (
+        SELECT fecha, COUNT(*) AS cantidad
+        FROM periodo
+        GROUP BY fecha
+    ),
+    por_distribuidor AS (
+        SELECT codigo_bt::TEXT AS codigo_bt, COUNT(*) AS cantidad
+        FROM periodo
+        GROUP BY codigo_bt
+    )
+    SELECT json_build_object(
+        'total', (SELECT COALESCE(SUM(cantidad), 0) FROM por_estatus),
+        'por_estatus', (SELECT COALESCE(json_agg(s), '[]'::JSON) FROM por_estatus s),
+        'distribuidores', (SELECT COUNT(*) FROM por_distribuidor),
+        'diario', (SELECT COALESCE(json_agg(d ORDER BY d.fecha), '[]'::JSON) FROM diario d),
+        'top', (
+            SELECT COALESCE(json_agg(t ORDER BY t.cantidad DESC, t.codigo_bt), '[]'::JSON)
+            FROM (
+                SELECT codigo_bt, cantidad
+                FROM por_distribuidor
+                ORDER BY cantidad DESC, codigo_bt
+                LIMIT p_limite
+            ) t
+        )
+    );
+$$;
+
+
+GRANT EXECUTE ON FUNCTION analisis_periodo_envios(DATE, DATE, INT) TO anon, authenticated;
@@ -0,0 +1,35 @@
+-- ============================================================
+-- Un solo envío ACTIVO por ICCID, garantizado por la base de datos
+-- (captura idempotente de utils/envios_db.py: upsert con
+-- on_conflict='iccid_activo' e ignore_duplicates)
+-- Ejecutar en el SQL Editor de Supabase
+-- ============================================================
+
+-- Antes de aplicar: no debe haber ICCIDs con más de un envío ACTIVO.
+-- Si esta consulta regresa filas, corregirlas (cancelar o eliminar los
+-- envíos sobrantes) y volver a ejecutar el script.
+--
+--   SELECT iccid, COUNT(*)
+--   FROM envios
+--   WHERE estatus = 'ACTIVO'
+--   GROUP BY iccid
+--   HAVING COUNT(*) > 1;
+
+-- ICCID solo mientras el envío está ACTIVO (NULL en REASIGNADO / CANCELADO).
+-- Los envíos REASIGNADO conservan el historial del mismo ICCID, por eso la
+-- restricción no puede ir sobre iccid directamente.
+ALTER TABLE envios
+    ADD COLUMN IF NOT EXISTS iccid_activo TEXT
+    GENERATED ALWAYS AS (CASE WHEN estatus = 'ACTIVO' THEN iccid END) STORED;
+
+-- UNIQUE permite varios NULL: solo limita los envíos ACTIVO
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'envios_iccid_activo_key'
+    ) THEN
+        ALTER TABLE envios
+            ADD CONSTRAINT envios_iccid_activo_key UNIQUE (iccid_activo);
+    END IF;
+END;
+$$;
@@ -0,0 +1,328 @@
+-- ============================================================
+-- Resumen diario de envios (envios_diario) mantenido al escribir
+-- Ejecutar en el SQL Editor de Supabase (requiere 001 y 004: reemplaza
+-- sus funciones de agregados para que lean el resumen)
+-- ============================================================
+
+-- Una fila por día, distribuidor y estatus con la cantidad de envíos.
+-- Los agregados del dashboard y de reportes leen miles de filas de aquí
+-- en lugar de millones de filas de envios.
+CREATE TABLE IF NOT EXISTS envios_diario (
+    fecha_envio DATE NOT NULL,
+    codigo_bt TEXT NOT NULL,
+    estatus TEXT NOT NULL,
+    cantidad BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha_envio, codigo_bt, estatus)
+);
+
+CREATE INDEX IF NOT EXISTS idx_envios_diario_codigo_bt
+    ON envios_diario (codigo_bt, fecha_envio);
+
+
+-- Aplica los cambios de una sentencia sobre envios (captura, reasignación,
+-- cancelación, correcciones y eliminación). Es un trigger por sentencia con
+-- tablas de transición: una captura de 1,000 ICCIDs hace un solo UPSERT
+-- agrupado, no 1,000.
+CREATE OR REPLACE FUNCTION actualizar_envios_diario()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    -- Cada rama usa solo las tablas de transición que declara su trigger
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO envios_diario AS d (fecha_envio, codigo_bt, estatus, cantidad)
+        SELECT n.fecha_envio::DATE, COALESCE(n.codigo_bt, ''), COALESCE(n.estatus, ''), COUNT(*)
+        FROM nuevas n
+        WHERE n.fecha_envio IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (fecha_envio, codigo_bt, estatus)
+        DO UPDATE SET cantidad = d.cantidad + EXCLUDED.cantidad;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Cada fila resta en su llave anterior y suma en la nueva; las que
+        -- no cambiaron de fecha, distribuidor ni estatus se cancelan
+        INSERT INTO envios_diario AS d (fecha_envio, codigo_bt, estatus, cantidad)
+        SELECT c.fecha_envio, c.codigo_bt, c.estatus, SUM(c.delta)
+        FROM (
+            SELECT n.fecha_envio::DATE AS fecha_envio, COALESCE(n.codigo_bt, '') AS codigo_bt,
+                   COALESCE(n.estatus, '') AS estatus, 1 AS delta
+            FROM nuevas n
+            WHERE n.fecha_envio IS NOT NULL
+            UNION ALL
+            SELECT a.fecha_envio::DATE, COALESCE(a.codigo_bt, ''), COALESCE(a.estatus, ''), -1
+            FROM anteriores a
+            WHERE a.fecha_envio IS NOT NULL
+        ) c
+        GROUP BY c.fecha_envio, c.codigo_bt, c.estatus
+        HAVING SUM(c.delta) <> 0
+        ON CONFLICT (fecha_envio, codigo_bt, estatus)
+        DO UPDATE SET cantidad = d.cantidad + EXCLUDED.cantidad;
+
+        -- Solo las llaves que restaron pueden quedar en cero
+        DELETE FROM envios_diario d
+        USING (
+            SELECT DISTINCT a.fecha_envio::DATE AS fecha_envio, COALESCE(a.codigo_bt, '') AS codigo_bt,
+                   COALESCE(a.estatus, '') AS estatus
+            FROM anteriores a
+            WHERE a.fecha_envio IS NOT NULL
+        ) k
+        WHERE d.fecha_envio = k.fecha_envio
+          AND d.codigo_bt = k.codigo_bt
+          AND d.estatus = k.estatus
+          AND d.cantidad = 0;
+
+    ELSE
+        INSERT INTO envios_diario AS d (fecha_envio, codigo_bt, estatus, cantidad)
+        SELECT a.fecha_envio::DATE, COALESCE(a.codigo_bt, ''), COALESCE(a.estatus, ''), -COUNT(*)
+        FROM anteriores a
+        WHERE a.fecha_envio IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (fecha_envio, codigo_bt, estatus)
+        DO UPDATE SET cantidad = d.cantidad + EXCLUDED.cantidad;
+
+        -- Solo las llaves que restaron pueden quedar en cero
+        DELETE FROM envios_diario d
+        USING (
+            SELECT DISTINCT a.fecha_envio::DATE AS fecha_envio, COALESCE(a.codigo_bt, '') AS codigo_bt,
+                   COALESCE(a.estatus, '') AS estatus
+            FROM anteriores a
+            WHERE a.fecha_envio IS NOT NULL
+        ) k
+        WHERE d.fecha_envio = k.fecha_envio
+          AND d.codigo_bt = k.codigo_bt
+          AND d.estatus = k.estatus
+          AND d.cantidad = 0;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+-- Las tablas de transición solo se permiten en triggers de un solo evento
+DROP TRIGGER IF EXISTS trg_envios_diario_insert ON envios;
+CREATE TRIGGER trg_envios_diario_insert
+    AFTER INSERT ON envios
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION actualizar_envios_diario();
+
+DROP TRIGGER IF EXISTS trg_envios_diario_update ON envios;
+CREATE TRIGGER trg_envios_diario_update
+    AFTER UPDATE ON envios
+    REFERENCING OLD TABLE AS anteriores NEW TABLE AS nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION actualizar_envios_diario();
+
+DROP TRIGGER IF EXISTS trg_envios_diario_delete ON envios;
+CREATE TRIGGER trg_envios_diario_delete
+    AFTER DELETE ON envios
+    REFERENCING OLD TABLE AS anteriores
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION actualizar_envios_diario();
+
+
+-- Reconstruir el resumen completo desde envios. Bloquea las escrituras en
+-- envios mientras recalcula (las lecturas siguen). Regresa las filas creadas.
+-- Solo la puede ejecutar service_role (ver permisos al final).
+--
+--   SELECT reconstruir_envios_diario();
+CREATE OR REPLACE FUNCTION reconstruir_envios_diario()
+RETURNS BIGINT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_filas BIGINT;
+BEGIN
+    LOCK TABLE envios IN SHARE MODE;
+
+    DELETE FROM envios_diario;
+
+    INSERT INTO envios_diario (fecha_envio, codigo_bt, estatus, cantidad)
+    SELECT e.fecha_envio::DATE, COALESCE(e.codigo_bt, ''), COALESCE(e.estatus, ''), COUNT(*)
+    FROM envios e
+    WHERE e.fecha_envio IS NOT NULL
+    GROUP BY 1, 2, 3;
+
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    RETURN v_filas;
+END;
+$$;
+
+
+-- Comparar el resumen con envios. Sin filas = el resumen está al día; si
+-- regresa diferencias, ejecutar reconstruir_envios_diario().
+--
+--   SELECT * FROM verificar_envios_diario();
+CREATE OR REPLACE FUNCTION verificar_envios_diario()
+RETURNS TABLE (
+    fecha_envio DATE,
+    codigo_bt TEXT,
+    estatus TEXT,
+    cantidad_resumen BIGINT,
+    cantidad_real BIGINT
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH real AS (
+        SELECT e.fecha_envio::DATE AS fecha_envio, COALESCE(e.codigo_bt, '')::TEXT AS codigo_bt,
+               COALESCE(e.estatus, '')::TEXT AS estatus, COUNT(*) AS cantidad
+        FROM envios e
+        WHERE e.fecha_envio IS NOT NULL
+        GROUP BY 1, 2, 3
+    )
+    SELECT COALESCE(d.fecha_envio, r.fecha_envio),
+           COALESCE(d.codigo_bt, r.codigo_bt),
+           COALESCE(d.estatus, r.estatus),
+           COALESCE(d.cantidad, 0),
+           COALESCE(r.cantidad, 0)
+    FROM envios_diario d
+    FULL OUTER JOIN real r
+        ON r.fecha_envio = d.fecha_envio
+       AND r.codigo_bt = d.codigo_bt
+       AND r.estatus = d.estatus
+    WHERE COALESCE(d.cantidad, 0) <> COALESCE(r.cantidad, 0)
+    ORDER BY 1, 2, 3;
+$$;
+
+
+-- ============================================================
+-- Agregados de 001 y 004 leyendo el resumen (mismas firmas y resultados)
+-- ============================================================
+
+-- Top N distribuidores por cantidad de SIMs (nombre tomado del catálogo)
+CREATE OR REPLACE FUNCTION top_distribuidores_envios(
+    p_limite INT DEFAULT 10,
+    p_estatus TEXT DEFAULT 'ACTIVO',
+    p_desde DATE DEFAULT NULL,
+    p_hasta DATE DEFAULT NULL
+)
+RETURNS TABLE (codigo_bt TEXT, nombre_distribuidor TEXT, total_sims BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT t.codigo_bt, COALESCE(dist.nombre::TEXT, t.codigo_bt), t.total_sims
+    FROM (
+        SELECT d.codigo_bt, SUM(d.cantidad)::BIGINT AS total_sims
+        FROM envios_diario d
+        WHERE (p_estatus IS NULL OR d.estatus = p_estatus)
+          AND (p_desde IS NULL OR d.fecha_envio >= p_desde)
+          AND (p_hasta IS NULL OR d.fecha_envio <= p_hasta)
+        GROUP BY d.codigo_bt
+        ORDER BY total_sims DESC, d.codigo_bt
+        LIMIT p_limite
+    ) t
+    LEFT JOIN LATERAL (
+        SELECT x.nombre FROM distribuidores x WHERE x.codigo_bt = t.codigo_bt LIMIT 1
+    ) dist ON TRUE
+    ORDER BY t.total_sims DESC, t.codigo_bt;
+$$;
+
+
+-- Cantidad de SIMs por día de envío
+CREATE OR REPLACE FUNCTION conteo_diario_envios(
+    p_desde DATE,
+    p_hasta DATE DEFAULT NULL,
+    p_estatus TEXT DEFAULT 'ACTIVO'
+)
+RETURNS TABLE (fecha DATE, cantidad BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT d.fecha_envio AS fecha, SUM(d.cantidad)::BIGINT AS cantidad
+    FROM envios_diario d
+    WHERE d.fecha_envio >= p_desde
+      AND (p_hasta IS NULL OR d.fecha_envio <= p_hasta)
+      AND (p_estatus IS NULL OR d.estatus = p_estatus)
+    GROUP BY d.fecha_envio
+    ORDER BY fecha;
+$$;
+
+
+-- Cantidad de SIMs por estatus
+CREATE OR REPLACE FUNCTION conteo_envios_por_estatus(
+    p_desde DATE DEFAULT NULL,
+    p_hasta DATE DEFAULT NULL
+)
+RETURNS TABLE (estatus TEXT, cantidad BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT d.estatus, SUM(d.cantidad)::BIGINT AS cantidad
+    FROM envios_diario d
+    WHERE (p_desde IS NULL OR d.fecha_envio >= p_desde)
+      AND (p_hasta IS NULL OR d.fecha_envio <= p_hasta)
+    GROUP BY d.estatus;
+$$;
+
+
+-- Análisis por período en una sola llamada (ver 004_analisis_periodo.sql)
+CREATE OR REPLACE FUNCTION analisis_periodo_envios(
+    p_desde DATE,
+    p_hasta DATE,
+    p_limite INT DEFAULT 15
+)
+RETURNS JSON
+LANGUAGE sql STABLE
+AS $$
+    WITH periodo AS (
+        SELECT d.fecha_envio AS fecha, d.codigo_bt, d.estatus, d.cantidad
+        FROM envios_diario d
+        WHERE d.fecha_envio >= p_desde
+          AND d.fecha_envio <= p_hasta
+    ),
+    por_estatus AS (
+        SELECT estatus, SUM(cantidad)::BIGINT AS cantidad
+        FROM periodo
+        GROUP BY estatus
+    ),
+    diario AS (
+        SELECT fecha, SUM(cantidad)::BIGINT AS cantidad
+        FROM periodo
+        GROUP BY fecha
+    ),
+    por_distribuidor AS (
+        SELECT codigo_bt, SUM(cantidad)::BIGINT AS cantidad
+        FROM periodo
+        GROUP BY codigo_bt
+    )
+    SELECT json_build_object(
+        'total', (SELECT COALESCE(SUM(cantidad), 0) FROM por_estatus),
+        'por_estatus', (SELECT COALESCE(json_agg(s), '[]'::JSON) FROM por_estatus s),
+        'distribuidores', (SELECT COUNT(*) FROM por_distribuidor),
+        'diario', (SELECT COALESCE(json_agg(d ORDER BY d.fecha), '[]'::JSON) FROM diario d),
+        'top', (
+            SELECT COALESCE(json_agg(t ORDER BY t.cantidad DESC, t.codigo_bt), '[]'::JSON)
+            FROM (
+                SELECT codigo_bt, cantidad
+                FROM por_distribuidor
+                ORDER BY cantidad DESC, codigo_bt
+                LIMIT p_limite
+            ) t
+        )
+    );
+$$;
+
+
+-- Carga inicial (y corrección si el resumen ya existía)
+SELECT reconstruir_envios_diario();
+
+-- Solo lectura desde la aplicación; las filas las escribe el trigger
+ALTER TABLE envios_diario ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS envios_diario_lectura ON envios_diario;
+CREATE POLICY envios_diario_lectura ON envios_diario
+    FOR SELECT TO anon, authenticated
+    USING (TRUE);
+
+GRANT SELECT ON envios_diario TO anon, authenticated;
+
+-- La reconstrucción bloquea las escrituras en envios: solo para service_role
+-- (SQL Editor o la llave de servicio), no para la llave pública
+REVOKE EXECUTE ON FUNCTION reconstruir_envios_diario() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION reconstruir_envios_diario() TO service_role;
+GRANT EXECUTE ON FUNCTION verificar_envios_diario() TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION top_distribuidores_envios(INT, TEXT, DATE, DATE) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION conteo_diario_envios(DATE, DATE, TEXT) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION conteo_envios_por_estatus(DATE, DATE) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION analisis_periodo_envios(DATE, DATE, INT) TO anon, authenticated;
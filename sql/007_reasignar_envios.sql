@@ -0,0 +1,82 @@
+-- ============================================================
+-- Reasignación de un lote de envíos en una sola transacción
+-- (utils/envios_db.py: reasignar_sims_masivo / reasignar_sim)
+-- Ejecutar en el SQL Editor de Supabase (requiere 005)
+-- ============================================================
+
+-- Marca los envíos como REASIGNADO, registra el historial y crea los nuevos
+-- envíos ACTIVO. Si algo falla (un envío ya no existe, otro proceso ya
+-- reasignó el ICCID, etc.) no se aplica nada del lote y nadie ve el estado
+-- intermedio.
+--
+-- p_ids y p_iccids son los envíos a reasignar (el ICCID permite usar su
+-- índice; el id se compara como texto). Regresa los nuevos envíos (JSON).
+CREATE OR REPLACE FUNCTION reasignar_envios(
+    p_ids TEXT[],
+    p_iccids TEXT[],
+    p_distribuidor_id TEXT,
+    p_codigo_bt TEXT,
+    p_nombre TEXT,
+    p_motivo TEXT,
+    p_usuario TEXT,
+    p_fecha DATE
+)
+RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_distribuidor_id distribuidores.id%TYPE;
+    v_filas BIGINT;
+    v_nuevos JSON;
+BEGIN
+    SELECT d.id INTO v_distribuidor_id
+    FROM distribuidores d
+    WHERE d.id::TEXT = p_distribuidor_id;
+
+    IF v_distribuidor_id IS NULL THEN
+        RAISE EXCEPTION 'Distribuidor no encontrado: %', p_distribuidor_id;
+    END IF;
+
+    -- 1. Historial (antes de cambiar el estatus, con el distribuidor anterior)
+    INSERT INTO historial_cambios (
+        envio_id, tipo_cambio, distribuidor_anterior_id, distribuidor_nuevo_id,
+        codigo_bt_anterior, codigo_bt_nuevo, motivo, usuario
+    )
+    SELECT e.id, 'REASIGNACION', e.distribuidor_id, v_distribuidor_id,
+           e.codigo_bt, p_codigo_bt, p_motivo, p_usuario
+    FROM envios e
+    WHERE e.iccid = ANY(p_iccids)
+      AND e.id::TEXT = ANY(p_ids);
+
+    -- 2. Marcar los envíos actuales (bloquea las filas hasta el final)
+    UPDATE envios e
+    SET estatus = 'REASIGNADO',
+        updated_at = NOW()
+    WHERE e.iccid = ANY(p_iccids)
+      AND e.id::TEXT = ANY(p_ids);
+
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    IF v_filas <> cardinality(p_ids) THEN
+        RAISE EXCEPTION 'Solo se encontraron % de % envíos (modificados o eliminados)', v_filas, cardinality(p_ids);
+    END IF;
+
+    -- 3. Nuevos envíos ACTIVO (la restricción de 005 impide duplicarlos)
+    WITH nuevos AS (
+        INSERT INTO envios (
+            fecha_envio, iccid, distribuidor_id, codigo_bt, nombre_distribuidor,
+            estatus, observaciones, usuario_captura
+        )
+        SELECT p_fecha, e.iccid, v_distribuidor_id, p_codigo_bt, p_nombre,
+               'ACTIVO', 'REASIGNADO: ' || p_motivo, p_usuario
+        FROM envios e
+        WHERE e.iccid = ANY(p_iccids)
+          AND e.id::TEXT = ANY(p_ids)
+        RETURNING *
+    )
+    SELECT COALESCE(json_agg(n), '[]'::JSON) INTO v_nuevos FROM nuevos n;
+
+    RETURN v_nuevos;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION reasignar_envios(TEXT[], TEXT[], TEXT, TEXT, TEXT, TEXT, TEXT, DATE) TO anon, authenticated;
@@ -0,0 +1,46 @@
+"""
+Pruebas de construir_df_envios (utils/envios_df.py)
+"""
+
+import pandas as pd
+
+from utils.envios_df import construir_df_envios
+
+
+COLUMNAS = ['iccid', 'nombre_distribuidor', 'estatus']
+
+
+def test_pagina_solo_con_nulos_en_categorias():
+    paginas = [
+        [{'iccid': '8952000000000000001', 'nombre_distribuidor': 'DIST A', 'estatus': 'ACTIVO'}],
+        [{'iccid': '8952000000000000002', 'nombre_distribuidor': None, 'estatus': None}]
+    ]
+    
+    df = construir_df_envios(paginas, COLUMNAS)
+    
+    assert len(df) == 2
+    assert isinstance(df['nombre_distribuidor'].dtype, pd.CategoricalDtype)
+    assert df['nombre_distribuidor'].cat.categories.dtype == object
+    assert df['nombre_distribuidor'].iloc[0] == 'DIST A'
+    assert pd.isna(df['nombre_distribuidor'].iloc[1])
+    assert list(df['estatus'].cat.categories) == ['ACTIVO']
+
+
+def test_pagina_de_dataframe_solo_con_nulos():
+    paginas = [
+        pd.DataFrame({'iccid': ['8952000000000000001'], 'nombre_distribuidor': [None], 'estatus': [None]}),
+        [{'iccid': '8952000000000000002', 'nombre_distribuidor': 'DIST B', 'estatus': 'CANCELADO'}]
+    ]
+    
+    df = construir_df_envios(paginas, COLUMNAS)
+    
+    assert df['nombre_distribuidor'].tolist()[1] == 'DIST B'
+    assert list(df['estatus'].cat.categories) == ['CANCELADO']
+
+
+def test_sin_paginas_mantiene_tipos():
+    df = construir_df_envios([], COLUMNAS)
+    
+    assert df.empty
+    assert isinstance(df['estatus'].dtype, pd.CategoricalDtype)
+    assert df['estatus'].cat.categories.dtype == object
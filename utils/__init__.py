@@ -2,7 +2,8 @@
 Módulo de utilidades para el sistema de inventario BAITEL
 """
 
-from .supabase_client import get_supabase_client
+from .supabase_client import get_supabase_client, get_metricas_supabase, reiniciar_metricas_supabase
+from .asincrono import ejecutar, ejecutar_en_paralelo
 from .distribuidores_db import (
     buscar_distribuidores,
     get_distribuidor_by_codigo,
@@ -11,21 +12,45 @@ from .distribuidores_db import (
     actualizar_distribuidor,
     get_siguiente_codigo_bt,
     get_estadisticas_distribuidores,
-    get_todos_distribuidores
+    get_todos_distribuidores,
+    get_indice_distribuidores,
+    invalidar_catalogo_distribuidores,
+    resolver_codigos_bt
 )
 from .envios_db import (
     capturar_envio_masivo,
+    capturar_envios_multi,
     buscar_envios,
+    iter_envios,
     get_envio_by_iccid,
+    get_envios_by_iccids,
     corregir_distribuidor_envio,
+    corregir_distribuidor_masivo,
     reasignar_sim,
+    reasignar_sims_masivo,
     get_estadisticas_envios,
+    get_top_distribuidores,
+    get_conteo_diario,
+    get_conteo_por_estatus,
+    get_analisis_periodo,
+    verificar_envios_diario,
+    reconstruir_envios_diario,
     get_sims_por_distribuidor,
     cancelar_envio
 )
+from .invalidacion import (
+    publicar,
+    suscribir,
+    version_etiquetas,
+    cache_por_etiquetas
+)
 
 __all__ = [
     'get_supabase_client',
+    'get_metricas_supabase',
+    'reiniciar_metricas_supabase',
+    'ejecutar',
+    'ejecutar_en_paralelo',
     'buscar_distribuidores',
     'get_distribuidor_by_codigo',
     'get_distribuidor_by_id',
@@ -34,12 +59,30 @@ __all__ = [
     'get_siguiente_codigo_bt',
     'get_estadisticas_distribuidores',
     'get_todos_distribuidores',
+    'get_indice_distribuidores',
+    'invalidar_catalogo_distribuidores',
+    'resolver_codigos_bt',
     'capturar_envio_masivo',
+    'capturar_envios_multi',
     'buscar_envios',
+    'iter_envios',
     'get_envio_by_iccid',
+    'get_envios_by_iccids',
     'corregir_distribuidor_envio',
+    'corregir_distribuidor_masivo',
     'reasignar_sim',
+    'reasignar_sims_masivo',
     'get_estadisticas_envios',
+    'get_top_distribuidores',
+    'get_conteo_diario',
+    'get_conteo_por_estatus',
+    'get_analisis_periodo',
+    'verificar_envios_diario',
+    'reconstruir_envios_diario',
     'get_sims_por_distribuidor',
-    'cancelar_envio'
+    'cancelar_envio',
+    'publicar',
+    'suscribir',
+    'version_etiquetas',
+    'cache_por_etiquetas'
 ]
@@ -0,0 +1,46 @@
+"""
+Almacenamiento local en disco (caches y archivos generados)
+"""
+
+import os
+import sqlite3
+import tempfile
+from typing import Optional
+
+
+def get_directorio_local(subdirectorio: Optional[str] = None) -> str:
+    """
+    Obtener (y crear si no existe) el directorio local de la aplicación
+    
+    Usa BAITEL_DIRECTORIO_LOCAL si está configurado, si no el directorio
+    temporal del sistema.
+    
+    Args:
+        subdirectorio: Subdirectorio opcional dentro del directorio local
+    
+    Returns:
+        Ruta absoluta del directorio
+    """
+    directorio = os.getenv("BAITEL_DIRECTORIO_LOCAL") or os.path.join(tempfile.gettempdir(), "baitel_sims")
+    
+    if subdirectorio:
+        directorio = os.path.join(directorio, subdirectorio)
+    
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def conectar_sqlite(nombre: str) -> sqlite3.Connection:
+    """
+    Abrir una base SQLite local dentro del directorio de la aplicación
+    
+    Args:
+        nombre: Nombre del archivo (ej: envios_cache.db)
+    
+    Returns:
+        Conexión SQLite (modo WAL para lecturas concurrentes)
+    """
+    conexion = sqlite3.connect(os.path.join(get_directorio_local(), nombre), timeout=30)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    return conexion
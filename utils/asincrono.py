@@ -0,0 +1,66 @@
+"""
+Puente entre Streamlit (síncrono) y la capa de datos async: un event loop
+en un hilo de fondo, compartido por todas las sesiones del proceso
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, List, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock_loop = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Obtener el event loop de fondo (se crea la primera vez)"""
+    global _loop
+    
+    with _lock_loop:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="baitel-asyncio", daemon=True).start()
+        return _loop
+
+
+def ejecutar(corrutina: Awaitable) -> Any:
+    """
+    Ejecutar una corrutina en el event loop de fondo y esperar su resultado
+    
+    Args:
+        corrutina: Corrutina a ejecutar (ej: envios_db_async.get_conteo_diario())
+    
+    Returns:
+        Resultado de la corrutina (las excepciones se propagan)
+    """
+    loop = _get_loop()
+    
+    try:
+        en_el_loop = asyncio.get_running_loop() is loop
+    except RuntimeError:
+        en_el_loop = False
+    
+    if en_el_loop:
+        # Esperar aquí bloquearía el loop que tiene que ejecutar la corrutina
+        raise RuntimeError("ejecutar() no se puede llamar desde el event loop de fondo; usar await")
+    
+    return asyncio.run_coroutine_threadsafe(corrutina, loop).result()
+
+
+def ejecutar_en_paralelo(*corrutinas: Awaitable, return_exceptions: bool = False) -> List:
+    """
+    Ejecutar varias corrutinas al mismo tiempo (asyncio.gather)
+    
+    El tiempo total es el de la consulta más lenta, no la suma de todas.
+    
+    Args:
+        *corrutinas: Corrutinas independientes entre sí
+        return_exceptions: Regresar las excepciones en la lista en lugar de
+            propagar la primera
+    
+    Returns:
+        Lista de resultados en el mismo orden que las corrutinas
+    """
+    async def reunir():
+        return list(await asyncio.gather(*corrutinas, return_exceptions=return_exceptions))
+    
+    return ejecutar(reunir())
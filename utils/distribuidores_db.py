@@ -2,47 +2,102 @@
 Funciones CRUD para la tabla distribuidores
 """
 
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import List, Dict, Iterable, Optional
 from datetime import datetime
 from .supabase_client import get_supabase_client
+from .indice_distribuidores import IndiceDistribuidores
+from .invalidacion import publicar, suscribir
+
+# Filas por página al leer la tabla completa
+TAMANO_PAGINA_DISTRIBUIDORES = 1000
+
+# Segundos que el catálogo en memoria se considera vigente (por si otro
+# proceso modifica distribuidores; las escrituras de este proceso lo invalidan)
+TTL_CATALOGO_SEGUNDOS = 300
+
+# Catálogo de distribuidores compartido por todo el proceso
+_catalogo: Dict = {'indice': None, 'cargado_en': 0.0}
+_lock_catalogo = threading.Lock()
+
+
+def get_indice_distribuidores() -> IndiceDistribuidores:
+    """
+    Obtener el índice en memoria de distribuidores (se construye una vez
+    con get_todos_distribuidores y se reutiliza hasta invalidarse)
+    
+    Returns:
+        IndiceDistribuidores con el catálogo completo
+    """
+    with _lock_catalogo:
+        vigente = time.monotonic() - _catalogo['cargado_en'] < TTL_CATALOGO_SEGUNDOS
+        
+        if _catalogo['indice'] is None or not vigente:
+            _catalogo['indice'] = IndiceDistribuidores(get_todos_distribuidores())
+            _catalogo['cargado_en'] = time.monotonic()
+        
+        return _catalogo['indice']
+
+
+def invalidar_catalogo_distribuidores():
+    """Descartar el catálogo en memoria (se reconstruye en la siguiente búsqueda)"""
+    with _lock_catalogo:
+        _catalogo['indice'] = None
+
+
+# Toda escritura publicada en distribuidores descarta el catálogo
+suscribir('distribuidores', lambda claves: invalidar_catalogo_distribuidores())
+
+
+def resolver_codigos_bt(codigos: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Buscar los distribuidores de varios códigos BT en el catálogo en memoria
+    
+    Un código sin sufijo (BT032) corresponde al del catálogo con nombre
+    (BT032-OCTAVIANO) si solo hay uno con ese número.
+    
+    Args:
+        codigos: Códigos BT (se normalizan a mayúsculas)
+    
+    Returns:
+        Dict código (como se recibió, normalizado) -> distribuidor; los
+        códigos no encontrados no aparecen
+    """
+    catalogo = get_indice_distribuidores().distribuidores
+    
+    por_codigo = {d['codigo_bt'].upper().strip(): d for d in catalogo if d.get('codigo_bt')}
+    por_numero = {}
+    for codigo, distribuidor in por_codigo.items():
+        por_numero.setdefault(codigo.split('-')[0], []).append(distribuidor)
+    
+    resueltos = {}
+    for codigo in codigos:
+        codigo = (codigo or '').upper().strip()
+        if codigo in por_codigo:
+            resueltos[codigo] = por_codigo[codigo]
+        elif len(por_numero.get(codigo.split('-')[0], [])) == 1:
+            resueltos[codigo] = por_numero[codigo.split('-')[0]][0]
+    
+    return resueltos
 
 
 def buscar_distribuidores(query: str = "", estatus: Optional[str] = None, limit: int = 100) -> List[Dict]:
     """
     Buscar distribuidores por código, nombre o plaza
     
+    La búsqueda se resuelve en memoria con el catálogo del proceso:
+    prefijo, subcadena y aproximada, sin distinguir acentos.
+    
     Args:
         query: Texto a buscar (código, nombre o plaza)
         estatus: Filtrar por estatus (ACTIVO, BAJA, SUSPENDIDO)
         limit: Límite de resultados
     
     Returns:
-        Lista de distribuidores encontrados
+        Lista de distribuidores encontrados, de mejor a peor coincidencia
     """
-    supabase = get_supabase_client()
-    
-    # Construir query base
-    db_query = supabase.table('distribuidores').select('*')
-    
-    # Filtrar por estatus si se especifica
-    if estatus:
-        db_query = db_query.eq('estatus', estatus)
-    
-    # Buscar por texto si se especifica
-    if query:
-        query_upper = query.upper().strip()
-        # Buscar en código_bt, nombre o plaza
-        db_query = db_query.or_(
-            f'codigo_bt.ilike.%{query_upper}%,'
-            f'nombre.ilike.%{query_upper}%,'
-            f'plaza.ilike.%{query_upper}%'
-        )
-    
-    # Ordenar y limitar
-    db_query = db_query.order('codigo_bt').limit(limit)
-    
-    result = db_query.execute()
-    return result.data
+    return get_indice_distribuidores().buscar(query, estatus=estatus, limit=limit)
 
 
 def get_distribuidor_by_codigo(codigo_bt: str) -> Optional[Dict]:
@@ -125,6 +180,7 @@ def crear_distribuidor(
         data['email'] = email.lower().strip()
     
     result = supabase.table('distribuidores').insert(data).execute()
+    publicar('distribuidores', [data['codigo_bt']])
     return result.data[0]
 
 
@@ -163,6 +219,8 @@ def actualizar_distribuidor(id: str, **campos) -> Dict:
         .eq('id', id)\
         .execute()
     
+    # Si cambió el código BT no se conoce el anterior: se invalidan todos
+    publicar('distribuidores', None if 'codigo_bt' in data else [d['codigo_bt'] for d in result.data])
     return result.data[0]
 
 
@@ -202,59 +260,70 @@ def get_siguiente_codigo_bt() -> str:
     return "BT001-"
 
 
-def get_estadisticas_distribuidores() -> Dict:
+def _estadisticas_distribuidores(filas: List[Dict]) -> Dict:
+    """Armar las estadísticas de distribuidores a partir del conteo por estatus"""
+    conteo = {r['estatus']: r['cantidad'] for r in filas}
+    
+    return {
+        'total': sum(conteo.values()),
+        'activos': conteo.get('ACTIVO', 0),
+        'baja': conteo.get('BAJA', 0),
+        'suspendidos': conteo.get('SUSPENDIDO', 0)
+    }
+
+
+def get_estadisticas_distribuidores(estimado: bool = False) -> Dict:
     """
     Obtener estadísticas de distribuidores
     
+    Todos los estatus se cuentan en una sola consulta agrupada.
+    
+    Args:
+        estimado: Usar conteos estimados (más rápido en tablas muy grandes)
+    
     Returns:
         Dict con estadísticas (total, activos, baja, suspendidos)
     """
     supabase = get_supabase_client()
     
-    # Total
-    total = supabase.table('distribuidores')\
-        .select('*', count='exact')\
-        .execute()
+    result = supabase.rpc('conteo_por_estatus', {
+        'p_tabla': 'distribuidores',
+        'p_estimado': estimado
+    }).execute()
     
-    # Por estatus
-    activos = supabase.table('distribuidores')\
-        .select('*', count='exact')\
-        .eq('estatus', 'ACTIVO')\
-        .execute()
-    
-    baja = supabase.table('distribuidores')\
-        .select('*', count='exact')\
-        .eq('estatus', 'BAJA')\
-        .execute()
-    
-    suspendidos = supabase.table('distribuidores')\
-        .select('*', count='exact')\
-        .eq('estatus', 'SUSPENDIDO')\
-        .execute()
-    
-    return {
-        'total': total.count,
-        'activos': activos.count,
-        'baja': baja.count,
-        'suspendidos': suspendidos.count
-    }
+    return _estadisticas_distribuidores(result.data)
 
 
 def get_todos_distribuidores() -> List[Dict]:
     """
     Obtener todos los distribuidores (sin límite)
     
+    Se lee por páginas para no quedar cortado por el límite de filas de la API.
+    
     Returns:
         Lista completa de distribuidores
     """
     supabase = get_supabase_client()
     
-    result = supabase.table('distribuidores')\
-        .select('*')\
-        .order('codigo_bt')\
-        .execute()
-    
-    return result.data
+    distribuidores = []
+    inicio = 0
+    
+    while True:
+        result = supabase.table('distribuidores')\
+            .select('*')\
+            .order('codigo_bt')\
+            .order('id')\
+            .range(inicio, inicio + TAMANO_PAGINA_DISTRIBUIDORES - 1)\
+            .execute()
+        
+        distribuidores.extend(result.data)
+        
+        if len(result.data) < TAMANO_PAGINA_DISTRIBUIDORES:
+            break
+        
+        inicio += TAMANO_PAGINA_DISTRIBUIDORES
+    
+    return distribuidores
 
 
 def eliminar_distribuidor(id: str) -> Dict:
@@ -274,4 +343,5 @@ def eliminar_distribuidor(id: str) -> Dict:
         .eq('id', id)\
         .execute()
     
+    publicar('distribuidores', [d['codigo_bt'] for d in result.data])
     return result.data[0] if result.data else None
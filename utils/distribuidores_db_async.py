@@ -0,0 +1,67 @@
+"""
+Versión async de las consultas de distribuidores (ver envios_db_async)
+"""
+
+from typing import Dict, Optional
+from .supabase_client import get_supabase_async_client
+from .distribuidores_db import _estadisticas_distribuidores
+
+
+async def get_distribuidor_by_codigo(codigo_bt: str) -> Optional[Dict]:
+    """
+    Obtener distribuidor por código BT
+    
+    Args:
+        codigo_bt: Código BT del distribuidor
+    
+    Returns:
+        Distribuidor encontrado o None
+    """
+    supabase = await get_supabase_async_client()
+    
+    result = await supabase.table('distribuidores')\
+        .select('*')\
+        .eq('codigo_bt', codigo_bt.upper().strip())\
+        .execute()
+    
+    return result.data[0] if result.data else None
+
+
+async def get_distribuidor_by_id(id: str) -> Optional[Dict]:
+    """
+    Obtener distribuidor por ID
+    
+    Args:
+        id: UUID del distribuidor
+    
+    Returns:
+        Distribuidor encontrado o None
+    """
+    supabase = await get_supabase_async_client()
+    
+    result = await supabase.table('distribuidores')\
+        .select('*')\
+        .eq('id', id)\
+        .execute()
+    
+    return result.data[0] if result.data else None
+
+
+async def get_estadisticas_distribuidores(estimado: bool = False) -> Dict:
+    """
+    Obtener estadísticas de distribuidores
+    
+    Args:
+        estimado: Usar conteos estimados (más rápido en tablas muy grandes)
+    
+    Returns:
+        Dict con estadísticas (total, activos, baja, suspendidos)
+    """
+    supabase = await get_supabase_async_client()
+    
+    result = await supabase.rpc('conteo_por_estatus', {
+        'p_tabla': 'distribuidores',
+        'p_estimado': estimado
+    }).execute()
+    
+    return _estadisticas_distribuidores(result.data)
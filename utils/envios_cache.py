@@ -0,0 +1,416 @@
+"""
+Cache local de envios en disco (SQLite) con sincronización incremental
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+from postgrest.exceptions import APIError
+from .almacen_local import conectar_sqlite
+from .envios_db import iter_envios
+from .invalidacion import version_etiquetas
+from .supabase_client import get_supabase_client
+
+# Archivo SQLite del cache
+ARCHIVO_CACHE = "envios_cache.db"
+
+# Columnas de envios que se guardan localmente
+COLUMNAS_CACHE = ['id', 'fecha_envio', 'iccid', 'codigo_bt', 'nombre_distribuidor', 'estatus', 'created_at', 'updated_at']
+
+# Filas por bloque al leer el cache (iter_envios_local)
+TAMANO_BLOQUE_LECTURA = 50000
+
+# Se vuelve a pedir este margen hacia atrás de las marcas de created_at y
+# updated_at: una fila puede confirmarse después de otra con marca mayor (lotes
+# concurrentes) o llevar la hora de otro reloj. Las filas repetidas se
+# reemplazan por id.
+MARGEN_MODIFICADOS = timedelta(hours=12)
+
+# Cada cuánto se compara el total local contra el remoto (count exacto en
+# Supabase); si no coinciden se reconstruye el cache
+INTERVALO_RECONCILIACION = timedelta(hours=24)
+
+# Códigos de PostgREST / Postgres cuando la tabla no existe (sql/003 sin aplicar)
+CODIGOS_TABLA_INEXISTENTE = ('PGRST205', '42P01')
+
+# Evita dos sincronizaciones simultáneas en el mismo proceso
+_lock_sincronizacion = threading.Lock()
+
+# Versión de la etiqueta 'envios' incluida en la última sincronización de
+# este proceso (las escrituras posteriores dejan cambios pendientes)
+_version_sincronizada = {'envios': version_etiquetas('envios')}
+
+
+def _conectar():
+    """Abrir el cache y crear las tablas si no existen"""
+    conexion = conectar_sqlite(ARCHIVO_CACHE)
+    conexion.executescript("""
+        CREATE TABLE IF NOT EXISTS envios (
+            id TEXT PRIMARY KEY,
+            fecha_envio TEXT,
+            iccid TEXT,
+            codigo_bt TEXT,
+            nombre_distribuidor TEXT,
+            estatus TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_envios_fecha_envio ON envios (fecha_envio);
+        CREATE INDEX IF NOT EXISTS idx_envios_codigo_bt ON envios (codigo_bt);
+        CREATE TABLE IF NOT EXISTS sincronizacion (
+            clave TEXT PRIMARY KEY,
+            valor TEXT
+        );
+    """)
+    return conexion
+
+
+def _get_estado(conexion) -> Dict[str, str]:
+    """Leer marcas de agua y datos de la última sincronización"""
+    return dict(conexion.execute("SELECT clave, valor FROM sincronizacion").fetchall())
+
+
+def _guardar_estado(conexion, estado: Dict[str, Optional[str]]):
+    """Guardar marcas de agua y datos de la sincronización"""
+    conexion.executemany(
+        "INSERT OR REPLACE INTO sincronizacion (clave, valor) VALUES (?, ?)",
+        [(clave, valor) for clave, valor in estado.items() if valor is not None]
+    )
+
+
+def _guardar_filas(conexion, filas: List[Dict]):
+    """Insertar o reemplazar filas en el cache local"""
+    conexion.executemany(
+        f"INSERT OR REPLACE INTO envios ({', '.join(COLUMNAS_CACHE)}) "
+        f"VALUES ({', '.join('?' for _ in COLUMNAS_CACHE)})",
+        [tuple(fila.get(columna) for columna in COLUMNAS_CACHE) for fila in filas]
+    )
+
+
+def _restar_margen(marca: str) -> str:
+    """Restar MARGEN_MODIFICADOS a una marca de agua ISO"""
+    try:
+        return (datetime.fromisoformat(marca) - MARGEN_MODIFICADOS).isoformat()
+    except ValueError:
+        return marca
+
+
+def _descargar(conexion, filtros: Optional[Dict], orden: str, marcas: Dict[str, Optional[str]]) -> int:
+    """Descargar páginas de envios al cache y actualizar las marcas de agua"""
+    total = 0
+    
+    for pagina in iter_envios(filtros, columnas=', '.join(COLUMNAS_CACHE), orden=orden, descendente=False):
+        _guardar_filas(conexion, pagina)
+        total += len(pagina)
+        
+        for fila in pagina:
+            for columna in ('created_at', 'updated_at'):
+                if fila.get(columna) and (marcas[columna] is None or fila[columna] > marcas[columna]):
+                    marcas[columna] = fila[columna]
+    
+    return total
+
+
+def _aplicar_eliminados(conexion, desde: Optional[str]) -> Optional[Dict]:
+    """
+    Borrar del cache los envíos registrados en envios_eliminados
+    
+    Returns:
+        Dict con eliminados y nueva marca, o None si la tabla no está disponible
+    """
+    supabase = get_supabase_client()
+    
+    eliminados = 0
+    marca = desde
+    ultima_llave = None
+    
+    try:
+        while True:
+            query = supabase.table('envios_eliminados').select('id, envio_id, eliminado_at')
+            
+            if desde:
+                query = query.gte('eliminado_at', _restar_margen(desde))
+            
+            if ultima_llave:
+                valor, id_ultimo = ultima_llave
+                query = query.or_(
+                    f'eliminado_at.gt."{valor}",'
+                    f'and(eliminado_at.eq."{valor}",id.gt.{id_ultimo})'
+                )
+            
+            pagina = query.order('eliminado_at').order('id').limit(1000).execute().data
+            
+            if not pagina:
+                break
+            
+            conexion.executemany("DELETE FROM envios WHERE id = ?", [(str(fila['envio_id']),) for fila in pagina])
+            eliminados += len(pagina)
+            marca = pagina[-1]['eliminado_at']
+            
+            if len(pagina) < 1000:
+                break
+            
+            ultima_llave = (pagina[-1]['eliminado_at'], pagina[-1]['id'])
+    except APIError as e:
+        # Solo se ignora la falta de la tabla; cualquier otro error se
+        # propaga para no dar por buena una sincronización incompleta
+        if e.code in CODIGOS_TABLA_INEXISTENTE:
+            return None
+        raise
+    
+    return {'eliminados': eliminados, 'marca': marca}
+
+
+def _toca_reconciliar(estado: Dict[str, str]) -> bool:
+    """Saber si ya pasó INTERVALO_RECONCILIACION desde la última comparación de totales"""
+    try:
+        ultima = datetime.fromisoformat(estado['ultima_reconciliacion'])
+    except (KeyError, ValueError):
+        return True
+    
+    return datetime.utcnow() - ultima > INTERVALO_RECONCILIACION
+
+
+def _total_coincide(conexion) -> bool:
+    """Comparar el total local contra el de Supabase"""
+    supabase = get_supabase_client()
+    
+    total_remoto = supabase.table('envios').select('id', count='exact').limit(1).execute().count
+    total_local = conexion.execute("SELECT COUNT(*) FROM envios").fetchone()[0]
+    
+    return total_remoto == total_local
+
+
+def _descargar_todo(conexion, marcas: Dict[str, Optional[str]]) -> int:
+    """Vaciar el cache y descargar todos los envíos"""
+    conexion.execute("DELETE FROM envios")
+    marcas['created_at'] = None
+    marcas['updated_at'] = None
+    return _descargar(conexion, None, 'created_at', marcas)
+
+
+def sincronizar_envios_local(completa: bool = False) -> Dict:
+    """
+    Sincronizar el cache local con la tabla envios
+    
+    La primera vez (o con completa=True) descarga todo. Después solo pide
+    las filas con created_at / updated_at posteriores a la última marca de
+    agua y borra las registradas en envios_eliminados. Cada
+    INTERVALO_RECONCILIACION compara el total local contra el remoto y, si
+    no coinciden, reconstruye el cache.
+    
+    Args:
+        completa: Forzar descarga completa (reconstruye el cache)
+    
+    Returns:
+        Dict con resultado (descargados, eliminados, total_local, completa)
+    """
+    with _lock_sincronizacion:
+        # Se toma antes de descargar: una escritura durante la descarga queda pendiente
+        version = version_etiquetas('envios')
+        
+        conexion = _conectar()
+        try:
+            estado = _get_estado(conexion)
+            completa = completa or 'marca_created_at' not in estado
+            
+            marcas = {
+                'created_at': estado.get('marca_created_at'),
+                'updated_at': estado.get('marca_updated_at')
+            }
+            
+            descargados = 0
+            eliminados = 0
+            
+            marca_reconciliacion = None
+            
+            if completa:
+                inicio_descarga = datetime.utcnow().isoformat()
+                descargados += _descargar_todo(conexion, marcas)
+                # Los eliminados anteriores a la descarga completa ya no aplican
+                marca_eliminados = inicio_descarga
+                marca_reconciliacion = inicio_descarga
+            else:
+                # Filas nuevas (con margen: una captura por lotes puede
+                # confirmar filas con created_at anterior a la marca)
+                if marcas['created_at']:
+                    filtros = {'creado_desde': _restar_margen(marcas['created_at'])}
+                else:
+                    filtros = None
+                descargados += _descargar(conexion, filtros, 'created_at', marcas)
+                
+                # Filas modificadas
+                if marcas['updated_at']:
+                    filtros = {'modificado_desde': _restar_margen(marcas['updated_at'])}
+                    descargados += _descargar(conexion, filtros, 'updated_at', marcas)
+                
+                # Filas eliminadas
+                marca_eliminados = estado.get('marca_eliminados')
+                resultado_eliminados = _aplicar_eliminados(conexion, marca_eliminados)
+                if resultado_eliminados:
+                    eliminados += resultado_eliminados['eliminados']
+                    marca_eliminados = resultado_eliminados['marca']
+                
+                # Filas perdidas o sobrantes: el cache no converge con
+                # descargas incrementales, se reconstruye
+                if _toca_reconciliar(estado):
+                    marca_reconciliacion = datetime.utcnow().isoformat()
+                    if not _total_coincide(conexion):
+                        completa = True
+                        descargados = _descargar_todo(conexion, marcas)
+                        marca_eliminados = marca_reconciliacion
+            
+            total_local = conexion.execute("SELECT COUNT(*) FROM envios").fetchone()[0]
+            
+            _guardar_estado(conexion, {
+                'marca_created_at': marcas['created_at'] or '',
+                'marca_updated_at': marcas['updated_at'],
+                'marca_eliminados': marca_eliminados,
+                'ultima_reconciliacion': marca_reconciliacion,
+                'ultima_sincronizacion': datetime.utcnow().isoformat(),
+                'total_local': str(total_local)
+            })
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            conexion.close()
+        
+        _version_sincronizada['envios'] = version
+    
+    return {
+        'descargados': descargados,
+        'eliminados': eliminados,
+        'total_local': total_local,
+        'completa': completa
+    }
+
+
+def hay_cambios_pendientes() -> bool:
+    """
+    Saber si este proceso escribió envíos después de la última sincronización
+    
+    Returns:
+        True si el cache local no incluye alguna escritura publicada
+    """
+    return version_etiquetas('envios') != _version_sincronizada['envios']
+
+
+def get_estado_cache_envios() -> Dict:
+    """
+    Obtener el estado del cache local
+    
+    Returns:
+        Dict con ultima_sincronizacion (None si nunca se ha sincronizado) y total_local
+    """
+    conexion = _conectar()
+    try:
+        estado = _get_estado(conexion)
+    finally:
+        conexion.close()
+    
+    return {
+        'ultima_sincronizacion': estado.get('ultima_sincronizacion'),
+        'total_local': int(estado.get('total_local', 0))
+    }
+
+
+def get_cubo_mensual_local() -> Dict:
+    """
+    Contar los envíos del cache local por año, mes y distribuidor
+    
+    El conteo se hace en SQLite (GROUP BY) sin cargar las filas en memoria;
+    consultar un año o un distribuidor es buscar una llave del dict.
+    
+    Returns:
+        Dict con:
+            - mensual: {(año, codigo_bt): [cantidad de enero a diciembre]},
+              con codigo_bt None para todos los distribuidores
+            - años: Años con envíos (del más reciente al más antiguo)
+            - distribuidores: Códigos BT con envíos (ordenados)
+            - total: Cantidad de envíos con fecha
+            - fecha_min, fecha_max: Primera y última fecha_envio (None si no hay)
+    """
+    conexion = _conectar()
+    try:
+        filas = conexion.execute("""
+            SELECT CAST(substr(fecha_envio, 1, 4) AS INTEGER),
+                   CAST(substr(fecha_envio, 6, 2) AS INTEGER),
+                   codigo_bt,
+                   COUNT(*)
+            FROM envios
+            WHERE fecha_envio IS NOT NULL
+            GROUP BY 1, 2, 3
+        """).fetchall()
+        fecha_min, fecha_max = conexion.execute(
+            "SELECT MIN(fecha_envio), MAX(fecha_envio) FROM envios"
+        ).fetchone()
+    finally:
+        conexion.close()
+    
+    mensual = {}
+    for año, mes, codigo_bt, cantidad in filas:
+        mensual.setdefault((año, None), [0] * 12)[mes - 1] += cantidad
+        if codigo_bt:
+            mensual.setdefault((año, codigo_bt), [0] * 12)[mes - 1] += cantidad
+    
+    return {
+        'mensual': mensual,
+        'años': sorted({año for año, _ in mensual}, reverse=True),
+        'distribuidores': sorted({codigo_bt for _, codigo_bt in mensual if codigo_bt}),
+        'total': sum(sum(conteos) for (_, codigo_bt), conteos in mensual.items() if codigo_bt is None),
+        'fecha_min': fecha_min[:10] if fecha_min else None,
+        'fecha_max': fecha_max[:10] if fecha_max else None
+    }
+
+
+def iter_envios_local(
+    columnas: Optional[List[str]] = None,
+    año: Optional[int] = None,
+    codigo_bt: Optional[str] = None,
+    tamano_bloque: int = TAMANO_BLOQUE_LECTURA
+) -> Iterator[List[Dict]]:
+    """
+    Recorrer los envíos del cache local por bloques (para exportar)
+    
+    Args:
+        columnas: Columnas a leer (default: todas las del cache)
+        año: Filtrar por año de fecha_envio
+        codigo_bt: Filtrar por código BT exacto
+        tamano_bloque: Filas por bloque
+    
+    Yields:
+        Listas de dicts, ordenadas por fecha_envio descendente
+    """
+    columnas = columnas or COLUMNAS_CACHE
+    invalidas = [columna for columna in columnas if columna not in COLUMNAS_CACHE]
+    if invalidas:
+        raise ValueError(f"Columnas no disponibles en el cache: {', '.join(invalidas)}")
+    
+    condiciones = []
+    parametros = []
+    
+    if año:
+        condiciones.append("fecha_envio >= ? AND fecha_envio < ?")
+        parametros.extend([f"{año}-01-01", f"{año + 1}-01-01"])
+    
+    if codigo_bt:
+        condiciones.append("codigo_bt = ?")
+        parametros.append(codigo_bt)
+    
+    where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    
+    conexion = _conectar()
+    try:
+        cursor = conexion.execute(
+            f"SELECT {', '.join(columnas)} FROM envios{where} ORDER BY fecha_envio DESC",
+            parametros
+        )
+        while True:
+            bloque = cursor.fetchmany(tamano_bloque)
+            if not bloque:
+                break
+            yield [dict(zip(columnas, fila)) for fila in bloque]
+    finally:
+        conexion.close()
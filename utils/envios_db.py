@@ -2,10 +2,218 @@
 Funciones CRUD para la tabla envios
 """
 
-from typing import List, Dict, Optional
-from datetime import datetime, date
+from typing import List, Dict, Optional, Iterator, Iterable, Tuple
+from datetime import datetime, date, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 from .supabase_client import get_supabase_client
 from .timezone_config import get_fecha_actual_mexico
+from .invalidacion import publicar
+from .asincrono import ejecutar
+from .distribuidores_db import resolver_codigos_bt
+
+# Tamaño de lote para filtros .in_() (evita URLs muy largas)
+TAMANO_LOTE_CONSULTA = 100
+
+# Tamaño de lote para inserciones/upserts (límite de Supabase)
+TAMANO_LOTE_ESCRITURA = 1000
+
+# Filas por página al recorrer envios (límite de Supabase por consulta)
+TAMANO_PAGINA = 1000
+
+# Columnas válidas para paginación por llave (siempre con id como desempate)
+COLUMNAS_ORDEN_KEYSET = ('created_at', 'fecha_envio', 'updated_at')
+# Columnas de orden que pueden venir en NULL (no caben en la llave)
+COLUMNAS_ORDEN_NULABLES = ('fecha_envio', 'updated_at')
+
+# Máximo de consultas simultáneas en operaciones masivas
+MAX_CONSULTAS_CONCURRENTES = 8
+
+# Máximo de inserciones simultáneas en la captura masiva (corren a la par
+# de la verificación de duplicados)
+MAX_INSERCIONES_CONCURRENTES = 2
+
+
+def _normalizar_iccids(iccids: List[str]) -> List[str]:
+    """Limpiar ICCIDs (sin espacios, en mayúsculas) y descartar vacíos"""
+    return [iccid.strip().upper() for iccid in iccids if iccid and iccid.strip()]
+
+
+def _dividir_en_lotes(elementos: List, tamano: int) -> List[List]:
+    """Dividir una lista en lotes de tamaño fijo"""
+    return [elementos[i:i+tamano] for i in range(0, len(elementos), tamano)]
+
+
+def _ahora_utc() -> str:
+    """Marca para updated_at en UTC (el cache local la compara con las del servidor)"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _mas_recientes(iccids: List[str], filas: List[Dict]) -> Dict[str, Optional[Dict]]:
+    """Quedarse con el envío más reciente (por created_at) de cada ICCID"""
+    envios = {iccid: None for iccid in iccids}
+    
+    for fila in filas:
+        actual = envios.get(fila['iccid'])
+        # created_at viene en ISO 8601 con la misma zona horaria, se compara como texto
+        if actual is None or (fila.get('created_at') or '') > (actual.get('created_at') or ''):
+            envios[fila['iccid']] = fila
+    
+    return envios
+
+
+def _estadisticas_envios(filas: List[Dict]) -> Dict:
+    """Armar las estadísticas de envíos a partir del conteo por estatus"""
+    conteo = {r['estatus']: r['cantidad'] for r in filas}
+    
+    return {
+        'total': sum(conteo.values()),
+        'activos': conteo.get('ACTIVO', 0),
+        'reasignados': conteo.get('REASIGNADO', 0),
+        'cancelados': conteo.get('CANCELADO', 0)
+    }
+
+
+def _analisis_periodo(analisis: Optional[Dict]) -> Dict:
+    """Normalizar el resultado de la función analisis_periodo_envios"""
+    analisis = analisis or {}
+    
+    return {
+        'total': analisis.get('total', 0),
+        'por_estatus': {r['estatus']: r['cantidad'] for r in analisis.get('por_estatus') or []},
+        'distribuidores': analisis.get('distribuidores', 0),
+        'diario': analisis.get('diario') or [],
+        'top': analisis.get('top') or []
+    }
+
+
+def _get_filas_por_iccids(iccids: List[str], columnas: str = '*') -> List[Dict]:
+    """
+    Obtener todas las filas de envios de una lista de ICCIDs
+    
+    Las consultas se hacen en lotes de TAMANO_LOTE_CONSULTA con .in_() y los
+    lotes se ejecutan de forma concurrente en el event loop compartido (ver
+    envios_db_async.get_filas_por_iccids).
+    
+    Args:
+        iccids: Lista de ICCIDs ya normalizados (sin repetidos)
+        columnas: Columnas a obtener
+    
+    Returns:
+        Lista con todas las filas encontradas (puede haber varias por ICCID)
+    """
+    # Importación diferida: envios_db_async importa las constantes de este módulo
+    from .envios_db_async import get_filas_por_iccids
+    
+    return ejecutar(get_filas_por_iccids(iccids, columnas))
+
+
+def _capturar_verificando(supabase, registros: List[Dict]) -> Dict:
+    """
+    Captura con verificación previa: consulta duplicados por lotes de forma
+    concurrente e inserta los registros nuevos conforme se van verificando
+    
+    Returns:
+        Dict con insertados y duplicados (sets de ICCIDs) y errores
+    """
+    def verificar_lote(lote: List[Dict]) -> set:
+        result = supabase.table('envios')\
+            .select('iccid')\
+            .in_('iccid', [registro['iccid'] for registro in lote])\
+            .execute()
+        return {r['iccid'] for r in result.data}
+    
+    def insertar_lote(lote: List[Dict]) -> set:
+        result = supabase.table('envios').insert(lote).execute()
+        return {r['iccid'] for r in result.data}
+    
+    lotes_verificacion = _dividir_en_lotes(registros, TAMANO_LOTE_CONSULTA)
+    
+    duplicados = set()
+    errores = []
+    pendientes = []
+    inserciones = []
+    
+    if lotes_verificacion:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONSULTAS_CONCURRENTES, len(lotes_verificacion))) as verificador, \
+                ThreadPoolExecutor(max_workers=MAX_INSERCIONES_CONCURRENTES) as insertador:
+            verificaciones = [verificador.submit(verificar_lote, lote) for lote in lotes_verificacion]
+            
+            # Las verificaciones se consumen en orden; cada lote de inserción
+            # completo se manda mientras siguen corriendo las demás
+            for num_lote, (lote, verificacion) in enumerate(zip(lotes_verificacion, verificaciones), 1):
+                try:
+                    existentes = verificacion.result()
+                except Exception as e:
+                    errores.append(f"Error al verificar lote {num_lote} ({len(lote)} ICCIDs): {str(e)}")
+                    continue
+                
+                for registro in lote:
+                    if registro['iccid'] in existentes:
+                        duplicados.add(registro['iccid'])
+                    else:
+                        pendientes.append(registro)
+                
+                while len(pendientes) >= TAMANO_LOTE_ESCRITURA:
+                    inserciones.append(insertador.submit(insertar_lote, pendientes[:TAMANO_LOTE_ESCRITURA]))
+                    pendientes = pendientes[TAMANO_LOTE_ESCRITURA:]
+            
+            if pendientes:
+                inserciones.append(insertador.submit(insertar_lote, pendientes))
+    
+    insertados = set()
+    
+    for insercion in inserciones:
+        try:
+            insertados |= insercion.result()
+        except Exception as e:
+            errores.append(str(e))
+    
+    return {'insertados': insertados, 'duplicados': duplicados, 'errores': errores}
+
+
+def _capturar_upsert(supabase, registros: List[Dict]) -> Dict:
+    """
+    Captura idempotente: un upsert por lote que ignora los ICCIDs que ya
+    tienen un envío ACTIVO (restricción única sobre iccid_activo)
+    
+    El upsert solo regresa las filas insertadas; el resto del lote son
+    duplicados.
+    
+    Returns:
+        Dict con insertados y duplicados (sets de ICCIDs) y errores
+    """
+    lotes = _dividir_en_lotes(registros, TAMANO_LOTE_ESCRITURA)
+    
+    def insertar_lote(lote: List[Dict]) -> Dict:
+        try:
+            result = supabase.table('envios')\
+                .upsert(lote, on_conflict='iccid_activo', ignore_duplicates=True)\
+                .execute()
+            return {'insertados': {r['iccid'] for r in result.data}, 'error': None}
+        except Exception as e:
+            return {'insertados': set(), 'error': str(e)}
+    
+    insertados = set()
+    duplicados = set()
+    errores = []
+    
+    if lotes:
+        with ThreadPoolExecutor(max_workers=min(MAX_INSERCIONES_CONCURRENTES, len(lotes))) as executor:
+            for num_lote, (lote, resultado) in enumerate(zip(lotes, executor.map(insertar_lote, lotes)), 1):
+                if resultado['error']:
+                    errores.append(f"Error al insertar lote {num_lote} ({len(lote)} ICCIDs): {resultado['error']}")
+                    continue
+                insertados |= resultado['insertados']
+                duplicados.update(r['iccid'] for r in lote if r['iccid'] not in resultado['insertados'])
+    
+    return {'insertados': insertados, 'duplicados': duplicados, 'errores': errores}
+
+
+def _capturar_registros(supabase, registros: List[Dict], idempotente: bool) -> Dict:
+    """Capturar registros ya armados (sin ICCIDs repetidos) con el modo indicado"""
+    if idempotente:
+        return _capturar_upsert(supabase, registros)
+    return _capturar_verificando(supabase, registros)
 
 
 def capturar_envio_masivo(
@@ -15,11 +223,25 @@ def capturar_envio_masivo(
     nombre_distribuidor: str,
     fecha: Optional[date] = None,
     observaciones: Optional[str] = None,
-    usuario_captura: str = "Sistema"
+    usuario_captura: str = "Sistema",
+    idempotente: bool = False
 ) -> Dict:
     """
     Capturar múltiples ICCIDs en un solo envío
     
+    Los ICCIDs repetidos dentro de la misma captura se registran una sola vez.
+    
+    Sin idempotente, la verificación de duplicados se hace en lotes de
+    TAMANO_LOTE_CONSULTA ejecutados de forma concurrente y, conforme se
+    verifican, los ICCIDs nuevos se insertan en lotes de TAMANO_LOTE_ESCRITURA.
+    
+    Con idempotente, cada lote es un solo upsert que la base de datos resuelve
+    contra la restricción única de iccid_activo (sql/005_iccid_activo_unico.sql),
+    así dos capturas simultáneas no pueden registrar el mismo ICCID. Ojo: en
+    ese modo solo un envío ACTIVO cuenta como duplicado; un ICCID cuyo envío
+    anterior está CANCELADO se vuelve a capturar sin aviso. La página de
+    captura usa el modo con verificación, que reporta cualquier envío previo.
+    
     Args:
         iccids: Lista de ICCIDs a registrar
         distribuidor_id: UUID del distribuidor
@@ -28,67 +250,255 @@ def capturar_envio_masivo(
         fecha: Fecha del envío (default: hoy)
         observaciones: Observaciones opcionales
         usuario_captura: Usuario que captura (default: Sistema)
+        idempotente: Usar upsert con la restricción única en lugar de verificar antes
     
     Returns:
-        Dict con resultado (exitosos, duplicados, errores)
+        Dict con resultado (exitosos, duplicados, duplicados_en_lote, errores)
     """
     supabase = get_supabase_client()
     
     if fecha is None:
         fecha = get_fecha_actual_mexico()
     
-    # Normalizar ICCIDs
+    # Normalizar ICCIDs y quitar los repetidos dentro de la captura
     iccids_limpios = [iccid.strip().upper() for iccid in iccids if iccid.strip()]
+    iccids_unicos = list(dict.fromkeys(iccids_limpios))
     
-    # Verificar duplicados en la base de datos
-    iccids_existentes = []
-    if iccids_limpios:
-        # Buscar en lotes de 100 para evitar URLs muy largas
-        for i in range(0, len(iccids_limpios), 100):
-            lote = iccids_limpios[i:i+100]
-            result = supabase.table('envios')\
-                .select('iccid')\
-                .in_('iccid', lote)\
-                .execute()
-            iccids_existentes.extend([r['iccid'] for r in result.data])
+    registros = [{
+        'fecha_envio': fecha.isoformat(),
+        'iccid': iccid,
+        'distribuidor_id': distribuidor_id,
+        'codigo_bt': codigo_bt.upper().strip(),
+        'nombre_distribuidor': nombre_distribuidor.upper().strip(),
+        'estatus': 'ACTIVO',
+        'observaciones': observaciones,
+        'usuario_captura': usuario_captura
+    } for iccid in iccids_unicos]
+    
+    resultado = _capturar_registros(supabase, registros, idempotente)
+    
+    if resultado['insertados']:
+        publicar('envios', [codigo_bt])
+    
+    return {
+        'exitosos': len(resultado['insertados']),
+        'duplicados': len(resultado['duplicados']),
+        'duplicados_en_lote': len(iccids_limpios) - len(iccids_unicos),
+        'errores': resultado['errores'],
+        'total_procesados': len(iccids_limpios)
+    }
+
+
+def capturar_envios_multi(
+    filas: Iterable[Tuple[str, str, Optional[date]]],
+    observaciones: Optional[str] = None,
+    usuario_captura: str = "Sistema",
+    idempotente: bool = False
+) -> Dict:
+    """
+    Capturar ICCIDs de varios distribuidores en una sola operación
     
-    # Filtrar ICCIDs nuevos
-    iccids_nuevos = [iccid for iccid in iccids_limpios if iccid not in iccids_existentes]
+    Los códigos BT se resuelven todos juntos contra el catálogo de
+    distribuidores, y la verificación de duplicados y las inserciones se
+    hacen en lotes sobre la captura completa (no por distribuidor).
+    
+    Args:
+        filas: Tuplas (iccid, codigo_bt, fecha); fecha None = hoy
+        observaciones: Observaciones opcionales
+        usuario_captura: Usuario que captura (default: Sistema)
+        idempotente: Usar upsert con la restricción única (ver capturar_envio_masivo)
+    
+    Returns:
+        Dict con resultado (exitosos, duplicados, duplicados_en_lote, errores,
+        codigos_no_encontrados y por_distribuidor con el resumen de cada código)
+    """
+    supabase = get_supabase_client()
+    
+    hoy = get_fecha_actual_mexico()
+    
+    # Normalizar y quitar ICCIDs repetidos (se queda la primera fila)
+    total_procesados = 0
+    unicas = {}
+    for iccid, codigo_bt, fecha in filas:
+        iccid = (iccid or '').strip().upper()
+        if not iccid:
+            continue
+        total_procesados += 1
+        if iccid not in unicas:
+            unicas[iccid] = ((codigo_bt or '').strip().upper(), fecha or hoy)
+    
+    distribuidores = resolver_codigos_bt({codigo for codigo, _ in unicas.values()})
     
-    # Preparar datos para inserción
     registros = []
-    for iccid in iccids_nuevos:
+    codigos_no_encontrados = {}
+    for iccid, (codigo_bt, fecha) in unicas.items():
+        distribuidor = distribuidores.get(codigo_bt)
+        if distribuidor is None:
+            codigos_no_encontrados[codigo_bt] = codigos_no_encontrados.get(codigo_bt, 0) + 1
+            continue
         registros.append({
             'fecha_envio': fecha.isoformat(),
             'iccid': iccid,
-            'distribuidor_id': distribuidor_id,
-            'codigo_bt': codigo_bt.upper().strip(),
-            'nombre_distribuidor': nombre_distribuidor.upper().strip(),
+            'distribuidor_id': distribuidor['id'],
+            'codigo_bt': distribuidor['codigo_bt'].upper().strip(),
+            'nombre_distribuidor': distribuidor['nombre'].upper().strip(),
             'estatus': 'ACTIVO',
             'observaciones': observaciones,
             'usuario_captura': usuario_captura
         })
     
-    # Insertar en lotes de 1000 (límite de Supabase)
-    exitosos = 0
-    errores = []
+    resultado = _capturar_registros(supabase, registros, idempotente)
     
-    for i in range(0, len(registros), 1000):
-        lote = registros[i:i+1000]
-        try:
-            result = supabase.table('envios').insert(lote).execute()
-            exitosos += len(result.data)
-        except Exception as e:
-            errores.append(str(e))
+    # Resumen por distribuidor
+    por_distribuidor = {}
+    for registro in registros:
+        resumen = por_distribuidor.setdefault(registro['codigo_bt'], {
+            'codigo_bt': registro['codigo_bt'],
+            'nombre_distribuidor': registro['nombre_distribuidor'],
+            'exitosos': 0,
+            'duplicados': 0,
+            'con_error': 0
+        })
+        if registro['iccid'] in resultado['insertados']:
+            resumen['exitosos'] += 1
+        elif registro['iccid'] in resultado['duplicados']:
+            resumen['duplicados'] += 1
+        else:
+            resumen['con_error'] += 1
+    
+    codigos_capturados = [codigo for codigo, resumen in por_distribuidor.items() if resumen['exitosos']]
+    if codigos_capturados:
+        publicar('envios', codigos_capturados)
     
     return {
-        'exitosos': exitosos,
-        'duplicados': len(iccids_existentes),
-        'errores': errores,
-        'total_procesados': len(iccids_limpios)
+        'exitosos': len(resultado['insertados']),
+        'duplicados': len(resultado['duplicados']),
+        'duplicados_en_lote': total_procesados - len(unicas),
+        'errores': resultado['errores'],
+        'codigos_no_encontrados': codigos_no_encontrados,
+        'por_distribuidor': sorted(por_distribuidor.values(), key=lambda r: r['codigo_bt']),
+        'total_procesados': total_procesados
     }
 
 
+def _aplicar_filtros_envios(query, filtros: Optional[Dict] = None):
+    """
+    Aplicar filtros de búsqueda a una consulta de envios
+    
+    Filtros soportados: iccid (parcial), codigo_bt (parcial),
+    codigo_bt_exacto, fecha_desde, fecha_hasta, estatus, creado_desde y modificado_desde
+    (timestamps ISO de created_at / updated_at, inclusivos).
+    """
+    filtros = filtros or {}
+    
+    if filtros.get('iccid'):
+        query = query.ilike('iccid', f"%{filtros['iccid'].strip()}%")
+    
+    if filtros.get('codigo_bt'):
+        query = query.ilike('codigo_bt', f"%{filtros['codigo_bt'].upper().strip()}%")
+    
+    if filtros.get('codigo_bt_exacto'):
+        query = query.eq('codigo_bt', filtros['codigo_bt_exacto'].upper().strip())
+    
+    if filtros.get('fecha_desde'):
+        query = query.gte('fecha_envio', filtros['fecha_desde'].isoformat())
+    
+    if filtros.get('fecha_hasta'):
+        query = query.lte('fecha_envio', filtros['fecha_hasta'].isoformat())
+    
+    if filtros.get('estatus'):
+        query = query.eq('estatus', filtros['estatus'].upper().strip())
+    
+    if filtros.get('creado_desde'):
+        query = query.gte('created_at', filtros['creado_desde'])
+    
+    if filtros.get('modificado_desde'):
+        query = query.gte('updated_at', filtros['modificado_desde'])
+    
+    return query
+
+
+def iter_envios(
+    filtros: Optional[Dict] = None,
+    columnas: str = '*',
+    tamano_pagina: int = TAMANO_PAGINA,
+    orden: str = 'created_at',
+    descendente: bool = True
+) -> Iterator[List[Dict]]:
+    """
+    Recorrer envios página por página con paginación por llave (keyset)
+    
+    Cada página continúa después de la última fila de la anterior usando
+    (orden, id), así que no se hace más lenta conforme se avanza y las filas
+    insertadas durante el recorrido no provocan saltos ni repetidos. Si la
+    columna de orden admite NULL, esas filas se recorren al final, por id.
+    
+    Args:
+        filtros: Filtros de búsqueda (ver _aplicar_filtros_envios)
+        columnas: Columnas a obtener (se agregan las de orden e id si faltan)
+        tamano_pagina: Filas por página (máximo el límite de Supabase)
+        orden: Columna de orden: 'created_at', 'fecha_envio' o 'updated_at'
+        descendente: Orden descendente (más recientes primero)
+    
+    Yields:
+        Listas de envíos (una por página)
+    """
+    if orden not in COLUMNAS_ORDEN_KEYSET:
+        raise ValueError(f"Orden no soportado: {orden}")
+    
+    supabase = get_supabase_client()
+    
+    # La llave de paginación debe venir en cada fila
+    if columnas.strip() != '*':
+        lista_columnas = [c.strip() for c in columnas.split(',')]
+        for columna in (orden, 'id'):
+            if columna not in lista_columnas:
+                lista_columnas.append(columna)
+        columnas = ', '.join(lista_columnas)
+    
+    operador = 'lt' if descendente else 'gt'
+    nulable = orden in COLUMNAS_ORDEN_NULABLES
+    nulos = False
+    ultima_llave = None
+    
+    while True:
+        query = _aplicar_filtros_envios(supabase.table('envios').select(columnas), filtros)
+        
+        if nulable:
+            query = query.is_(orden, 'null') if nulos else query.not_.is_(orden, 'null')
+        
+        if ultima_llave:
+            valor, id_ultimo = ultima_llave
+            if nulos:
+                query = query.filter('id', operador, id_ultimo)
+            else:
+                query = query.or_(
+                    f'{orden}.{operador}."{valor}",'
+                    f'and({orden}.eq."{valor}",id.{operador}.{id_ultimo})'
+                )
+        
+        if not nulos:
+            query = query.order(orden, desc=descendente)
+        
+        query = query.order('id', desc=descendente).limit(tamano_pagina)
+        
+        pagina = query.execute().data
+        
+        if pagina:
+            yield pagina
+        
+        # Si obtuvimos menos de tamano_pagina, ya no hay más resultados
+        # (salvo las filas con la columna de orden en NULL)
+        if len(pagina) < tamano_pagina:
+            if not nulable or nulos:
+                break
+            nulos = True
+            ultima_llave = None
+            continue
+        
+        ultima_llave = (pagina[-1][orden], pagina[-1]['id'])
+
+
 def buscar_envios(
     iccid: Optional[str] = None,
     codigo_bt: Optional[str] = None,
@@ -111,46 +521,20 @@ def buscar_envios(
     Returns:
         Lista de envíos encontrados
     """
-    supabase = get_supabase_client()
+    filtros = {
+        'iccid': iccid,
+        'codigo_bt': codigo_bt,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'estatus': estatus
+    }
     
-    # Si el límite es muy alto o None, usar paginación para obtener todos los resultados
-    if limit is None or limit > 1000:
+    # Si el límite es muy alto o None, recorrer todas las páginas
+    if limit is None or limit > TAMANO_PAGINA:
         all_results = []
-        offset = 0
-        batch_size = 1000  # Límite de Supabase por consulta
         
-        while True:
-            query = supabase.table('envios').select('*')
-            
-            if iccid:
-                query = query.ilike('iccid', f'%{iccid.strip()}%')
-            
-            if codigo_bt:
-                query = query.ilike('codigo_bt', f'%{codigo_bt.upper().strip()}%')
-            
-            if fecha_desde:
-                query = query.gte('fecha_envio', fecha_desde.isoformat())
-            
-            if fecha_hasta:
-                query = query.lte('fecha_envio', fecha_hasta.isoformat())
-            
-            if estatus:
-                query = query.eq('estatus', estatus.upper().strip())
-            
-            query = query.order('created_at', desc=True).range(offset, offset + batch_size - 1)
-            
-            result = query.execute()
-            
-            if not result.data:
-                break
-            
-            all_results.extend(result.data)
-            
-            # Si obtuvimos menos de batch_size, ya no hay más resultados
-            if len(result.data) < batch_size:
-                break
-            
-            offset += batch_size
+        for pagina in iter_envios(filtros):
+            all_results.extend(pagina)
             
             # Si tenemos un límite específico y ya lo alcanzamos, detener
             if limit is not None and len(all_results) >= limit:
@@ -160,23 +544,9 @@ def buscar_envios(
         return all_results
     else:
         # Para límites pequeños, usar la consulta simple
-        query = supabase.table('envios').select('*')
-        
-        if iccid:
-            query = query.ilike('iccid', f'%{iccid.strip()}%')
-        
-        if codigo_bt:
-            query = query.ilike('codigo_bt', f'%{codigo_bt.upper().strip()}%')
-        
-        if fecha_desde:
-            query = query.gte('fecha_envio', fecha_desde.isoformat())
-        
-        if fecha_hasta:
-            query = query.lte('fecha_envio', fecha_hasta.isoformat())
-        
-        if estatus:
-            query = query.eq('estatus', estatus.upper().strip())
+        supabase = get_supabase_client()
         
+        query = _aplicar_filtros_envios(supabase.table('envios').select('*'), filtros)
         query = query.order('created_at', desc=True).limit(limit)
         
         result = query.execute()
@@ -205,6 +575,22 @@ def get_envio_by_iccid(iccid: str) -> Optional[Dict]:
     return result.data[0] if result.data else None
 
 
+def get_envios_by_iccids(iccids: List[str]) -> Dict[str, Optional[Dict]]:
+    """
+    Obtener el envío más reciente de cada ICCID en una sola operación masiva
+    
+    Args:
+        iccids: Lista de ICCIDs a buscar
+    
+    Returns:
+        Dict {iccid: envío más reciente (por created_at) o None si no existe}.
+        Las llaves son los ICCIDs normalizados (sin espacios, en mayúsculas).
+    """
+    iccids_limpios = list(dict.fromkeys(_normalizar_iccids(iccids)))
+    
+    return _mas_recientes(iccids_limpios, _get_filas_por_iccids(iccids_limpios))
+
+
 def corregir_distribuidor_envio(
     iccid: str,
     nuevo_distribuidor_id: str,
@@ -235,7 +621,7 @@ def corregir_distribuidor_envio(
         'codigo_bt': nuevo_codigo_bt.upper().strip(),
         'nombre_distribuidor': nuevo_nombre.upper().strip(),
         'observaciones': f"CORREGIDO: {motivo}" if motivo else "CORREGIDO",
-        'updated_at': datetime.now().isoformat()
+        'updated_at': _ahora_utc()
     }
     
     result = supabase.table('envios')\
@@ -243,9 +629,221 @@ def corregir_distribuidor_envio(
         .eq('iccid', iccid.strip().upper())\
         .execute()
     
+    # El código anterior no se conoce: se invalidan todas las claves
+    publicar('envios')
+    
     return result.data[0] if result.data else None
 
 
+def corregir_distribuidor_masivo(
+    iccids: List[str],
+    nuevo_distribuidor_id: str,
+    nuevo_codigo_bt: str,
+    nuevo_nombre: str,
+    motivo: Optional[str] = None,
+    usuario: str = "Sistema"
+) -> Dict:
+    """
+    Corregir el distribuidor de muchos ICCIDs con actualizaciones por lote
+    
+    Cada lote se envía como un solo update().in_('iccid', lote) y los lotes
+    se ejecutan de forma concurrente.
+    
+    Args:
+        iccids: Lista de ICCIDs a corregir
+        nuevo_distribuidor_id: UUID del distribuidor correcto
+        nuevo_codigo_bt: Código BT correcto
+        nuevo_nombre: Nombre correcto
+        motivo: Motivo de la corrección
+        usuario: Usuario que corrige
+    
+    Returns:
+        Dict con resultado (actualizados, no_encontrados, lotes, errores)
+    """
+    supabase = get_supabase_client()
+    
+    # Normalizar ICCIDs
+    iccids_limpios = list(dict.fromkeys(_normalizar_iccids(iccids)))
+    
+    data = {
+        'distribuidor_id': nuevo_distribuidor_id,
+        'codigo_bt': nuevo_codigo_bt.upper().strip(),
+        'nombre_distribuidor': nuevo_nombre.upper().strip(),
+        'observaciones': f"CORREGIDO: {motivo}" if motivo else "CORREGIDO",
+        'updated_at': _ahora_utc()
+    }
+    
+    lotes = _dividir_en_lotes(iccids_limpios, TAMANO_LOTE_CONSULTA)
+    
+    def actualizar_lote(lote: List[str]) -> Dict:
+        try:
+            result = supabase.table('envios')\
+                .update(data)\
+                .in_('iccid', lote)\
+                .execute()
+            actualizados = {r['iccid'] for r in result.data}
+            return {
+                'actualizados': [iccid for iccid in lote if iccid in actualizados],
+                'no_encontrados': [iccid for iccid in lote if iccid not in actualizados],
+                'error': None
+            }
+        except Exception as e:
+            return {'actualizados': [], 'no_encontrados': [], 'error': str(e)}
+    
+    actualizados = []
+    no_encontrados = []
+    errores = []
+    detalle_lotes = []
+    
+    if lotes:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONSULTAS_CONCURRENTES, len(lotes))) as executor:
+            for num_lote, (lote, resultado) in enumerate(zip(lotes, executor.map(actualizar_lote, lotes)), 1):
+                actualizados.extend(resultado['actualizados'])
+                no_encontrados.extend(resultado['no_encontrados'])
+                if resultado['error']:
+                    errores.append(f"Lote {num_lote} ({len(lote)} ICCIDs): {resultado['error']}")
+                detalle_lotes.append({
+                    'lote': num_lote,
+                    'total': len(lote),
+                    'actualizados': len(resultado['actualizados']),
+                    'exitoso': resultado['error'] is None,
+                    'error': resultado['error']
+                })
+    
+    if actualizados:
+        publicar('envios')
+    
+    return {
+        'actualizados': actualizados,
+        'no_encontrados': no_encontrados,
+        'lotes': detalle_lotes,
+        'errores': errores,
+        'total_procesados': len(iccids_limpios)
+    }
+
+
+def _reasignar_lote(
+    envios_actuales: List[Dict],
+    nuevo_distribuidor_id: str,
+    nuevo_codigo_bt: str,
+    nuevo_nombre: str,
+    motivo: str,
+    usuario: str,
+    fecha: date
+) -> List[Dict]:
+    """
+    Reasignar un lote de envíos como una sola unidad (todo o nada)
+    
+    Llama a la función reasignar_envios (sql/007_reasignar_envios.sql), que
+    marca REASIGNADO, inserta el historial y crea los nuevos envíos ACTIVO
+    en una sola transacción: si algo falla no se aplica nada del lote.
+    
+    Returns:
+        Lista de dicts con envio_anterior, envio_nuevo e historial por ICCID
+    """
+    supabase = get_supabase_client()
+    
+    codigo_bt = nuevo_codigo_bt.upper().strip()
+    
+    try:
+        result = supabase.rpc('reasignar_envios', {
+            'p_ids': [str(envio['id']) for envio in envios_actuales],
+            'p_iccids': [envio['iccid'] for envio in envios_actuales],
+            'p_distribuidor_id': str(nuevo_distribuidor_id),
+            'p_codigo_bt': codigo_bt,
+            'p_nombre': nuevo_nombre.upper().strip(),
+            'p_motivo': motivo,
+            'p_usuario': usuario,
+            'p_fecha': fecha.isoformat()
+        }).execute()
+    finally:
+        # Se avisa también si falla: la transacción pudo confirmarse
+        # aunque la respuesta no llegara
+        publicar('envios', [envio['codigo_bt'] for envio in envios_actuales] + [codigo_bt])
+    
+    nuevos_por_iccid = {envio['iccid']: envio for envio in result.data or []}
+    
+    return [{
+        'envio_anterior': envio,
+        'envio_nuevo': nuevos_por_iccid.get(envio['iccid']),
+        'historial': {
+            'envio_id': envio['id'],
+            'tipo_cambio': 'REASIGNACION',
+            'distribuidor_anterior_id': envio['distribuidor_id'],
+            'distribuidor_nuevo_id': nuevo_distribuidor_id,
+            'codigo_bt_anterior': envio['codigo_bt'],
+            'codigo_bt_nuevo': codigo_bt,
+            'motivo': motivo,
+            'usuario': usuario
+        }
+    } for envio in envios_actuales]
+
+
+def reasignar_sims_masivo(
+    iccids: List[str],
+    nuevo_distribuidor_id: str,
+    nuevo_codigo_bt: str,
+    nuevo_nombre: str,
+    motivo: str,
+    usuario: str = "Sistema"
+) -> Dict:
+    """
+    Reasignar muchas SIMs a otro distribuidor (con historial completo)
+    
+    Obtiene todos los envíos actuales en una sola pasada y procesa por lotes:
+    cada lote se reasigna con una llamada a reasignar_envios (una sola
+    transacción en la base), así que es todo o nada.
+    
+    Args:
+        iccids: Lista de ICCIDs a reasignar
+        nuevo_distribuidor_id: UUID del nuevo distribuidor
+        nuevo_codigo_bt: Código BT del nuevo distribuidor
+        nuevo_nombre: Nombre del nuevo distribuidor
+        motivo: Motivo de la reasignación
+        usuario: Usuario que reasigna
+    
+    Returns:
+        Dict con resultado (reasignados, no_encontrados, detalles, errores)
+    """
+    envios = get_envios_by_iccids(iccids)
+    
+    no_encontrados = [iccid for iccid, envio in envios.items() if envio is None]
+    envios_actuales = [envio for envio in envios.values() if envio is not None]
+    
+    fecha = get_fecha_actual_mexico()
+    lotes = _dividir_en_lotes(envios_actuales, TAMANO_LOTE_CONSULTA)
+    
+    def procesar_lote(lote: List[Dict]) -> Dict:
+        try:
+            detalles = _reasignar_lote(
+                lote, nuevo_distribuidor_id, nuevo_codigo_bt, nuevo_nombre, motivo, usuario, fecha
+            )
+            return {'detalles': detalles, 'error': None}
+        except Exception as e:
+            return {'detalles': [], 'error': str(e)}
+    
+    reasignados = []
+    detalles = []
+    errores = []
+    
+    if lotes:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONSULTAS_CONCURRENTES, len(lotes))) as executor:
+            for num_lote, (lote, resultado) in enumerate(zip(lotes, executor.map(procesar_lote, lotes)), 1):
+                if resultado['error']:
+                    errores.append(f"Lote {num_lote} ({len(lote)} ICCIDs, sin cambios): {resultado['error']}")
+                    continue
+                detalles.extend(resultado['detalles'])
+                reasignados.extend(d['envio_anterior']['iccid'] for d in resultado['detalles'])
+    
+    return {
+        'reasignados': reasignados,
+        'no_encontrados': no_encontrados,
+        'detalles': detalles,
+        'errores': errores,
+        'total_procesados': len(envios)
+    }
+
+
 def reasignar_sim(
     iccid: str,
     nuevo_distribuidor_id: str,
@@ -268,64 +866,35 @@ def reasignar_sim(
     Returns:
         Dict con resultado de la operación
     """
-    supabase = get_supabase_client()
-    
     # Obtener envío actual
     envio_actual = get_envio_by_iccid(iccid)
     if not envio_actual:
         raise ValueError(f"ICCID {iccid} no encontrado")
     
-    # Marcar envío actual como REASIGNADO
-    supabase.table('envios')\
-        .update({
-            'estatus': 'REASIGNADO',
-            'updated_at': datetime.now().isoformat()
-        })\
-        .eq('id', envio_actual['id'])\
-        .execute()
-    
-    # Registrar en historial
-    historial = {
-        'envio_id': envio_actual['id'],
-        'tipo_cambio': 'REASIGNACION',
-        'distribuidor_anterior_id': envio_actual['distribuidor_id'],
-        'distribuidor_nuevo_id': nuevo_distribuidor_id,
-        'codigo_bt_anterior': envio_actual['codigo_bt'],
-        'codigo_bt_nuevo': nuevo_codigo_bt.upper().strip(),
-        'motivo': motivo,
-        'usuario': usuario
-    }
-    
-    supabase.table('historial_cambios').insert(historial).execute()
+    detalles = _reasignar_lote(
+        [envio_actual],
+        nuevo_distribuidor_id,
+        nuevo_codigo_bt,
+        nuevo_nombre,
+        motivo,
+        usuario,
+        get_fecha_actual_mexico()
+    )
     
-    # Crear nuevo envío ACTIVO
-    nuevo_envio = {
-        'fecha_envio': get_fecha_actual_mexico().isoformat(),
-        'iccid': iccid.strip().upper(),
-        'distribuidor_id': nuevo_distribuidor_id,
-        'codigo_bt': nuevo_codigo_bt.upper().strip(),
-        'nombre_distribuidor': nuevo_nombre.upper().strip(),
-        'estatus': 'ACTIVO',
-        'observaciones': f"REASIGNADO: {motivo}",
-        'usuario_captura': usuario
-    }
-    
-    result = supabase.table('envios').insert(nuevo_envio).execute()
-    
-    return {
-        'envio_anterior': envio_actual,
-        'envio_nuevo': result.data[0],
-        'historial': historial
-    }
+    return detalles[0]
 
 
-def eliminar_iccids(iccids: List[str], usuario: str = "Sistema") -> Dict:
+def eliminar_iccids(iccids: List[str], usuario: str = "Sistema", dry_run: bool = False) -> Dict:
     """
     Eliminar físicamente ICCIDs de la base de datos
     
+    Primero resuelve cuáles existen con consultas .in_() por lote y después
+    elimina por lote con delete().in_(), ambos de forma concurrente.
+    
     Args:
         iccids: Lista de ICCIDs a eliminar
         usuario: Usuario que realiza la eliminación
+        dry_run: Si es True solo calcula el resultado, sin eliminar nada
     
     Returns:
         Dict con resultado (eliminados, no_encontrados, errores)
@@ -333,89 +902,254 @@ def eliminar_iccids(iccids: List[str], usuario: str = "Sistema") -> Dict:
     supabase = get_supabase_client()
     
     # Normalizar ICCIDs
-    iccids_limpios = [iccid.strip().upper() for iccid in iccids if iccid.strip()]
+    iccids_limpios = _normalizar_iccids(iccids)
+    iccids_unicos = list(dict.fromkeys(iccids_limpios))
     
-    eliminados = 0
-    no_encontrados = []
     errores = []
     
-    for iccid in iccids_limpios:
+    # Verificar cuáles existen
+    try:
+        filas_existentes = _get_filas_por_iccids(iccids_unicos, 'iccid, codigo_bt')
+        existentes = {fila['iccid'] for fila in filas_existentes}
+    except Exception as e:
+        return {
+            'eliminados': 0,
+            'no_encontrados': [],
+            'errores': [f"Error al buscar ICCIDs: {str(e)}"],
+            'total_procesados': len(iccids_limpios),
+            'dry_run': dry_run
+        }
+    
+    iccids_existentes = [iccid for iccid in iccids_unicos if iccid in existentes]
+    no_encontrados = [iccid for iccid in iccids_unicos if iccid not in existentes]
+    
+    if dry_run:
+        return {
+            'eliminados': len(iccids_existentes),
+            'no_encontrados': no_encontrados,
+            'errores': errores,
+            'total_procesados': len(iccids_limpios),
+            'dry_run': True
+        }
+    
+    lotes = _dividir_en_lotes(iccids_existentes, TAMANO_LOTE_CONSULTA)
+    
+    def eliminar_lote(lote: List[str]) -> Dict:
         try:
-            # Verificar si existe
-            envio = get_envio_by_iccid(iccid)
-            
-            if envio:
-                # Eliminar el registro
-                result = supabase.table('envios')\
-                    .delete()\
-                    .eq('iccid', iccid)\
-                    .execute()
-                
-                if result.data:
-                    eliminados += 1
-                else:
-                    errores.append(f"No se pudo eliminar {iccid}")
-            else:
-                no_encontrados.append(iccid)
-                
+            result = supabase.table('envios')\
+                .delete()\
+                .in_('iccid', lote)\
+                .execute()
+            return {'eliminados': {r['iccid'] for r in result.data}, 'error': None}
         except Exception as e:
-            errores.append(f"Error al eliminar {iccid}: {str(e)}")
+            return {'eliminados': set(), 'error': str(e)}
+    
+    eliminados = 0
+    
+    if lotes:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONSULTAS_CONCURRENTES, len(lotes))) as executor:
+            for num_lote, (lote, resultado) in enumerate(zip(lotes, executor.map(eliminar_lote, lotes)), 1):
+                if resultado['error']:
+                    errores.append(f"Error al eliminar lote {num_lote} ({len(lote)} ICCIDs): {resultado['error']}")
+                    continue
+                for iccid in lote:
+                    if iccid in resultado['eliminados']:
+                        eliminados += 1
+                    else:
+                        errores.append(f"No se pudo eliminar {iccid}")
+    
+    if eliminados:
+        publicar('envios', [fila['codigo_bt'] for fila in filas_existentes])
     
     return {
         'eliminados': eliminados,
         'no_encontrados': no_encontrados,
         'errores': errores,
-        'total_procesados': len(iccids_limpios)
+        'total_procesados': len(iccids_limpios),
+        'dry_run': False
     }
 
 
-def get_estadisticas_envios() -> Dict:
+def get_estadisticas_envios(estimado: bool = False) -> Dict:
     """
     Obtener estadísticas de envíos
     
+    Todos los estatus se cuentan en una sola consulta agrupada.
+    
+    Args:
+        estimado: Usar conteos estimados (más rápido en tablas muy grandes)
+    
     Returns:
         Dict con estadísticas
     """
     supabase = get_supabase_client()
     
-    # Total
-    total = supabase.table('envios')\
-        .select('*', count='exact')\
-        .execute()
+    result = supabase.rpc('conteo_por_estatus', {
+        'p_tabla': 'envios',
+        'p_estimado': estimado
+    }).execute()
     
-    # Activos
-    activos = supabase.table('envios')\
-        .select('*', count='exact')\
-        .eq('estatus', 'ACTIVO')\
-        .execute()
+    return _estadisticas_envios(result.data)
+
+
+def get_top_distribuidores(
+    limite: int = 10,
+    estatus: Optional[str] = 'ACTIVO',
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None
+) -> List[Dict]:
+    """
+    Obtener el top de distribuidores por cantidad de SIMs (agregado en la base de datos)
     
-    # Reasignados
-    reasignados = supabase.table('envios')\
-        .select('*', count='exact')\
-        .eq('estatus', 'REASIGNADO')\
-        .execute()
+    Args:
+        limite: Cantidad de distribuidores a regresar
+        estatus: Filtrar por estatus (None = todos)
+        fecha_desde: Fecha inicial (opcional)
+        fecha_hasta: Fecha final (opcional)
     
-    # Cancelados
-    cancelados = supabase.table('envios')\
-        .select('*', count='exact')\
-        .eq('estatus', 'CANCELADO')\
-        .execute()
+    Returns:
+        Lista de dicts con codigo_bt, nombre_distribuidor y total_sims
+    """
+    supabase = get_supabase_client()
     
-    return {
-        'total': total.count,
-        'activos': activos.count,
-        'reasignados': reasignados.count,
-        'cancelados': cancelados.count
-    }
+    result = supabase.rpc('top_distribuidores_envios', {
+        'p_limite': limite,
+        'p_estatus': estatus.upper().strip() if estatus else None,
+        'p_desde': fecha_desde.isoformat() if fecha_desde else None,
+        'p_hasta': fecha_hasta.isoformat() if fecha_hasta else None
+    }).execute()
+    
+    return result.data
 
 
-def get_sims_por_distribuidor(codigo_bt: str, estatus: str = 'ACTIVO') -> List[Dict]:
+def get_conteo_diario(
+    dias: int = 30,
+    estatus: Optional[str] = 'ACTIVO',
+    fecha_hasta: Optional[date] = None
+) -> List[Dict]:
+    """
+    Obtener la cantidad de SIMs por día de envío (agregado en la base de datos)
+    
+    Args:
+        dias: Cantidad de días hacia atrás
+        estatus: Filtrar por estatus (None = todos)
+        fecha_hasta: Último día del rango (default: hoy)
+    
+    Returns:
+        Lista de dicts con fecha y cantidad, ordenada por fecha
+    """
+    supabase = get_supabase_client()
+    
+    if fecha_hasta is None:
+        fecha_hasta = get_fecha_actual_mexico()
+    
+    fecha_desde = fecha_hasta - timedelta(days=dias)
+    
+    result = supabase.rpc('conteo_diario_envios', {
+        'p_desde': fecha_desde.isoformat(),
+        'p_hasta': fecha_hasta.isoformat(),
+        'p_estatus': estatus.upper().strip() if estatus else None
+    }).execute()
+    
+    return result.data
+
+
+def get_conteo_por_estatus(
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None
+) -> Dict[str, int]:
+    """
+    Obtener la cantidad de SIMs por estatus (agregado en la base de datos)
+    
+    Args:
+        fecha_desde: Fecha inicial (opcional)
+        fecha_hasta: Fecha final (opcional)
+    
+    Returns:
+        Dict {estatus: cantidad}
+    """
+    supabase = get_supabase_client()
+    
+    result = supabase.rpc('conteo_envios_por_estatus', {
+        'p_desde': fecha_desde.isoformat() if fecha_desde else None,
+        'p_hasta': fecha_hasta.isoformat() if fecha_hasta else None
+    }).execute()
+    
+    return {r['estatus']: r['cantidad'] for r in result.data}
+
+
+def get_analisis_periodo(
+    fecha_desde: date,
+    fecha_hasta: date,
+    limite_top: int = 15
+) -> Dict:
+    """
+    Obtener los agregados de un período (agregado en la base de datos)
+    
+    Args:
+        fecha_desde: Fecha inicial (inclusiva)
+        fecha_hasta: Fecha final (inclusiva)
+        limite_top: Cantidad de distribuidores en el top
+    
+    Returns:
+        Dict con total, por_estatus ({estatus: cantidad}), distribuidores
+        (cantidad distinta), diario (lista de fecha/cantidad) y top
+        (lista de codigo_bt/cantidad)
+    """
+    supabase = get_supabase_client()
+    
+    result = supabase.rpc('analisis_periodo_envios', {
+        'p_desde': fecha_desde.isoformat(),
+        'p_hasta': fecha_hasta.isoformat(),
+        'p_limite': limite_top
+    }).execute()
+    
+    return _analisis_periodo(result.data)
+
+
+def verificar_envios_diario() -> List[Dict]:
+    """
+    Comparar el resumen diario (envios_diario) contra la tabla envios
+    
+    Returns:
+        Lista de dicts con fecha_envio, codigo_bt, estatus, cantidad_resumen
+        y cantidad_real de cada llave que no coincide (vacía = al día)
+    """
+    supabase = get_supabase_client()
+    
+    result = supabase.rpc('verificar_envios_diario', {}).execute()
+    
+    return result.data
+
+
+def reconstruir_envios_diario() -> int:
+    """
+    Reconstruir el resumen diario (envios_diario) desde la tabla envios
+    
+    Bloquea las escrituras en envios mientras recalcula; usar solo si
+    verificar_envios_diario() encuentra diferencias. La función solo se
+    permite a service_role: el cliente debe usar la llave de servicio.
+    
+    Returns:
+        Cantidad de filas del resumen reconstruido
+    """
+    supabase = get_supabase_client()
+    
+    result = supabase.rpc('reconstruir_envios_diario', {}).execute()
+    
+    publicar('envios')
+    
+    return result.data
+
+
+def get_sims_por_distribuidor(codigo_bt: str, estatus: str = 'ACTIVO', columnas: str = '*') -> List[Dict]:
     """
     Obtener SIMs de un distribuidor específico
     
     Args:
         codigo_bt: Código BT del distribuidor
         estatus: Filtrar por estatus (default: ACTIVO)
+        columnas: Columnas a traer (default: todas)
     
     Returns:
         Lista de SIMs del distribuidor
@@ -423,7 +1157,7 @@ def get_sims_por_distribuidor(codigo_bt: str, estatus: str = 'ACTIVO') -> List[D
     supabase = get_supabase_client()
     
     result = supabase.table('envios')\
-        .select('*')\
+        .select(columnas)\
         .eq('codigo_bt', codigo_bt.upper().strip())\
         .eq('estatus', estatus.upper().strip())\
         .order('fecha_envio', desc=True)\
@@ -449,7 +1183,7 @@ def cancelar_envio(iccid: str, motivo: str, usuario: str = "Sistema") -> Dict:
     data = {
         'estatus': 'CANCELADO',
         'observaciones': f"CANCELADO: {motivo}",
-        'updated_at': datetime.now().isoformat()
+        'updated_at': _ahora_utc()
     }
     
     result = supabase.table('envios')\
@@ -457,6 +1191,9 @@ def cancelar_envio(iccid: str, motivo: str, usuario: str = "Sistema") -> Dict:
         .eq('iccid', iccid.strip().upper())\
         .execute()
     
+    if result.data:
+        publicar('envios', [envio['codigo_bt'] for envio in result.data])
+    
     return result.data[0] if result.data else None
 
 
@@ -464,6 +1201,12 @@ def corregir_fecha_envio(iccids: List[str], nueva_fecha: date, motivo: str, usua
     """
     Corregir la fecha de envío de ICCIDs capturados tardíamente
     
+    Lee todos los registros en una sola pasada por lotes (para conservar la
+    fecha anterior y las observaciones de cada fila) y actualiza solo
+    fecha_envio, observaciones y updated_at con .in_() por id, agrupando las
+    filas que quedan con las mismas observaciones. Las demás columnas no se
+    tocan y las filas borradas entre la lectura y la escritura no se recrean.
+    
     Args:
         iccids: Lista de ICCIDs a corregir
         nueva_fecha: Nueva fecha de envío correcta
@@ -476,48 +1219,90 @@ def corregir_fecha_envio(iccids: List[str], nueva_fecha: date, motivo: str, usua
     supabase = get_supabase_client()
     
     # Normalizar ICCIDs
-    iccids_limpios = [iccid.strip().upper() for iccid in iccids if iccid.strip()]
+    iccids_limpios = _normalizar_iccids(iccids)
+    iccids_unicos = list(dict.fromkeys(iccids_limpios))
     
-    actualizados = 0
     no_encontrados = []
     errores = []
     detalles = []
     
-    for iccid in iccids_limpios:
+    try:
+        filas = _get_filas_por_iccids(iccids_unicos)
+    except Exception as e:
+        return {
+            'actualizados': 0,
+            'no_encontrados': [],
+            'errores': [f"Error al buscar ICCIDs: {str(e)}"],
+            'detalles': [],
+            'total_procesados': len(iccids_limpios)
+        }
+    
+    # Envío más reciente de cada ICCID (para el detalle) e ids a actualizar
+    # agrupados por sus nuevas observaciones
+    envios_recientes = {}
+    ids_por_observaciones = {}
+    for fila in filas:
+        actual = envios_recientes.get(fila['iccid'])
+        if actual is None or (fila.get('created_at') or '') > (actual.get('created_at') or ''):
+            envios_recientes[fila['iccid']] = fila
+        
+        observaciones = f"{fila.get('observaciones') or ''} | FECHA CORREGIDA: {motivo}".strip(' |')
+        ids_por_observaciones.setdefault(observaciones, []).append(fila['id'])
+    
+    marca = _ahora_utc()
+    lotes = [
+        (observaciones, lote)
+        for observaciones, ids in ids_por_observaciones.items()
+        for lote in _dividir_en_lotes(ids, TAMANO_LOTE_CONSULTA)
+    ]
+    iccid_por_id = {fila['id']: fila['iccid'] for fila in filas}
+    
+    def actualizar_lote(lote_observaciones) -> Dict:
+        observaciones, ids = lote_observaciones
         try:
-            # Verificar si existe
-            envio = get_envio_by_iccid(iccid)
-            
-            if envio:
-                fecha_anterior = envio['fecha_envio']
-                
-                # Actualizar fecha
-                result = supabase.table('envios')\
-                    .update({
-                        'fecha_envio': nueva_fecha.isoformat(),
-                        'observaciones': f"{envio.get('observaciones', '')} | FECHA CORREGIDA: {motivo}".strip(' |')
-                    })\
-                    .eq('iccid', iccid)\
-                    .execute()
-                
-                if result.data:
-                    actualizados += 1
-                    detalles.append({
-                        'iccid': iccid,
-                        'fecha_anterior': fecha_anterior,
-                        'fecha_nueva': nueva_fecha.isoformat(),
-                        'distribuidor': envio['codigo_bt']
-                    })
-                else:
-                    errores.append(f"No se pudo actualizar {iccid}")
-            else:
-                no_encontrados.append(iccid)
-                
+            result = supabase.table('envios')\
+                .update({
+                    'fecha_envio': nueva_fecha.isoformat(),
+                    'observaciones': observaciones,
+                    'updated_at': marca
+                })\
+                .in_('id', ids)\
+                .execute()
+            return {'actualizados': {r['iccid'] for r in result.data}, 'error': None}
         except Exception as e:
-            errores.append(f"Error al actualizar {iccid}: {str(e)}")
+            return {'actualizados': set(), 'error': str(e)}
+    
+    iccids_actualizados = set()
+    iccids_con_error = set()
+    
+    if lotes:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONSULTAS_CONCURRENTES, len(lotes))) as executor:
+            for num_lote, ((_, ids), resultado) in enumerate(zip(lotes, executor.map(actualizar_lote, lotes)), 1):
+                if resultado['error']:
+                    errores.append(f"Error al actualizar lote {num_lote} ({len(ids)} registros): {resultado['error']}")
+                    iccids_con_error.update(iccid_por_id[id_fila] for id_fila in ids)
+                iccids_actualizados.update(resultado['actualizados'])
+    
+    for iccid in iccids_unicos:
+        envio = envios_recientes.get(iccid)
+        
+        if envio is None:
+            no_encontrados.append(iccid)
+        elif iccid in iccids_actualizados:
+            detalles.append({
+                'iccid': iccid,
+                'fecha_anterior': envio['fecha_envio'],
+                'fecha_nueva': nueva_fecha.isoformat(),
+                'distribuidor': envio['codigo_bt']
+            })
+        elif iccid not in iccids_con_error:
+            errores.append(f"No se pudo actualizar {iccid}")
+    
+    if iccids_actualizados:
+        publicar('envios', [fila['codigo_bt'] for fila in filas if fila['iccid'] in iccids_actualizados])
     
     return {
-        'actualizados': actualizados,
+        'actualizados': len(detalles),
         'no_encontrados': no_encontrados,
         'errores': errores,
         'detalles': detalles,
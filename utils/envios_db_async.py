@@ -0,0 +1,231 @@
+"""
+Versión async de las consultas de envios (para ejecutar varias a la vez)
+
+Las funciones tienen la misma firma y el mismo resultado que las de
+envios_db. Desde Streamlit se llaman con utils.asincrono, por ejemplo:
+
+    stats, top = ejecutar_en_paralelo(
+        get_estadisticas_envios(),
+        get_top_distribuidores(limite=10)
+    )
+"""
+
+import asyncio
+from typing import List, Dict, Optional
+from datetime import date, timedelta
+from .supabase_client import get_supabase_async_client
+from .timezone_config import get_fecha_actual_mexico
+from .envios_db import (
+    TAMANO_LOTE_CONSULTA,
+    MAX_CONSULTAS_CONCURRENTES,
+    _normalizar_iccids,
+    _dividir_en_lotes,
+    _mas_recientes,
+    _estadisticas_envios,
+    _analisis_periodo
+)
+
+
+async def get_filas_por_iccids(iccids: List[str], columnas: str = '*') -> List[Dict]:
+    """
+    Obtener todas las filas de envios de una lista de ICCIDs
+    
+    Las consultas se hacen en lotes de TAMANO_LOTE_CONSULTA con .in_(), con
+    hasta MAX_CONSULTAS_CONCURRENTES lotes en curso a la vez.
+    
+    Args:
+        iccids: Lista de ICCIDs ya normalizados (sin repetidos)
+        columnas: Columnas a obtener
+    
+    Returns:
+        Lista con todas las filas encontradas (puede haber varias por ICCID)
+    """
+    if not iccids:
+        return []
+    
+    supabase = await get_supabase_async_client()
+    limite = asyncio.Semaphore(MAX_CONSULTAS_CONCURRENTES)
+    
+    async def consultar_lote(lote: List[str]) -> List[Dict]:
+        async with limite:
+            result = await supabase.table('envios')\
+                .select(columnas)\
+                .in_('iccid', lote)\
+                .execute()
+            return result.data
+    
+    resultados = await asyncio.gather(*(consultar_lote(lote) for lote in _dividir_en_lotes(iccids, TAMANO_LOTE_CONSULTA)))
+    
+    return [fila for filas_lote in resultados for fila in filas_lote]
+
+
+async def get_envio_by_iccid(iccid: str) -> Optional[Dict]:
+    """
+    Obtener envío por ICCID
+    
+    Args:
+        iccid: ICCID a buscar
+    
+    Returns:
+        Envío encontrado o None
+    """
+    supabase = await get_supabase_async_client()
+    
+    result = await supabase.table('envios')\
+        .select('*')\
+        .eq('iccid', iccid.strip().upper())\
+        .order('created_at', desc=True)\
+        .limit(1)\
+        .execute()
+    
+    return result.data[0] if result.data else None
+
+
+async def get_envios_by_iccids(iccids: List[str]) -> Dict[str, Optional[Dict]]:
+    """
+    Obtener el envío más reciente de cada ICCID en una sola operación masiva
+    
+    Args:
+        iccids: Lista de ICCIDs a buscar
+    
+    Returns:
+        Dict {iccid: envío más reciente (por created_at) o None si no existe}.
+        Las llaves son los ICCIDs normalizados (sin espacios, en mayúsculas).
+    """
+    iccids_limpios = list(dict.fromkeys(_normalizar_iccids(iccids)))
+    
+    return _mas_recientes(iccids_limpios, await get_filas_por_iccids(iccids_limpios))
+
+
+async def get_estadisticas_envios(estimado: bool = False) -> Dict:
+    """
+    Obtener estadísticas de envíos
+    
+    Args:
+        estimado: Usar conteos estimados (más rápido en tablas muy grandes)
+    
+    Returns:
+        Dict con estadísticas
+    """
+    supabase = await get_supabase_async_client()
+    
+    result = await supabase.rpc('conteo_por_estatus', {
+        'p_tabla': 'envios',
+        'p_estimado': estimado
+    }).execute()
+    
+    return _estadisticas_envios(result.data)
+
+
+async def get_top_distribuidores(
+    limite: int = 10,
+    estatus: Optional[str] = 'ACTIVO',
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None
+) -> List[Dict]:
+    """
+    Obtener el top de distribuidores por cantidad de SIMs (agregado en la base de datos)
+    
+    Args:
+        limite: Cantidad de distribuidores a regresar
+        estatus: Filtrar por estatus (None = todos)
+        fecha_desde: Fecha inicial (opcional)
+        fecha_hasta: Fecha final (opcional)
+    
+    Returns:
+        Lista de dicts con codigo_bt, nombre_distribuidor y total_sims
+    """
+    supabase = await get_supabase_async_client()
+    
+    result = await supabase.rpc('top_distribuidores_envios', {
+        'p_limite': limite,
+        'p_estatus': estatus.upper().strip() if estatus else None,
+        'p_desde': fecha_desde.isoformat() if fecha_desde else None,
+        'p_hasta': fecha_hasta.isoformat() if fecha_hasta else None
+    }).execute()
+    
+    return result.data
+
+
+async def get_conteo_diario(
+    dias: int = 30,
+    estatus: Optional[str] = 'ACTIVO',
+    fecha_hasta: Optional[date] = None
+) -> List[Dict]:
+    """
+    Obtener la cantidad de SIMs por día de envío (agregado en la base de datos)
+    
+    Args:
+        dias: Cantidad de días hacia atrás
+        estatus: Filtrar por estatus (None = todos)
+        fecha_hasta: Último día del rango (default: hoy)
+    
+    Returns:
+        Lista de dicts con fecha y cantidad, ordenada por fecha
+    """
+    supabase = await get_supabase_async_client()
+    
+    if fecha_hasta is None:
+        fecha_hasta = get_fecha_actual_mexico()
+    
+    fecha_desde = fecha_hasta - timedelta(days=dias)
+    
+    result = await supabase.rpc('conteo_diario_envios', {
+        'p_desde': fecha_desde.isoformat(),
+        'p_hasta': fecha_hasta.isoformat(),
+        'p_estatus': estatus.upper().strip() if estatus else None
+    }).execute()
+    
+    return result.data
+
+
+async def get_conteo_por_estatus(
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None
+) -> Dict[str, int]:
+    """
+    Obtener la cantidad de SIMs por estatus (agregado en la base de datos)
+    
+    Args:
+        fecha_desde: Fecha inicial (opcional)
+        fecha_hasta: Fecha final (opcional)
+    
+    Returns:
+        Dict {estatus: cantidad}
+    """
+    supabase = await get_supabase_async_client()
+    
+    result = await supabase.rpc('conteo_envios_por_estatus', {
+        'p_desde': fecha_desde.isoformat() if fecha_desde else None,
+        'p_hasta': fecha_hasta.isoformat() if fecha_hasta else None
+    }).execute()
+    
+    return {r['estatus']: r['cantidad'] for r in result.data}
+
+
+async def get_analisis_periodo(
+    fecha_desde: date,
+    fecha_hasta: date,
+    limite_top: int = 15
+) -> Dict:
+    """
+    Obtener los agregados de un período (agregado en la base de datos)
+    
+    Args:
+        fecha_desde: Fecha inicial (inclusiva)
+        fecha_hasta: Fecha final (inclusiva)
+        limite_top: Cantidad de distribuidores en el top
+    
+    Returns:
+        Dict con total, por_estatus, distribuidores, diario y top (ver
+        envios_db.get_analisis_periodo)
+    """
+    supabase = await get_supabase_async_client()
+    
+    result = await supabase.rpc('analisis_periodo_envios', {
+        'p_desde': fecha_desde.isoformat(),
+        'p_hasta': fecha_hasta.isoformat(),
+        'p_limite': limite_top
+    }).execute()
+    
+    return _analisis_periodo(result.data)
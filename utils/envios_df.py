@@ -0,0 +1,141 @@
+"""
+Carga de envíos en DataFrames con tipos fijos para reportes
+"""
+
+from typing import Dict, Iterable, List, Optional
+import pandas as pd
+from pandas.api.types import union_categoricals
+from .envios_db import iter_envios
+
+# ICCID como string de Arrow si está disponible (viene con streamlit)
+try:
+    import pyarrow  # noqa: F401
+    TIPO_TEXTO = 'string[pyarrow]'
+except ImportError:
+    TIPO_TEXTO = 'string'
+
+# Tipo de cada columna de envios: categoria, fecha, timestamp o texto
+TIPOS_COLUMNAS_ENVIOS = {
+    'id': 'texto',
+    'iccid': 'texto',
+    'codigo_bt': 'categoria',
+    'nombre_distribuidor': 'categoria',
+    'estatus': 'categoria',
+    'fecha_envio': 'fecha',
+    'created_at': 'timestamp',
+    'updated_at': 'timestamp',
+    'distribuidor_id': 'texto',
+    'observaciones': 'texto'
+}
+
+# Columnas que usan los reportes por defecto
+COLUMNAS_REPORTE = ['fecha_envio', 'iccid', 'codigo_bt', 'nombre_distribuidor', 'estatus']
+
+
+def _valores(pagina, columna: str) -> list:
+    """Valores de una columna de una página (lista de dicts o DataFrame)"""
+    if isinstance(pagina, pd.DataFrame):
+        return pagina[columna].tolist()
+    return [fila.get(columna) for fila in pagina]
+
+
+def _categorias(valores: list) -> pd.Index:
+    """Categorías (object) de una página, aunque todos sus valores sean nulos"""
+    return pd.Index(sorted({v for v in valores if not pd.isna(v)}), dtype=object)
+
+
+def _convertir(valores: list, tipo: str) -> pd.Series:
+    """Convertir los valores de una página al tipo fijo de la columna"""
+    if tipo == 'categoria':
+        # Categorías siempre object: una página solo con nulos daría float64
+        # y union_categoricals no puede unirla con las demás
+        return pd.Series(pd.Categorical(valores, categories=_categorias(valores)))
+    if tipo == 'fecha':
+        return pd.Series(pd.to_datetime(valores, format='ISO8601'))
+    if tipo == 'timestamp':
+        return pd.Series(pd.to_datetime(valores, format='ISO8601', utc=True))
+    return pd.Series(valores, dtype=TIPO_TEXTO)
+
+
+def _vacia(tipo: str) -> pd.Series:
+    """Serie vacía con el tipo fijo de la columna"""
+    if tipo == 'categoria':
+        return pd.Series(pd.Categorical([], categories=_categorias([])))
+    if tipo == 'fecha':
+        return pd.Series([], dtype='datetime64[ns]')
+    if tipo == 'timestamp':
+        return pd.Series([], dtype='datetime64[ns, UTC]')
+    return pd.Series([], dtype=TIPO_TEXTO)
+
+
+def construir_df_envios(paginas: Iterable, columnas: List[str]) -> pd.DataFrame:
+    """
+    Construir un DataFrame tipado columna por columna a partir de páginas
+    
+    Cada página se convierte al tipo final en cuanto llega, así nunca se
+    tiene en memoria la lista completa de dicts.
+    
+    Args:
+        paginas: Iterable de páginas (listas de dicts o DataFrames)
+        columnas: Columnas a conservar
+    
+    Returns:
+        DataFrame con category para códigos/estatus, datetime64 para
+        fechas y string para ICCID
+    """
+    invalidas = [columna for columna in columnas if columna not in TIPOS_COLUMNAS_ENVIOS]
+    if invalidas:
+        raise ValueError(f"Columnas sin tipo definido: {', '.join(invalidas)}")
+    
+    partes = {columna: [] for columna in columnas}
+    
+    for pagina in paginas:
+        if len(pagina) == 0:
+            continue
+        for columna in columnas:
+            partes[columna].append(_convertir(_valores(pagina, columna), TIPOS_COLUMNAS_ENVIOS[columna]))
+    
+    datos = {}
+    for columna in columnas:
+        tipo = TIPOS_COLUMNAS_ENVIOS[columna]
+        trozos = partes.pop(columna)
+        
+        if not trozos:
+            datos[columna] = _vacia(tipo)
+        elif tipo == 'categoria':
+            datos[columna] = pd.Series(union_categoricals(trozos))
+        else:
+            datos[columna] = pd.concat(trozos, ignore_index=True)
+    
+    return pd.DataFrame(datos)
+
+
+def cargar_envios_df(
+    filtros: Optional[Dict] = None,
+    columnas: Optional[List[str]] = None,
+    orden: str = 'fecha_envio',
+    descendente: bool = True
+) -> pd.DataFrame:
+    """
+    Cargar envíos de Supabase en un DataFrame tipado
+    
+    Args:
+        filtros: Filtros de iter_envios (iccid, codigo_bt, codigo_bt_exacto,
+            fecha_desde, fecha_hasta, estatus)
+        columnas: Columnas a traer (default: COLUMNAS_REPORTE)
+        orden: Columna de orden
+        descendente: Orden descendente (default: True)
+    
+    Returns:
+        DataFrame con tipos fijos (ver construir_df_envios)
+    """
+    columnas = columnas or COLUMNAS_REPORTE
+    
+    paginas = iter_envios(
+        filtros,
+        columnas=', '.join(columnas),
+        orden=orden,
+        descendente=descendente
+    )
+    
+    return construir_df_envios(paginas, columnas)
@@ -0,0 +1,213 @@
+"""
+Exportación de datos a CSV / CSV comprimido / Excel sin armar todo en memoria
+"""
+
+import csv
+import gzip
+import io
+import os
+import tempfile
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Sequence
+import pandas as pd
+from openpyxl import Workbook
+from .almacen_local import get_directorio_local
+
+# Formatos soportados: extensión y tipo MIME
+FORMATOS_EXPORTACION = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+}
+
+# Etiquetas para los selectores de formato en las páginas
+ETIQUETAS_FORMATO = {
+    'csv': 'CSV',
+    'csv.gz': 'CSV comprimido (.gz)',
+    'xlsx': 'Excel (.xlsx)'
+}
+
+# Filas por bloque al recorrer un DataFrame
+TAMANO_BLOQUE_EXPORTACION = 10000
+
+# Límite de filas de una hoja de Excel (sin encabezado)
+MAX_FILAS_XLSX = 1048575
+
+# Máximo de filas para descargar directo desde la página; st.download_button
+# carga el archivo completo en memoria, los reportes más grandes se generan
+# en segundo plano (trabajos_exportacion)
+MAX_FILAS_DESCARGA_DIRECTA = 50000
+
+
+def _filas(paginas: Iterable, claves: List[str]) -> Iterator[Sequence]:
+    """Recorrer páginas (listas de dicts o DataFrames) fila por fila"""
+    for pagina in paginas:
+        if isinstance(pagina, pd.DataFrame):
+            bloque = pagina[claves].astype(object)
+            bloque = bloque.where(bloque.notna(), None)
+            yield from bloque.itertuples(index=False, name=None)
+        else:
+            for fila in pagina:
+                yield tuple(fila.get(clave) for clave in claves)
+
+
+def _bloques_dataframe(df: pd.DataFrame) -> Iterator[pd.DataFrame]:
+    """Partir un DataFrame en bloques de TAMANO_BLOQUE_EXPORTACION filas"""
+    for inicio in range(0, len(df), TAMANO_BLOQUE_EXPORTACION):
+        yield df.iloc[inicio:inicio + TAMANO_BLOQUE_EXPORTACION]
+
+
+def _escribir_csv(archivo: BinaryIO, filas: Iterator[Sequence], encabezados: List[str], comprimir: bool) -> int:
+    """Escribir filas como CSV (utf-8-sig para Excel), opcionalmente con gzip"""
+    destino = gzip.GzipFile(fileobj=archivo, mode='wb') if comprimir else archivo
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    
+    escritor = csv.writer(texto)
+    escritor.writerow(encabezados)
+    
+    total = 0
+    for fila in filas:
+        escritor.writerow(fila)
+        total += 1
+    
+    texto.flush()
+    texto.detach()
+    if comprimir:
+        destino.close()
+    
+    return total
+
+
+def _escribir_xlsx(ruta: str, filas: Iterator[Sequence], encabezados: List[str], nombre_hoja: str) -> int:
+    """Escribir filas en un libro de Excel en modo write_only (una hoja por cada 1M filas)"""
+    libro = Workbook(write_only=True)
+    hoja = None
+    filas_hoja = MAX_FILAS_XLSX
+    total = 0
+    
+    for fila in filas:
+        if filas_hoja >= MAX_FILAS_XLSX:
+            numero = len(libro.worksheets) + 1
+            hoja = libro.create_sheet(nombre_hoja if numero == 1 else f"{nombre_hoja} {numero}")
+            hoja.append(encabezados)
+            filas_hoja = 0
+        
+        hoja.append(list(fila))
+        filas_hoja += 1
+        total += 1
+    
+    if hoja is None:
+        libro.create_sheet(nombre_hoja).append(encabezados)
+    
+    libro.save(ruta)
+    return total
+
+
+def escribir_exportacion(
+    paginas: Iterable,
+    columnas: Dict[str, str],
+    ruta: str,
+    formato: str = 'csv',
+    nombre_hoja: str = 'Datos'
+) -> int:
+    """
+    Escribir páginas de filas en un archivo conforme van llegando
+    
+    Args:
+        paginas: Iterable de páginas (listas de dicts o DataFrames),
+            por ejemplo iter_envios(...)
+        columnas: Dict {columna: encabezado}, en el orden de salida
+        ruta: Ruta del archivo a generar
+        formato: 'csv', 'csv.gz' o 'xlsx'
+        nombre_hoja: Nombre de la hoja (solo xlsx)
+    
+    Returns:
+        Cantidad de filas escritas
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}")
+    
+    claves = list(columnas.keys())
+    encabezados = list(columnas.values())
+    filas = _filas(paginas, claves)
+    
+    if formato == 'xlsx':
+        return _escribir_xlsx(ruta, filas, encabezados, nombre_hoja)
+    
+    with open(ruta, 'wb') as archivo:
+        return _escribir_csv(archivo, filas, encabezados, formato == 'csv.gz')
+
+
+def exportar(
+    paginas: Iterable,
+    columnas: Dict[str, str],
+    formato: str = 'csv',
+    nombre_hoja: str = 'Datos'
+) -> BinaryIO:
+    """
+    Exportar páginas de filas a un archivo temporal
+    
+    Las filas se escriben conforme llegan las páginas: escribir el archivo no
+    arma el texto completo en memoria. Quien llama sí puede tenerlo todo en
+    memoria (ej: un DataFrame ya cargado) y st.download_button lee el archivo
+    completo al mostrarse; para reportes de más de MAX_FILAS_DESCARGA_DIRECTA
+    filas usar trabajos_exportacion.encolar_exportacion.
+    
+    Args:
+        paginas: Iterable de páginas (listas de dicts o DataFrames),
+            por ejemplo iter_envios(...)
+        columnas: Dict {columna: encabezado}, en el orden de salida
+        formato: 'csv', 'csv.gz' o 'xlsx'
+        nombre_hoja: Nombre de la hoja (solo xlsx)
+    
+    Returns:
+        Archivo binario abierto en modo lectura, listo para st.download_button.
+        El archivo en disco se borra al cerrarlo.
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}")
+    
+    descriptor, ruta = tempfile.mkstemp(
+        suffix=FORMATOS_EXPORTACION[formato][0],
+        dir=get_directorio_local('exportaciones')
+    )
+    os.close(descriptor)
+    
+    try:
+        escribir_exportacion(paginas, columnas, ruta, formato, nombre_hoja)
+        
+        # Se abre para lectura y se quita del directorio: el espacio se libera
+        # al cerrar el archivo (o cuando el objeto se descarta)
+        resultado = open(ruta, 'rb')
+    finally:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+    
+    return resultado
+
+
+def exportar_dataframe(df: pd.DataFrame, formato: str = 'csv', nombre_hoja: str = 'Datos') -> BinaryIO:
+    """
+    Exportar un DataFrame por bloques (sin generar el texto completo en memoria)
+    
+    Args:
+        df: DataFrame a exportar (los nombres de columna son los encabezados)
+        formato: 'csv', 'csv.gz' o 'xlsx'
+        nombre_hoja: Nombre de la hoja (solo xlsx)
+    
+    Returns:
+        Archivo binario abierto en modo lectura (ver exportar)
+    """
+    columnas = {columna: columna for columna in df.columns}
+    return exportar(_bloques_dataframe(df), columnas, formato, nombre_hoja)
+
+
+def nombre_archivo_exportacion(base: str, formato: str) -> str:
+    """Nombre de archivo con la extensión del formato"""
+    return f"{base}{FORMATOS_EXPORTACION[formato][0]}"
+
+
+def mime_exportacion(formato: str) -> str:
+    """Tipo MIME del formato"""
+    return FORMATOS_EXPORTACION[formato][1]
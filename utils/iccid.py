@@ -0,0 +1,150 @@
+"""
+Validación y normalización de ICCIDs (largo, prefijo 89 y dígito verificador Luhn)
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+import pandas as pd
+
+# Prefijo de la industria de telecomunicaciones (ITU-T E.118)
+PREFIJO_ICCID = '89'
+
+# Largos válidos de un ICCID, contando el dígito verificador
+LARGO_MINIMO_ICCID = 19
+LARGO_MAXIMO_ICCID = 20
+
+# Clasificación de cada línea
+VALIDO = 'VALIDO'
+ERROR_CHECKSUM = 'ERROR_CHECKSUM'
+MALFORMADO = 'MALFORMADO'
+DUPLICADO_EN_LOTE = 'DUPLICADO_EN_LOTE'
+
+ETIQUETAS_CLASIFICACION = {
+    VALIDO: 'Válido',
+    ERROR_CHECKSUM: 'Dígito verificador incorrecto',
+    MALFORMADO: 'Mal formado',
+    DUPLICADO_EN_LOTE: 'Repetido en la captura'
+}
+
+# Separadores al pegar: saltos de línea, comas, punto y coma, tabuladores y espacios
+_SEPARADORES = re.compile(r'[,;\s]+')
+
+# Dígitos con prefijo 89 y la F de relleno opcional de algunos proveedores
+_FORMATO_ICCID = rf'{PREFIJO_ICCID}\d{{{LARGO_MINIMO_ICCID - 2},{LARGO_MAXIMO_ICCID - 2}}}F?'
+
+# Valor de cada dígito al duplicarlo en Luhn (2*d, restando 9 si pasa de 9)
+_LUHN_DOBLE = np.array([0, 2, 4, 6, 8, 1, 3, 5, 7, 9], dtype=np.int64)
+
+
+def separar_iccids(texto: str) -> List[str]:
+    """
+    Separar el texto pegado en ICCIDs individuales
+    
+    Args:
+        texto: Texto con ICCIDs separados por saltos de línea, comas,
+            punto y coma, tabuladores o espacios (ej: pegado de Excel)
+    
+    Returns:
+        Lista de valores sin vacíos, en el orden en que aparecen
+    """
+    return [valor for valor in _SEPARADORES.split(texto or '') if valor]
+
+
+def _normalizar(valores: pd.Series) -> pd.Series:
+    """Convertir a texto, sin espacios y en mayúsculas (conserva la F final)"""
+    if pd.api.types.is_integer_dtype(valores):
+        return valores.astype(str)
+    
+    # Los flotantes (columnas numéricas de Excel) ya perdieron dígitos: se
+    # dejan como texto para que se clasifiquen como mal formados
+    return valores.astype(object).where(valores.notna(), '').astype(str).str.strip().str.upper()
+
+
+def _luhn_valido(iccids: pd.Series) -> np.ndarray:
+    """
+    Verificar el dígito verificador de ICCIDs ya validados en formato
+    
+    Se procesa una matriz de dígitos por cada largo posible en lugar de
+    recorrer los ICCIDs uno por uno.
+    """
+    digitos = iccids.str.rstrip('F')
+    largos = digitos.str.len().to_numpy()
+    resultado = np.zeros(len(digitos), dtype=bool)
+    
+    for largo in np.unique(largos):
+        posiciones = np.flatnonzero(largos == largo)
+        texto = ''.join(digitos.iloc[posiciones]).encode('ascii')
+        matriz = (np.frombuffer(texto, dtype=np.uint8).reshape(len(posiciones), largo) - ord('0')).astype(np.int64)
+        
+        # De derecha a izquierda se duplica cada segundo dígito, empezando
+        # por el que está a la izquierda del dígito verificador
+        duplicar = (largo - 1 - np.arange(largo)) % 2 == 1
+        matriz[:, duplicar] = _LUHN_DOBLE[matriz[:, duplicar]]
+        
+        resultado[posiciones] = matriz.sum(axis=1) % 10 == 0
+    
+    return resultado
+
+
+def validar_iccids(valores: Iterable, vistos: Optional[Set[str]] = None) -> pd.DataFrame:
+    """
+    Normalizar y clasificar una lista (o columna) de ICCIDs
+    
+    Cada valor queda como VALIDO, ERROR_CHECKSUM, MALFORMADO (largo,
+    prefijo, caracteres o notación científica de Excel) o DUPLICADO_EN_LOTE
+    (ICCID válido que ya apareció antes en la misma lista). La F final de
+    relleno se acepta y se conserva en el ICCID normalizado.
+    
+    Para validar un archivo por bloques se pasa el mismo conjunto vistos en
+    cada llamada: los ICCIDs de bloques anteriores cuentan como repetidos.
+    
+    Args:
+        valores: Lista de textos o Series (ej: separar_iccids o una columna
+            de un archivo)
+        vistos: ICCIDs válidos ya procesados; se actualiza con los nuevos
+    
+    Returns:
+        DataFrame con entrada (valor original), iccid (normalizado) y
+        clasificacion, en el mismo orden que la entrada
+    """
+    entrada = valores if isinstance(valores, pd.Series) else pd.Series(list(valores), dtype=object)
+    entrada = entrada.reset_index(drop=True)
+    
+    iccids = _normalizar(entrada)
+    
+    clasificacion = np.full(len(iccids), MALFORMADO, dtype=object)
+    
+    formato_valido = iccids.str.fullmatch(_FORMATO_ICCID).to_numpy(dtype=bool)
+    if formato_valido.any():
+        checksum_valido = _luhn_valido(iccids[formato_valido])
+        clasificacion[formato_valido] = np.where(checksum_valido, VALIDO, ERROR_CHECKSUM)
+    
+    validos = clasificacion == VALIDO
+    repetidos = validos & iccids.where(validos).duplicated(keep='first').to_numpy()
+    if vistos:
+        repetidos |= validos & iccids.isin(vistos).to_numpy()
+    clasificacion[repetidos] = DUPLICADO_EN_LOTE
+    
+    if vistos is not None:
+        vistos.update(iccids[clasificacion == VALIDO])
+    
+    return pd.DataFrame({
+        'entrada': entrada,
+        'iccid': iccids,
+        'clasificacion': clasificacion
+    })
+
+
+def resumen_validacion(validacion: pd.DataFrame) -> Dict[str, int]:
+    """
+    Contar los ICCIDs por clasificación
+    
+    Args:
+        validacion: Resultado de validar_iccids
+    
+    Returns:
+        Dict clasificacion -> cantidad (incluye todas las clasificaciones)
+    """
+    conteo = validacion['clasificacion'].value_counts()
+    return {clase: int(conteo.get(clase, 0)) for clase in ETIQUETAS_CLASIFICACION}
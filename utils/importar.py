@@ -0,0 +1,244 @@
+"""
+Lectura de archivos Excel / CSV subidos (por bloques, sin cargar todo en memoria)
+"""
+
+import codecs
+import csv
+import io
+import re
+from itertools import islice
+from typing import BinaryIO, Dict, Iterator, List, Optional
+import pandas as pd
+from openpyxl import load_workbook
+from .iccid import validar_iccids, VALIDO, ERROR_CHECKSUM
+from .indice_distribuidores import normalizar_texto
+
+# Extensiones aceptadas por el selector de archivos
+TIPOS_ARCHIVO_IMPORTACION = ['xlsx', 'csv', 'txt']
+
+# Filas por bloque al recorrer el archivo
+TAMANO_BLOQUE_IMPORTACION = 5000
+
+# Filas que se revisan para detectar encabezado y columnas
+FILAS_DETECCION = 200
+
+# Bytes que se leen para detectar codificación y separador de un CSV
+BYTES_MUESTRA_CSV = 65536
+
+# Encabezados reconocidos (normalizados: mayúsculas, sin acentos)
+ENCABEZADOS_ICCID = ('ICCID', 'ICC', 'SIM', 'SIMS', 'SERIE', 'NUMERO DE SERIE')
+ENCABEZADOS_CODIGO_BT = ('CODIGO BT', 'CODIGO_BT', 'CODIGO', 'BT', 'DISTRIBUIDOR')
+
+# Valores con forma de código BT (ej: BT032, BT649-SAYULA)
+_FORMATO_CODIGO_BT = re.compile(r'BT\d+.*')
+
+
+def separar_iccids_con_codigo(texto: str) -> pd.DataFrame:
+    """
+    Separar texto pegado con dos columnas (ICCID y código BT) por renglón
+    
+    Las columnas pueden venir en cualquier orden, separadas por tabulador
+    (pegado de Excel), coma, punto y coma o espacios. En cada renglón el
+    código BT es el valor con forma BT### y el ICCID el primero de los demás.
+    
+    Args:
+        texto: Texto pegado
+    
+    Returns:
+        DataFrame con iccid (sin validar) y codigo_bt (normalizado, '' si el
+        renglón no trae código)
+    """
+    iccids = []
+    codigos = []
+    
+    for renglon in (texto or '').splitlines():
+        valores = [valor for valor in re.split(r'[,;\s]+', renglon) if valor]
+        if not valores:
+            continue
+        
+        codigo = next((valor for valor in valores if _FORMATO_CODIGO_BT.fullmatch(normalizar_texto(valor))), None)
+        resto = [valor for valor in valores if valor is not codigo]
+        
+        iccids.append(resto[0] if resto else '')
+        codigos.append(normalizar_texto(codigo) if codigo else '')
+    
+    return pd.DataFrame({
+        'iccid': pd.Series(iccids, dtype=object),
+        'codigo_bt': pd.Series(codigos, dtype=object)
+    })
+
+
+def _es_excel(nombre_archivo: str) -> bool:
+    """El archivo es Excel (.xlsx) según su extensión"""
+    return nombre_archivo.lower().endswith('.xlsx')
+
+
+def _filas_xlsx(archivo: BinaryIO) -> Iterator[tuple]:
+    """Filas de la primera hoja en modo solo lectura (no carga el libro completo)"""
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.worksheets[0].iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _filas_csv(archivo: BinaryIO) -> Iterator[tuple]:
+    """Filas de un CSV detectando codificación (utf-8 o latin-1) y separador"""
+    muestra = archivo.read(BYTES_MUESTRA_CSV)
+    archivo.seek(0)
+    
+    try:
+        # Decodificador incremental: la muestra puede cortar un carácter a la mitad
+        texto_muestra = codecs.getincrementaldecoder('utf-8-sig')().decode(muestra, final=False)
+        codificacion = 'utf-8-sig'
+    except UnicodeDecodeError:
+        texto_muestra = muestra.decode('latin-1')
+        codificacion = 'latin-1'
+    
+    try:
+        separador = csv.Sniffer().sniff(texto_muestra, delimiters=',;\t|').delimiter
+    except csv.Error:
+        # Una sola columna: no hay separador que detectar
+        separador = ','
+    
+    texto = io.TextIOWrapper(archivo, encoding=codificacion, newline='')
+    try:
+        for fila in csv.reader(texto, delimiter=separador):
+            yield tuple(fila)
+    finally:
+        texto.detach()
+
+
+def _filas_archivo(archivo: BinaryIO, nombre_archivo: str) -> Iterator[tuple]:
+    """Filas no vacías del archivo, desde el inicio"""
+    archivo.seek(0)
+    filas = _filas_xlsx(archivo) if _es_excel(nombre_archivo) else _filas_csv(archivo)
+    
+    for fila in filas:
+        if any(valor is not None and str(valor).strip() for valor in fila):
+            yield fila
+
+
+def _columna(filas: List[tuple], indice: int) -> List:
+    """Valores de una columna (None si la fila es más corta)"""
+    return [fila[indice] if indice < len(fila) else None for fila in filas]
+
+
+def _parece_iccid(valores: List) -> int:
+    """Cantidad de valores con formato de ICCID (con o sin dígito verificador correcto)"""
+    clasificacion = validar_iccids(pd.Series(valores, dtype=object))['clasificacion']
+    return int(clasificacion.isin([VALIDO, ERROR_CHECKSUM]).sum())
+
+
+def _parece_codigo_bt(valores: List) -> int:
+    """Cantidad de valores con formato de código BT"""
+    return sum(1 for valor in valores if valor is not None and _FORMATO_CODIGO_BT.fullmatch(normalizar_texto(str(valor))))
+
+
+def detectar_columnas(archivo: BinaryIO, nombre_archivo: str) -> Dict:
+    """
+    Detectar encabezado, columna de ICCIDs y columna de código BT
+    
+    Se revisan las primeras FILAS_DETECCION filas: la columna de ICCIDs es
+    la que tiene más valores con formato de ICCID (o la que se llama ICCID),
+    y la de código BT la que tiene valores tipo BT### (o se llama CODIGO BT).
+    Hay encabezado si la primera fila no contiene ningún ICCID.
+    
+    Args:
+        archivo: Archivo binario (ej: el que regresa st.file_uploader)
+        nombre_archivo: Nombre del archivo (la extensión define el formato)
+    
+    Returns:
+        Dict con columnas (nombres para mostrar), columna_iccid,
+        columna_codigo_bt (None si no hay) y encabezado (bool)
+    """
+    muestra = list(islice(_filas_archivo(archivo, nombre_archivo), FILAS_DETECCION + 1))
+    
+    if not muestra:
+        return {'columnas': [], 'columna_iccid': None, 'columna_codigo_bt': None, 'encabezado': False}
+    
+    ancho = max(len(fila) for fila in muestra)
+    encabezado = _parece_iccid(list(muestra[0])) == 0 and len(muestra) > 1
+    
+    if encabezado:
+        nombres = [normalizar_texto(str(valor)) if valor is not None else '' for valor in muestra[0]]
+        nombres += [''] * (ancho - len(nombres))
+        datos = muestra[1:]
+    else:
+        nombres = [''] * ancho
+        datos = muestra[:FILAS_DETECCION]
+    
+    columnas = [nombre or f"Columna {indice + 1}" for indice, nombre in enumerate(nombres)]
+    
+    # Columna de ICCIDs: por contenido y, si no hay ninguno, por nombre
+    puntajes_iccid = [_parece_iccid(_columna(datos, indice)) for indice in range(ancho)]
+    columna_iccid = max(range(ancho), key=lambda indice: puntajes_iccid[indice])
+    if puntajes_iccid[columna_iccid] == 0:
+        columna_iccid = next((indice for indice, nombre in enumerate(nombres) if nombre in ENCABEZADOS_ICCID), 0)
+    
+    # Columna de código BT: por nombre o por contenido (al menos la mitad de las filas)
+    columna_codigo_bt = next(
+        (indice for indice, nombre in enumerate(nombres) if nombre in ENCABEZADOS_CODIGO_BT and indice != columna_iccid),
+        None
+    )
+    if columna_codigo_bt is None:
+        candidatas = [
+            (indice, _parece_codigo_bt(_columna(datos, indice)))
+            for indice in range(ancho) if indice != columna_iccid
+        ]
+        candidatas = [(indice, puntaje) for indice, puntaje in candidatas if puntaje * 2 >= len(datos) and puntaje > 0]
+        if candidatas:
+            columna_codigo_bt = max(candidatas, key=lambda c: c[1])[0]
+    
+    return {
+        'columnas': columnas,
+        'columna_iccid': columna_iccid,
+        'columna_codigo_bt': columna_codigo_bt,
+        'encabezado': encabezado
+    }
+
+
+def iter_iccids_archivo(
+    archivo: BinaryIO,
+    nombre_archivo: str,
+    columna_iccid: int,
+    columna_codigo_bt: Optional[int] = None,
+    encabezado: bool = False,
+    tamano_bloque: int = TAMANO_BLOQUE_IMPORTACION
+) -> Iterator[pd.DataFrame]:
+    """
+    Recorrer los ICCIDs de un archivo por bloques
+    
+    Excel se lee con openpyxl en modo solo lectura y CSV con csv.reader,
+    así solo hay un bloque de filas en memoria a la vez.
+    
+    Args:
+        archivo: Archivo binario (ej: el que regresa st.file_uploader)
+        nombre_archivo: Nombre del archivo (la extensión define el formato)
+        columna_iccid: Índice de la columna de ICCIDs (ver detectar_columnas)
+        columna_codigo_bt: Índice de la columna de código BT (opcional)
+        encabezado: La primera fila es encabezado y se omite
+        tamano_bloque: Filas por bloque
+    
+    Yields:
+        DataFrames con iccid (valor sin validar) y, si se indicó la columna,
+        codigo_bt (normalizado)
+    """
+    filas = _filas_archivo(archivo, nombre_archivo)
+    
+    if encabezado:
+        next(filas, None)
+    
+    while True:
+        bloque = list(islice(filas, tamano_bloque))
+        if not bloque:
+            break
+        
+        datos = {'iccid': pd.Series(_columna(bloque, columna_iccid), dtype=object)}
+        if columna_codigo_bt is not None:
+            datos['codigo_bt'] = pd.Series(
+                [normalizar_texto(str(valor)) if valor is not None else '' for valor in _columna(bloque, columna_codigo_bt)],
+                dtype=object
+            )
+        
+        yield pd.DataFrame(datos)
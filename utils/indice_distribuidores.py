@@ -0,0 +1,174 @@
+"""
+Índice en memoria para buscar distribuidores sin consultar la base de datos
+"""
+
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+# Campos en los que se busca
+CAMPOS_BUSQUEDA = ('codigo_bt', 'nombre', 'plaza')
+
+# Similitud mínima (0-1) de cada palabra buscada en la búsqueda aproximada
+SIMILITUD_MINIMA = 0.75
+
+# Largo mínimo de la búsqueda para intentar coincidencias aproximadas
+LARGO_MINIMO_APROXIMADO = 3
+
+# Búsquedas distintas que se guardan en el cache del índice
+MAX_BUSQUEDAS_CACHE = 256
+
+# Rango de cada tipo de coincidencia (menor = mejor)
+RANGO_CODIGO_EXACTO = 0
+RANGO_CODIGO_PREFIJO = 1
+RANGO_PALABRA_PREFIJO = 2
+RANGO_SUBCADENA = 3
+RANGO_APROXIMADO = 4
+
+
+def normalizar_texto(texto: Optional[str]) -> str:
+    """
+    Normalizar texto para búsqueda: mayúsculas, sin acentos y espacios simples
+    
+    Args:
+        texto: Texto a normalizar
+    
+    Returns:
+        Texto normalizado ('' si es None)
+    """
+    if not texto:
+        return ''
+    
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.upper().split())
+
+
+class IndiceDistribuidores:
+    """
+    Índice de distribuidores con búsqueda por prefijo, subcadena y aproximada
+    
+    Se construye una sola vez con la lista completa y responde las búsquedas
+    en memoria, ordenadas por relevancia y después por código BT.
+    """
+    
+    def __init__(self, distribuidores: List[Dict]):
+        self.distribuidores = sorted(distribuidores, key=lambda d: d.get('codigo_bt') or '')
+        self._entradas = []
+        
+        for distribuidor in self.distribuidores:
+            campos = {campo: normalizar_texto(distribuidor.get(campo)) for campo in CAMPOS_BUSQUEDA}
+            texto = ' '.join(campos.values())
+            palabras = set(texto.replace('-', ' ').split())
+            self._entradas.append((distribuidor, campos['codigo_bt'], texto, palabras))
+        
+        # Palabras sin dígitos (nombres y plazas) para la búsqueda aproximada
+        self._vocabulario = {
+            palabra
+            for _, _, _, palabras in self._entradas
+            for palabra in palabras
+            if not any(c.isdigit() for c in palabra)
+        }
+        
+        self._resultados: Dict[tuple, List[Dict]] = {}
+    
+    def __len__(self) -> int:
+        return len(self.distribuidores)
+    
+    def _rango(self, busqueda: str, palabras_busqueda: List[str], codigo: str, texto: str, palabras: set) -> Optional[int]:
+        """Rango de coincidencia exacta (código, prefijo o subcadena), o None"""
+        if codigo == busqueda:
+            return RANGO_CODIGO_EXACTO
+        
+        if codigo.startswith(busqueda):
+            return RANGO_CODIGO_PREFIJO
+        
+        if all(any(palabra.startswith(p) for palabra in palabras) for p in palabras_busqueda):
+            return RANGO_PALABRA_PREFIJO
+        
+        if busqueda in texto:
+            return RANGO_SUBCADENA
+        
+        return None
+    
+    def _similares(self, palabra_busqueda: str) -> set:
+        """Palabras del vocabulario parecidas a la buscada (errores de dedo)"""
+        similares = set()
+        
+        for palabra in self._vocabulario:
+            # Cota superior de ratio() solo con los largos, sin crear el comparador
+            largo_minimo = min(len(palabra), len(palabra_busqueda))
+            if 2 * largo_minimo / (len(palabra) + len(palabra_busqueda)) < SIMILITUD_MINIMA:
+                continue
+            
+            comparador = SequenceMatcher(None, palabra_busqueda, palabra)
+            if comparador.quick_ratio() >= SIMILITUD_MINIMA and comparador.ratio() >= SIMILITUD_MINIMA:
+                similares.add(palabra)
+        
+        return similares
+    
+    def buscar(self, query: str = "", estatus: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """
+        Buscar distribuidores por código, nombre o plaza
+        
+        Primero se buscan coincidencias exactas (código, prefijo de palabra o
+        subcadena); si no hay ninguna se buscan coincidencias aproximadas
+        (errores de dedo en nombre o plaza). Las búsquedas repetidas se responden
+        desde un cache interno.
+        
+        Args:
+            query: Texto a buscar (sin distinguir mayúsculas ni acentos)
+            estatus: Filtrar por estatus (ACTIVO, BAJA, SUSPENDIDO)
+            limit: Límite de resultados
+        
+        Returns:
+            Lista de distribuidores (copias), de mejor a peor coincidencia
+        """
+        busqueda = normalizar_texto(query)
+        estatus = estatus.upper().strip() if estatus else None
+        
+        llave = (busqueda, estatus, limit)
+        if llave not in self._resultados:
+            if len(self._resultados) >= MAX_BUSQUEDAS_CACHE:
+                self._resultados.clear()
+            self._resultados[llave] = self._buscar(busqueda, estatus, limit)
+        
+        return [dict(distribuidor) for distribuidor in self._resultados[llave]]
+    
+    def _buscar(self, busqueda: str, estatus: Optional[str], limit: int) -> List[Dict]:
+        """Búsqueda sin cache (ver buscar)"""
+        palabras_busqueda = busqueda.replace('-', ' ').split()
+        
+        encontrados = []
+        restantes = []
+        
+        for distribuidor, codigo, texto, palabras in self._entradas:
+            if estatus and distribuidor.get('estatus') != estatus:
+                continue
+            
+            if not busqueda:
+                encontrados.append((0, distribuidor))
+                continue
+            
+            rango = self._rango(busqueda, palabras_busqueda, codigo, texto, palabras)
+            if rango is not None:
+                encontrados.append((rango, distribuidor))
+            else:
+                restantes.append((distribuidor, palabras))
+        
+        # sort es estable: dentro de cada rango se conserva el orden por código
+        encontrados.sort(key=lambda e: e[0])
+        
+        # Búsqueda aproximada solo si no hubo coincidencias exactas. Las palabras
+        # con dígitos (códigos) no se comparan aproximadamente.
+        aproximada = busqueda and not encontrados and len(busqueda) >= LARGO_MINIMO_APROXIMADO \
+            and not any(c.isdigit() for c in busqueda)
+        
+        if aproximada:
+            similares = [self._similares(p) for p in palabras_busqueda]
+            
+            for distribuidor, palabras in restantes:
+                if all(palabras & opciones for opciones in similares):
+                    encontrados.append((RANGO_APROXIMADO, distribuidor))
+        
+        return [distribuidor for _, distribuidor in encontrados[:limit]]
@@ -0,0 +1,135 @@
+"""
+Invalidación de caches por etiquetas: las funciones de escritura publican
+qué tablas (y claves) modificaron y los lectores cacheados se suscriben
+"""
+
+import functools
+import inspect
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import streamlit as st
+
+# Versión de cada etiqueta; cambia cada vez que se publica una escritura
+_versiones: Dict[str, int] = defaultdict(int)
+
+# Funciones a llamar cuando se publica una tabla
+_suscriptores: Dict[str, List[Callable[[Optional[List[str]]], None]]] = defaultdict(list)
+
+_lock_versiones = threading.Lock()
+
+# Entradas máximas por función cacheada: las de versiones viejas de las
+# etiquetas ya no se leen y salen primero
+MAX_ENTRADAS_CACHE = 64
+
+
+def publicar(tabla: str, claves: Optional[Iterable[str]] = None):
+    """
+    Avisar que se escribió en una tabla
+    
+    Invalida a los lectores de la tabla completa (etiqueta 'tabla') y a los
+    de las claves indicadas (etiqueta 'tabla:clave'). Si no se conocen las
+    claves afectadas (claves=None) se invalidan todas las de la tabla.
+    
+    Args:
+        tabla: Tabla modificada (ej: 'envios', 'distribuidores')
+        claves: Claves modificadas (ej: códigos BT), o None si no se conocen
+    """
+    claves = sorted({str(clave).upper().strip() for clave in claves if clave}) if claves is not None else None
+    
+    with _lock_versiones:
+        _versiones[tabla] += 1
+        
+        if claves is None:
+            _versiones[f"{tabla}:*"] += 1
+        else:
+            for clave in claves:
+                _versiones[f"{tabla}:{clave}"] += 1
+        
+        suscriptores = list(_suscriptores[tabla])
+    
+    for callback in suscriptores:
+        callback(claves)
+
+
+def suscribir(tabla: str, callback: Callable[[Optional[List[str]]], None]):
+    """
+    Registrar una función que se llama cada vez que se publica la tabla
+    
+    Args:
+        tabla: Tabla a escuchar
+        callback: Función que recibe las claves publicadas (o None)
+    """
+    with _lock_versiones:
+        if callback not in _suscriptores[tabla]:
+            _suscriptores[tabla].append(callback)
+
+
+def version_etiquetas(*etiquetas: str) -> Tuple:
+    """
+    Obtener la versión actual de una o más etiquetas
+    
+    Args:
+        *etiquetas: 'tabla' o 'tabla:clave'
+    
+    Returns:
+        Tupla que cambia cuando alguna de las etiquetas se invalida
+    """
+    version = []
+    
+    with _lock_versiones:
+        for etiqueta in etiquetas:
+            if ':' in etiqueta:
+                tabla, clave = etiqueta.split(':', 1)
+                etiqueta = f"{tabla}:{clave.upper().strip()}"
+                version.append((_versiones[f"{tabla}:*"], _versiones[etiqueta]))
+            else:
+                version.append(_versiones[etiqueta])
+    
+    return tuple(version)
+
+
+def cache_por_etiquetas(
+    *etiquetas: str,
+    ttl: Optional[float] = None,
+    max_entries: Optional[int] = MAX_ENTRADAS_CACHE,
+    show_spinner: bool = True
+):
+    """
+    Decorador: st.cache_data que además se invalida al publicar sus etiquetas
+    
+    Las etiquetas pueden usar argumentos de la función, por ejemplo
+    'envios:{codigo_bt}'. Como la versión de las etiquetas es parte de la
+    llave del cache, el TTL puede ser largo sin mostrar datos viejos
+    después de una escritura.
+    
+    Args:
+        *etiquetas: Etiquetas a las que se suscribe el lector
+        ttl: Vigencia máxima en segundos (None = sin límite)
+        max_entries: Entradas máximas en el cache de la función
+        show_spinner: Mostrar el spinner de Streamlit al calcular
+    """
+    def decorador(funcion: Callable) -> Callable:
+        firma = inspect.signature(funcion)
+        
+        def _cacheada(version, *args, **kwargs):
+            return funcion(*args, **kwargs)
+        
+        # Streamlit identifica el cache por módulo y nombre de la función:
+        # con el nombre de la decorada cada una tiene su propio cache (clear,
+        # ttl y max_entries no se comparten)
+        _cacheada.__module__ = funcion.__module__
+        _cacheada.__qualname__ = f"{funcion.__qualname__}.<cache_por_etiquetas>"
+        _cacheada = st.cache_data(ttl=ttl, max_entries=max_entries, show_spinner=show_spinner)(_cacheada)
+        
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            argumentos = firma.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            etiquetas_resueltas = [etiqueta.format(**argumentos.arguments) for etiqueta in etiquetas]
+            return _cacheada(version_etiquetas(*etiquetas_resueltas), *args, **kwargs)
+        
+        envoltura.clear = _cacheada.clear
+        return envoltura
+    
+    return decorador
@@ -0,0 +1,168 @@
+"""
+Panel lateral de exportaciones en segundo plano (se muestra en todas las páginas)
+"""
+
+import uuid
+import pandas as pd
+import streamlit as st
+from .exportar import exportar_dataframe, MAX_FILAS_DESCARGA_DIRECTA
+from .trabajos_exportacion import (
+    listar_trabajos,
+    abrir_artefacto,
+    eliminar_trabajo,
+    get_mime_trabajo,
+    PENDIENTE,
+    EN_PROCESO,
+    COMPLETADO,
+    ERROR
+)
+
+# Ícono por estado de trabajo
+ICONOS_ESTADO = {
+    PENDIENTE: '🕓',
+    EN_PROCESO: '⏳',
+    COMPLETADO: '✅',
+    ERROR: '❌'
+}
+
+
+def get_sesion_exportaciones() -> str:
+    """
+    Identificador de la sesión actual para sus trabajos de exportación
+    
+    Returns:
+        ID guardado en session_state (se crea la primera vez)
+    """
+    if 'sesion_exportaciones' not in st.session_state:
+        st.session_state['sesion_exportaciones'] = uuid.uuid4().hex
+    return st.session_state['sesion_exportaciones']
+
+
+def _preparar_descarga(id_trabajo: str):
+    """Marcar el trabajo cuyo archivo se entrega en el siguiente render"""
+    st.session_state['panel_exportaciones_preparado'] = id_trabajo
+
+
+def _cancelar_descarga():
+    """Dejar de preparar la descarga (el archivo no se vuelve a leer)"""
+    st.session_state.pop('panel_exportaciones_preparado', None)
+
+
+def boton_descarga_directa(df: pd.DataFrame, etiqueta: str, nombre_archivo: str, clave: str):
+    """
+    Descarga CSV de un DataFrame desde la página. El archivo se genera solo
+    cuando el usuario lo pide y solo hasta MAX_FILAS_DESCARGA_DIRECTA filas
+    (los reportes más grandes van por la exportación en segundo plano).
+    
+    Args:
+        df: DataFrame a exportar (los nombres de columna son los encabezados)
+        etiqueta: Texto del botón
+        nombre_archivo: Nombre del archivo descargado
+        clave: Identificador único del botón en la página
+    """
+    if len(df) > MAX_FILAS_DESCARGA_DIRECTA:
+        st.caption(f"Más de {MAX_FILAS_DESCARGA_DIRECTA:,} registros: usa la exportación en segundo plano")
+        return
+    
+    if st.session_state.get('descarga_directa') != clave:
+        st.button(etiqueta, key=f"preparar_{clave}", on_click=_preparar_descarga_directa, args=(clave,))
+        return
+    
+    with exportar_dataframe(df) as archivo:
+        st.download_button(
+            label=f"📥 Guardar {nombre_archivo}",
+            data=archivo,
+            file_name=nombre_archivo,
+            mime="text/csv",
+            key=f"descargar_{clave}",
+            on_click=_cancelar_descarga_directa
+        )
+
+
+def _preparar_descarga_directa(clave: str):
+    """Marcar la descarga directa que se genera en el siguiente render"""
+    st.session_state['descarga_directa'] = clave
+
+
+def _cancelar_descarga_directa():
+    """Dejar de generar la descarga directa"""
+    st.session_state.pop('descarga_directa', None)
+
+
+def mostrar_panel_exportaciones(limite: int = 10):
+    """
+    Mostrar en el sidebar el avance de las exportaciones de esta sesión y la
+    descarga de los archivos terminados
+    
+    Args:
+        limite: Cantidad máxima de trabajos a listar
+    """
+    sesion = get_sesion_exportaciones()
+    trabajos = listar_trabajos(sesion, limite)
+    
+    if not trabajos:
+        return
+    
+    with st.sidebar:
+        st.markdown("---")
+        st.markdown("### 📦 Exportaciones")
+        
+        for trabajo in trabajos:
+            icono = ICONOS_ESTADO.get(trabajo['estado'], '•')
+            st.markdown(f"{icono} **{trabajo['descripcion']}**")
+            
+            if trabajo['estado'] in (PENDIENTE, EN_PROCESO):
+                if trabajo['total_estimado']:
+                    avance = min(trabajo['filas'] / trabajo['total_estimado'], 1.0)
+                    st.progress(avance, text=f"{trabajo['filas']:,} de {trabajo['total_estimado']:,} registros")
+                else:
+                    st.caption(f"{trabajo['filas']:,} registros procesados")
+            elif trabajo['estado'] == COMPLETADO:
+                st.caption(f"{trabajo['filas']:,} registros · disponible hasta {trabajo['expira_at'][:16].replace('T', ' ')}")
+            else:
+                st.caption(f"Error: {trabajo['error']}")
+        
+        if any(t['estado'] in (PENDIENTE, EN_PROCESO) for t in trabajos):
+            if st.button("🔄 Actualizar avance", key="panel_exportaciones_actualizar", use_container_width=True):
+                st.rerun()
+        
+        # El archivo solo se abre cuando se pide la descarga: st.download_button
+        # lo lee completo en memoria en cada render
+        terminados = [t for t in trabajos if t['estado'] == COMPLETADO]
+        
+        if terminados:
+            trabajo = st.selectbox(
+                "Archivo",
+                terminados,
+                format_func=lambda t: t['nombre_archivo'],
+                key="panel_exportaciones_archivo"
+            )
+            
+            if st.session_state.get('panel_exportaciones_preparado') != trabajo['id']:
+                st.button(
+                    "📥 Preparar descarga",
+                    key="panel_exportaciones_preparar",
+                    on_click=_preparar_descarga,
+                    args=(trabajo['id'],),
+                    use_container_width=True
+                )
+            else:
+                archivo = abrir_artefacto(trabajo['id'], sesion)
+                if archivo:
+                    with archivo:
+                        st.download_button(
+                            label="📥 Descargar",
+                            data=archivo,
+                            file_name=trabajo['nombre_archivo'],
+                            mime=get_mime_trabajo(trabajo),
+                            key="panel_exportaciones_descargar",
+                            on_click=_cancelar_descarga,
+                            use_container_width=True
+                        )
+                else:
+                    _cancelar_descarga()
+            
+            if st.button("🗑️ Quitar", key="panel_exportaciones_quitar", use_container_width=True):
+                _cancelar_descarga()
+                eliminar_trabajo(trabajo['id'], sesion)
+                st.rerun()
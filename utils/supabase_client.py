@@ -1,23 +1,379 @@
 """
-Cliente de Supabase con cache
+Cliente de Supabase con cache, pool de conexiones, reintentos y métricas
 """
 
 import streamlit as st
-from supabase import create_client, Client
+from supabase import Client, ClientOptions, AClient, AsyncClientOptions
+from postgrest import SyncPostgrestClient, AsyncPostgrestClient
+from postgrest.utils import SyncClient, AsyncClient
+import asyncio
+import httpx
 import os
+import random
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
 from dotenv import load_dotenv
 
 # Cargar variables de entorno (solo para desarrollo local)
 load_dotenv()
 
-@st.cache_resource
-def get_supabase_client() -> Client:
+
+def _config_numero(nombre: str, default, tipo=float):
+    """Leer un número de las variables de entorno (default si no está o no es válido)"""
+    try:
+        return tipo(os.getenv(nombre) or default)
+    except ValueError:
+        return default
+
+
+# Pool de conexiones HTTP (uno por proceso, compartido por todas las sesiones)
+MAX_CONEXIONES = _config_numero("SUPABASE_MAX_CONEXIONES", 20, int)
+MAX_CONEXIONES_KEEPALIVE = _config_numero("SUPABASE_MAX_KEEPALIVE", 10, int)
+SEGUNDOS_KEEPALIVE = _config_numero("SUPABASE_SEGUNDOS_KEEPALIVE", 60.0)
+USAR_HTTP2 = (os.getenv("SUPABASE_HTTP2") or "1").lower() not in ("0", "false", "no")
+
+# Timeouts por solicitud, en segundos
+TIMEOUT_CONEXION = _config_numero("SUPABASE_TIMEOUT_CONEXION", 10.0)
+TIMEOUT_LECTURA = _config_numero("SUPABASE_TIMEOUT_LECTURA", 120.0)
+TIMEOUT_POOL = _config_numero("SUPABASE_TIMEOUT_POOL", 30.0)
+
+# Reintentos con espera exponencial (con jitter) ante fallas transitorias
+MAX_REINTENTOS = _config_numero("SUPABASE_MAX_REINTENTOS", 3, int)
+ESPERA_BASE_REINTENTO = 0.25
+ESPERA_MAXIMA_REINTENTO = 8.0
+
+# 500 no se reintenta: PostgREST lo usa también para errores de SQL
+ESTATUS_REINTENTABLES = frozenset({429, 502, 503, 504})
+
+# Métodos de solo lectura. Las escrituras (incluso upserts y DELETE) no se
+# repiten: si el primer intento se aplicó pero se perdió la respuesta, el
+# reintento regresa otras filas y quien llama las interpreta mal
+METODOS_IDEMPOTENTES = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Funciones RPC de solo lectura (STABLE en sql/); se llaman por POST pero
+# se pueden repetir
+RPC_SOLO_LECTURA = frozenset({
+    "conteo_por_estatus",
+    "top_distribuidores_envios",
+    "conteo_diario_envios",
+    "conteo_envios_por_estatus",
+    "analisis_periodo_envios",
+    "verificar_envios_diario",
+})
+
+# Errores en los que la solicitud no llegó al servidor (se reintentan siempre)
+_ERRORES_SIN_ENVIO = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Errores de red a mitad de la solicitud (solo se reintentan si es idempotente)
+_ERRORES_TRANSITORIOS = (httpx.ReadTimeout, httpx.WriteTimeout, httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError)
+
+_CAMPOS_METRICAS = (
+    "solicitudes", "respuestas", "reintentos", "errores", "bytes_enviados",
+    "bytes_recibidos", "latencia_total_ms", "latencia_max_ms"
+)
+
+_metricas: Dict[str, float] = dict.fromkeys(_CAMPOS_METRICAS, 0)
+_metricas_por_estatus: Dict[int, int] = {}
+_lock_metricas = threading.Lock()
+
+_transporte: Optional[httpx.BaseTransport] = None
+_lock_transporte = threading.Lock()
+
+_cliente_async = None
+_lock_cliente_async: Optional[asyncio.Lock] = None
+
+
+def _registrar(**valores):
+    """Sumar valores a las métricas (latencia_max_ms se guarda como máximo)"""
+    with _lock_metricas:
+        for campo, valor in valores.items():
+            if campo == "latencia_max_ms":
+                _metricas[campo] = max(_metricas[campo], valor)
+            elif campo == "estatus":
+                _metricas_por_estatus[valor] = _metricas_por_estatus.get(valor, 0) + 1
+            else:
+                _metricas[campo] += valor
+
+
+def get_metricas_supabase() -> Dict:
     """
-    Obtener cliente de Supabase con cache
-    Prioriza variables de entorno (Railway), luego secrets de Streamlit
+    Obtener los contadores de las solicitudes HTTP a Supabase
     
     Returns:
-        Client: Cliente de Supabase
+        Dict con solicitudes (incluye reintentos), respuestas (entregadas
+        al cliente), reintentos, errores (de red, después de reintentar),
+        bytes_enviados, bytes_recibidos, latencia_total_ms, latencia_max_ms,
+        latencia_promedio_ms (por respuesta, incluye reintentos y descarga
+        del cuerpo) y por_estatus (código HTTP -> cantidad)
+    """
+    with _lock_metricas:
+        metricas = dict(_metricas)
+        metricas["por_estatus"] = dict(sorted(_metricas_por_estatus.items()))
+    
+    metricas["latencia_promedio_ms"] = (
+        metricas["latencia_total_ms"] / metricas["respuestas"] if metricas["respuestas"] else 0.0
+    )
+    return metricas
+
+
+def reiniciar_metricas_supabase():
+    """Poner en cero los contadores (ej: antes de medir una captura)"""
+    with _lock_metricas:
+        _metricas.update(dict.fromkeys(_CAMPOS_METRICAS, 0))
+        _metricas_por_estatus.clear()
+
+
+def _es_idempotente(request: httpx.Request) -> bool:
+    """La solicitud es de solo lectura y se puede repetir con el mismo resultado"""
+    if request.method in METODOS_IDEMPOTENTES:
+        return True
+    
+    if request.method == "POST":
+        partes = request.url.path.rstrip("/").split("/")
+        return len(partes) >= 2 and partes[-2] == "rpc" and partes[-1] in RPC_SOLO_LECTURA
+    
+    return False
+
+
+def _espera_reintento(intento: int, response: Optional[httpx.Response] = None) -> float:
+    """Segundos a esperar antes del reintento (Retry-After o exponencial con jitter)"""
+    if response is not None:
+        try:
+            return min(float(response.headers["retry-after"]), ESPERA_MAXIMA_REINTENTO)
+        except (KeyError, ValueError):
+            pass
+    
+    # Jitter completo: evita que varios procesos reintenten al mismo tiempo
+    return random.uniform(0, min(ESPERA_MAXIMA_REINTENTO, ESPERA_BASE_REINTENTO * 2 ** intento))
+
+
+def _reintentar_error(error: Exception, idempotente: bool, intento: int, max_reintentos: int) -> bool:
+    """Una falla de red se reintenta si la solicitud no se envió o es idempotente"""
+    reintentable = isinstance(error, _ERRORES_SIN_ENVIO) or idempotente
+    return reintentable and intento < max_reintentos
+
+
+def _reintentar_respuesta(response: httpx.Response, idempotente: bool, intento: int, max_reintentos: int) -> bool:
+    """Una respuesta de falla transitoria se reintenta solo si es idempotente"""
+    return idempotente and response.status_code in ESTATUS_REINTENTABLES and intento < max_reintentos
+
+
+def _limites_pool() -> httpx.Limits:
+    """Límites del pool de conexiones (configurables con SUPABASE_*)"""
+    return httpx.Limits(
+        max_connections=MAX_CONEXIONES,
+        max_keepalive_connections=MAX_CONEXIONES_KEEPALIVE,
+        keepalive_expiry=SEGUNDOS_KEEPALIVE
+    )
+
+
+class _RespuestaMedida(httpx.SyncByteStream):
+    """Cuerpo de la respuesta que cuenta bytes y registra la latencia al cerrarse"""
+    
+    def __init__(self, stream: httpx.SyncByteStream, inicio: float):
+        self._stream = stream
+        self._inicio = inicio
+        self._cerrado = False
+    
+    def __iter__(self) -> Iterator[bytes]:
+        for parte in self._stream:
+            _registrar(bytes_recibidos=len(parte))
+            yield parte
+    
+    def close(self):
+        if not self._cerrado:
+            self._cerrado = True
+            latencia = (time.perf_counter() - self._inicio) * 1000
+            _registrar(respuestas=1, latencia_total_ms=latencia, latencia_max_ms=latencia)
+        self._stream.close()
+
+
+class TransporteSupabase(httpx.BaseTransport):
+    """
+    Transporte HTTP con pool de conexiones (HTTP/2 y keep-alive), reintentos
+    de fallas transitorias y métricas por solicitud
+    
+    Solo se reintentan solicitudes de solo lectura (GET, HEAD y RPC de
+    RPC_SOLO_LECTURA); las escrituras se reintentan únicamente si la
+    conexión falló antes de enviarlas.
+    """
+    
+    def __init__(self, max_reintentos: int = MAX_REINTENTOS, **kwargs):
+        self._transporte = httpx.HTTPTransport(**kwargs)
+        self.max_reintentos = max_reintentos
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        idempotente = _es_idempotente(request)
+        # El cuerpo ya está en memoria (postgrest-py envía JSON)
+        tamano_cuerpo = len(request.read())
+        
+        inicio = time.perf_counter()
+        intento = 0
+        while True:
+            _registrar(solicitudes=1, bytes_enviados=tamano_cuerpo)
+            
+            try:
+                response = self._transporte.handle_request(request)
+            except _ERRORES_SIN_ENVIO + _ERRORES_TRANSITORIOS as e:
+                if not _reintentar_error(e, idempotente, intento, self.max_reintentos):
+                    _registrar(errores=1)
+                    raise
+                espera = _espera_reintento(intento)
+            else:
+                _registrar(estatus=response.status_code)
+                
+                if not _reintentar_respuesta(response, idempotente, intento, self.max_reintentos):
+                    return httpx.Response(
+                        status_code=response.status_code,
+                        headers=response.headers,
+                        stream=_RespuestaMedida(response.stream, inicio),
+                        extensions=response.extensions
+                    )
+                
+                espera = _espera_reintento(intento, response)
+                response.close()
+            
+            intento += 1
+            _registrar(reintentos=1)
+            time.sleep(espera)
+    
+    def close(self):
+        self._transporte.close()
+
+
+def get_transporte_supabase() -> TransporteSupabase:
+    """
+    Obtener el transporte HTTP compartido (se crea la primera vez)
+    
+    Returns:
+        TransporteSupabase con el pool de conexiones del proceso
+    """
+    global _transporte
+    
+    with _lock_transporte:
+        if _transporte is None:
+            _transporte = TransporteSupabase(http2=USAR_HTTP2, limits=_limites_pool())
+        return _transporte
+
+
+class _RespuestaMedidaAsync(httpx.AsyncByteStream):
+    """Versión async de _RespuestaMedida"""
+    
+    def __init__(self, stream: httpx.AsyncByteStream, inicio: float):
+        self._stream = stream
+        self._inicio = inicio
+        self._cerrado = False
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for parte in self._stream:
+            _registrar(bytes_recibidos=len(parte))
+            yield parte
+    
+    async def aclose(self):
+        if not self._cerrado:
+            self._cerrado = True
+            latencia = (time.perf_counter() - self._inicio) * 1000
+            _registrar(respuestas=1, latencia_total_ms=latencia, latencia_max_ms=latencia)
+        await self._stream.aclose()
+
+
+class TransporteSupabaseAsync(httpx.AsyncBaseTransport):
+    """
+    Versión async de TransporteSupabase (mismas reglas de reintento y las
+    mismas métricas); la usa la capa de datos async
+    """
+    
+    def __init__(self, max_reintentos: int = MAX_REINTENTOS, **kwargs):
+        self._transporte = httpx.AsyncHTTPTransport(**kwargs)
+        self.max_reintentos = max_reintentos
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        idempotente = _es_idempotente(request)
+        tamano_cuerpo = len(await request.aread())
+        
+        inicio = time.perf_counter()
+        intento = 0
+        while True:
+            _registrar(solicitudes=1, bytes_enviados=tamano_cuerpo)
+            
+            try:
+                response = await self._transporte.handle_async_request(request)
+            except _ERRORES_SIN_ENVIO + _ERRORES_TRANSITORIOS as e:
+                if not _reintentar_error(e, idempotente, intento, self.max_reintentos):
+                    _registrar(errores=1)
+                    raise
+                espera = _espera_reintento(intento)
+            else:
+                _registrar(estatus=response.status_code)
+                
+                if not _reintentar_respuesta(response, idempotente, intento, self.max_reintentos):
+                    return httpx.Response(
+                        status_code=response.status_code,
+                        headers=response.headers,
+                        stream=_RespuestaMedidaAsync(response.stream, inicio),
+                        extensions=response.extensions
+                    )
+                
+                espera = _espera_reintento(intento, response)
+                await response.aclose()
+            
+            intento += 1
+            _registrar(reintentos=1)
+            await asyncio.sleep(espera)
+    
+    async def aclose(self):
+        await self._transporte.aclose()
+
+
+# Las clases siguientes sobrescriben métodos internos de supabase-py 2.10 y
+# postgrest-py 0.18 (versiones fijas en requirements.txt)
+class _PostgrestConPool(SyncPostgrestClient):
+    """Cliente de PostgREST que usa el transporte compartido"""
+    
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None) -> SyncClient:
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=get_transporte_supabase()
+        )
+
+
+class _ClienteConPool(Client):
+    """Cliente de Supabase cuyas consultas (tablas y RPC) usan _PostgrestConPool"""
+    
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=TIMEOUT_LECTURA, verify=True, proxy=None):
+        return _PostgrestConPool(rest_url, headers=headers, schema=schema, timeout=timeout)
+
+
+class _PostgrestAsyncConPool(AsyncPostgrestClient):
+    """Cliente async de PostgREST con su propio TransporteSupabaseAsync"""
+    
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None) -> AsyncClient:
+        return AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=TransporteSupabaseAsync(http2=USAR_HTTP2, limits=_limites_pool())
+        )
+
+
+class _ClienteAsyncConPool(AClient):
+    """Cliente async de Supabase cuyas consultas usan _PostgrestAsyncConPool"""
+    
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=TIMEOUT_LECTURA, verify=True, proxy=None):
+        return _PostgrestAsyncConPool(rest_url, headers=headers, schema=schema, timeout=timeout)
+
+
+def _get_credenciales() -> Tuple[str, str]:
+    """
+    Obtener URL y llave de Supabase
+    Prioriza variables de entorno (Railway), luego secrets de Streamlit
     """
     # Intentar obtener de variables de entorno primero (Railway, desarrollo local)
     url = os.getenv("SUPABASE_URL")
@@ -34,4 +390,59 @@ def get_supabase_client() -> Client:
     if not url or not key:
         raise ValueError("SUPABASE_URL y SUPABASE_KEY deben estar configurados en variables de entorno o secrets")
     
-    return create_client(url, key)
+    return url, key
+
+
+def _get_timeout() -> httpx.Timeout:
+    """Timeouts por solicitud (configurables con SUPABASE_TIMEOUT_*)"""
+    return httpx.Timeout(TIMEOUT_LECTURA, connect=TIMEOUT_CONEXION, pool=TIMEOUT_POOL)
+
+
+@st.cache_resource
+def get_supabase_client() -> Client:
+    """
+    Obtener cliente de Supabase con cache
+    Prioriza variables de entorno (Railway), luego secrets de Streamlit
+    
+    Las consultas comparten un pool de conexiones con keep-alive, usan los
+    timeouts SUPABASE_TIMEOUT_* y reintentan fallas transitorias (ver
+    TransporteSupabase y get_metricas_supabase)
+    
+    Returns:
+        Client: Cliente de Supabase
+    """
+    url, key = _get_credenciales()
+    
+    return _ClienteConPool.create(url, key, ClientOptions(postgrest_client_timeout=_get_timeout()))
+
+
+async def get_supabase_async_client() -> AClient:
+    """
+    Obtener el cliente async de Supabase (se crea la primera vez)
+    
+    El cliente y su pool de conexiones quedan ligados al event loop donde se
+    crean: se debe usar solo desde el loop de utils.asincrono.
+    
+    Returns:
+        AClient: Cliente async de Supabase
+    """
+    global _cliente_async, _lock_cliente_async
+    
+    if _cliente_async is not None:
+        return _cliente_async
+    
+    # El lock se crea en el loop de utils.asincrono; entre la revisión y la
+    # asignación no hay await, así que solo una corrutina lo crea
+    if _lock_cliente_async is None:
+        _lock_cliente_async = asyncio.Lock()
+    
+    # Varias corrutinas de ejecutar_en_paralelo llegan a la vez: solo la
+    # primera crea el cliente (y su pool), las demás esperan y lo reutilizan
+    async with _lock_cliente_async:
+        if _cliente_async is None:
+            url, key = _get_credenciales()
+            _cliente_async = await _ClienteAsyncConPool.create(
+                url, key, AsyncClientOptions(postgrest_client_timeout=_get_timeout())
+            )
+    
+    return _cliente_async
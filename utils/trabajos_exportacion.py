@@ -0,0 +1,412 @@
+"""
+Trabajos de exportación en segundo plano con almacén de archivos generados
+"""
+
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .almacen_local import conectar_sqlite, get_directorio_local
+from .envios_cache import iter_envios_local
+from .envios_db import iter_envios
+from .exportar import FORMATOS_EXPORTACION, escribir_exportacion, nombre_archivo_exportacion, mime_exportacion
+
+# Archivo SQLite con la tabla de trabajos
+ARCHIVO_TRABAJOS = "trabajos_exportacion.db"
+
+# Trabajos que se generan al mismo tiempo
+MAX_TRABAJOS_CONCURRENTES = 2
+
+# Tiempo que se conservan los archivos terminados
+TTL_ARTEFACTOS = timedelta(hours=24)
+
+# Estados de un trabajo
+PENDIENTE = 'PENDIENTE'
+EN_PROCESO = 'EN_PROCESO'
+COMPLETADO = 'COMPLETADO'
+ERROR = 'ERROR'
+
+# Columnas exportadas por tipo de reporte
+COLUMNAS_ICCIDS = {
+    'iccid': 'ICCID',
+    'codigo_bt': 'Código BT',
+    'nombre_distribuidor': 'Nombre Distribuidor',
+    'fecha_envio': 'Fecha de Envío'
+}
+
+COLUMNAS_PERIODO = {
+    'fecha_envio': 'fecha_envio',
+    'codigo_bt': 'codigo_bt',
+    'iccid': 'iccid',
+    'estatus': 'estatus'
+}
+
+COLUMNAS_BUSQUEDA = {
+    'fecha_envio': 'Fecha',
+    'iccid': 'ICCID',
+    'codigo_bt': 'Código BT',
+    'nombre_distribuidor': 'Distribuidor',
+    'estatus': 'Estatus'
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock_executor = threading.Lock()
+
+
+def _reporte_envios_anual(parametros: Dict) -> Tuple[Iterable, Dict[str, str], str]:
+    """ICCIDs de un año (y opcionalmente un distribuidor) desde el cache local"""
+    paginas = iter_envios_local(
+        columnas=list(COLUMNAS_ICCIDS.keys()),
+        año=int(parametros['año']),
+        codigo_bt=parametros.get('codigo_bt')
+    )
+    return paginas, COLUMNAS_ICCIDS, str(parametros['año'])
+
+
+def _reporte_envios_periodo(parametros: Dict) -> Tuple[Iterable, Dict[str, str], str]:
+    """Envíos de un rango de fechas desde Supabase"""
+    paginas = iter_envios(
+        {
+            'fecha_desde': date.fromisoformat(parametros['fecha_desde']),
+            'fecha_hasta': date.fromisoformat(parametros['fecha_hasta'])
+        },
+        columnas=', '.join(COLUMNAS_PERIODO.keys()),
+        orden='fecha_envio'
+    )
+    return paginas, COLUMNAS_PERIODO, 'Datos'
+
+
+def _reporte_envios_distribuidor(parametros: Dict) -> Tuple[Iterable, Dict[str, str], str]:
+    """SIMs de un distribuidor desde Supabase"""
+    paginas = iter_envios(
+        {
+            'codigo_bt_exacto': parametros['codigo_bt'],
+            'estatus': parametros.get('estatus')
+        },
+        columnas=', '.join(COLUMNAS_ICCIDS.keys()),
+        orden='fecha_envio'
+    )
+    return paginas, COLUMNAS_ICCIDS, parametros['codigo_bt']
+
+
+def _reporte_envios_busqueda(parametros: Dict) -> Tuple[Iterable, Dict[str, str], str]:
+    """Envíos de la consulta personalizada (filtros de buscar_envios) desde Supabase"""
+    filtros = dict(parametros)
+    for campo in ('fecha_desde', 'fecha_hasta'):
+        if filtros.get(campo):
+            filtros[campo] = date.fromisoformat(filtros[campo])
+    
+    paginas = iter_envios(filtros, columnas=', '.join(COLUMNAS_BUSQUEDA.keys()), orden='fecha_envio')
+    return paginas, COLUMNAS_BUSQUEDA, 'Envios'
+
+
+# Tipos de reporte disponibles: tipo -> función que arma (páginas, columnas, hoja)
+REPORTES: Dict[str, Callable[[Dict], Tuple[Iterable, Dict[str, str], str]]] = {
+    'envios_anual': _reporte_envios_anual,
+    'envios_periodo': _reporte_envios_periodo,
+    'envios_distribuidor': _reporte_envios_distribuidor,
+    'envios_busqueda': _reporte_envios_busqueda
+}
+
+
+def _conectar():
+    """Abrir la base de trabajos y crear la tabla si no existe"""
+    conexion = conectar_sqlite(ARCHIVO_TRABAJOS)
+    conexion.row_factory = _fila_a_dict
+    conexion.execute("""
+        CREATE TABLE IF NOT EXISTS trabajos (
+            id TEXT PRIMARY KEY,
+            descripcion TEXT,
+            especificacion TEXT,
+            formato TEXT,
+            estado TEXT,
+            filas INTEGER DEFAULT 0,
+            total_estimado INTEGER,
+            ruta TEXT,
+            nombre_archivo TEXT,
+            error TEXT,
+            created_at TEXT,
+            terminado_at TEXT,
+            expira_at TEXT,
+            sesion TEXT
+        )
+    """)
+    # Bases creadas antes de que los trabajos tuvieran sesión
+    columnas = {fila['name'] for fila in conexion.execute("PRAGMA table_info(trabajos)")}
+    if 'sesion' not in columnas:
+        conexion.execute("ALTER TABLE trabajos ADD COLUMN sesion TEXT")
+    return conexion
+
+
+def _fila_a_dict(cursor, fila) -> Dict:
+    """row_factory de SQLite que regresa dicts"""
+    return {columna[0]: valor for columna, valor in zip(cursor.description, fila)}
+
+
+def _actualizar(id_trabajo: str, **campos):
+    """Actualizar campos de un trabajo"""
+    conexion = _conectar()
+    try:
+        conexion.execute(
+            f"UPDATE trabajos SET {', '.join(f'{campo} = ?' for campo in campos)} WHERE id = ?",
+            [*campos.values(), id_trabajo]
+        )
+        conexion.commit()
+    finally:
+        conexion.close()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Obtener el pool de trabajos del proceso
+    
+    La primera vez marca como interrumpidos los trabajos que quedaron
+    pendientes de un proceso anterior.
+    """
+    global _executor
+    
+    with _lock_executor:
+        if _executor is None:
+            conexion = _conectar()
+            try:
+                conexion.execute(
+                    "UPDATE trabajos SET estado = ?, error = ? WHERE estado IN (?, ?)",
+                    (ERROR, 'Interrumpido por reinicio de la aplicación', PENDIENTE, EN_PROCESO)
+                )
+                conexion.commit()
+            finally:
+                conexion.close()
+            
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_TRABAJOS_CONCURRENTES,
+                thread_name_prefix='exportacion'
+            )
+    
+    return _executor
+
+
+def _con_progreso(id_trabajo: str, paginas: Iterable) -> Iterator:
+    """Recorrer las páginas guardando en la tabla las filas procesadas"""
+    filas = 0
+    
+    for pagina in paginas:
+        yield pagina
+        filas += len(pagina)
+        _actualizar(id_trabajo, filas=filas)
+
+
+def _ejecutar_trabajo(id_trabajo: str, especificacion: Dict, formato: str, ruta: str):
+    """Generar el archivo de un trabajo (corre en el pool)"""
+    _actualizar(id_trabajo, estado=EN_PROCESO)
+    
+    try:
+        paginas, columnas, nombre_hoja = REPORTES[especificacion['tipo']](especificacion.get('parametros', {}))
+        filas = escribir_exportacion(_con_progreso(id_trabajo, paginas), columnas, ruta, formato, nombre_hoja)
+        
+        terminado = datetime.now()
+        _actualizar(
+            id_trabajo,
+            estado=COMPLETADO,
+            filas=filas,
+            terminado_at=terminado.isoformat(),
+            expira_at=(terminado + TTL_ARTEFACTOS).isoformat()
+        )
+    except Exception as e:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        
+        terminado = datetime.now()
+        _actualizar(
+            id_trabajo,
+            estado=ERROR,
+            error=str(e),
+            terminado_at=terminado.isoformat(),
+            expira_at=(terminado + TTL_ARTEFACTOS).isoformat()
+        )
+
+
+def purgar_trabajos_expirados() -> int:
+    """
+    Borrar los trabajos (y sus archivos) cuyo TTL ya venció
+    
+    Returns:
+        Cantidad de trabajos borrados
+    """
+    conexion = _conectar()
+    try:
+        expirados = conexion.execute(
+            "SELECT id, ruta FROM trabajos WHERE expira_at IS NOT NULL AND expira_at < ?",
+            (datetime.now().isoformat(),)
+        ).fetchall()
+        
+        for trabajo in expirados:
+            if trabajo['ruta'] and os.path.exists(trabajo['ruta']):
+                os.remove(trabajo['ruta'])
+        
+        conexion.executemany("DELETE FROM trabajos WHERE id = ?", [(t['id'],) for t in expirados])
+        conexion.commit()
+    finally:
+        conexion.close()
+    
+    return len(expirados)
+
+
+def encolar_exportacion(
+    especificacion: Dict,
+    formato: str,
+    nombre_base: str,
+    descripcion: str,
+    sesion: str,
+    total_estimado: Optional[int] = None
+) -> str:
+    """
+    Encolar un reporte para generarse en segundo plano
+    
+    Args:
+        especificacion: Dict con tipo (ver REPORTES) y parametros
+            (solo valores JSON: fechas como texto ISO)
+        formato: 'csv', 'csv.gz' o 'xlsx'
+        nombre_base: Nombre del archivo sin extensión
+        descripcion: Texto que se muestra en el panel de exportaciones
+        sesion: Sesión dueña del trabajo (solo ella lo ve y lo descarga)
+        total_estimado: Filas esperadas, para mostrar el avance
+    
+    Returns:
+        ID del trabajo
+    """
+    if especificacion.get('tipo') not in REPORTES:
+        raise ValueError(f"Tipo de reporte no soportado: {especificacion.get('tipo')}")
+    
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}")
+    
+    executor = _get_executor()
+    purgar_trabajos_expirados()
+    
+    id_trabajo = uuid.uuid4().hex
+    ruta = os.path.join(get_directorio_local('artefactos'), f"{id_trabajo}{FORMATOS_EXPORTACION[formato][0]}")
+    
+    conexion = _conectar()
+    try:
+        conexion.execute(
+            """
+            INSERT INTO trabajos (id, descripcion, especificacion, formato, estado, total_estimado,
+                                  ruta, nombre_archivo, created_at, sesion)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                id_trabajo,
+                descripcion,
+                json.dumps(especificacion),
+                formato,
+                PENDIENTE,
+                total_estimado,
+                ruta,
+                nombre_archivo_exportacion(nombre_base, formato),
+                datetime.now().isoformat(),
+                sesion
+            )
+        )
+        conexion.commit()
+    finally:
+        conexion.close()
+    
+    executor.submit(_ejecutar_trabajo, id_trabajo, especificacion, formato, ruta)
+    
+    return id_trabajo
+
+
+def listar_trabajos(sesion: str, limite: int = 20) -> List[Dict]:
+    """
+    Listar los trabajos más recientes de una sesión (purga antes los expirados)
+    
+    Args:
+        sesion: Sesión dueña de los trabajos
+        limite: Cantidad máxima de trabajos
+    
+    Returns:
+        Lista de trabajos (dicts), del más reciente al más antiguo
+    """
+    purgar_trabajos_expirados()
+    
+    conexion = _conectar()
+    try:
+        return conexion.execute(
+            "SELECT * FROM trabajos WHERE sesion = ? ORDER BY created_at DESC LIMIT ?",
+            (sesion, limite)
+        ).fetchall()
+    finally:
+        conexion.close()
+
+
+def get_trabajo(id_trabajo: str) -> Optional[Dict]:
+    """
+    Obtener un trabajo por ID
+    
+    Args:
+        id_trabajo: ID del trabajo
+    
+    Returns:
+        Trabajo (dict) o None si no existe
+    """
+    conexion = _conectar()
+    try:
+        return conexion.execute("SELECT * FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+    finally:
+        conexion.close()
+
+
+def abrir_artefacto(id_trabajo: str, sesion: str) -> Optional[BinaryIO]:
+    """
+    Abrir el archivo generado por un trabajo terminado
+    
+    Args:
+        id_trabajo: ID del trabajo
+        sesion: Sesión que lo pide (debe ser la dueña del trabajo)
+    
+    Returns:
+        Archivo binario abierto en modo lectura, o None si no está disponible
+    """
+    trabajo = get_trabajo(id_trabajo)
+    
+    if not trabajo or trabajo['sesion'] != sesion or trabajo['estado'] != COMPLETADO or not os.path.exists(trabajo['ruta']):
+        return None
+    
+    return open(trabajo['ruta'], 'rb')
+
+
+def eliminar_trabajo(id_trabajo: str, sesion: str) -> bool:
+    """
+    Borrar un trabajo terminado y su archivo
+    
+    Args:
+        id_trabajo: ID del trabajo
+        sesion: Sesión que lo pide (debe ser la dueña del trabajo)
+    
+    Returns:
+        True si se borró, False si no existe, es de otra sesión o sigue en proceso
+    """
+    trabajo = get_trabajo(id_trabajo)
+    
+    if not trabajo or trabajo['sesion'] != sesion or trabajo['estado'] in (PENDIENTE, EN_PROCESO):
+        return False
+    
+    if trabajo['ruta'] and os.path.exists(trabajo['ruta']):
+        os.remove(trabajo['ruta'])
+    
+    conexion = _conectar()
+    try:
+        conexion.execute("DELETE FROM trabajos WHERE id = ?", (id_trabajo,))
+        conexion.commit()
+    finally:
+        conexion.close()
+    
+    return True
+
+
+def get_mime_trabajo(trabajo: Dict) -> str:
+    """Tipo MIME del archivo de un trabajo"""
+    return mime_exportacion(trabajo['formato'])